@@ -0,0 +1,147 @@
+# admission.py
+"""Per-endpoint admission control.
+
+Costly read endpoints get a concurrency limit and a token-bucket rate
+limit, and together they may only use ``ADMISSION_HEAVY_CONCURRENCY``
+request threads, so the remaining threads of a worker are always free for
+circulation (issue, return, holds) and ordinary pages. A request over its
+rate gets 429, one that finds no free slot within
+``ADMISSION_QUEUE_TIMEOUT`` seconds gets 503; both carry Retry-After.
+Counters are served at ``/api/metrics/admission``.
+
+Limits are per process, like the server's thread pool they protect.
+"""
+import math
+import threading
+import time
+
+from flask import g, jsonify, request
+
+# endpoint -> {'concurrency': slots, 'rate': requests/second, 'burst': bucket size}
+DEFAULT_LIMITS = {
+    'report_bp.api_reports': {'concurrency': 2, 'rate': 5, 'burst': 10},
+    'report_bp.submit_report_job': {'concurrency': 2, 'rate': 5, 'burst': 10},
+    'book_bp.api_popular_books': {'concurrency': 2, 'rate': 10, 'burst': 20},
+    'book_bp.api_categories_stats': {'concurrency': 1, 'rate': 5, 'burst': 10},
+    'member_bp.api_overdue_members': {'concurrency': 2, 'rate': 10, 'burst': 20},
+    'sync_bp.api_changes': {'concurrency': 2, 'rate': 20, 'burst': 40},
+}
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.capacity = float(burst)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self):
+        """Take a token; returns 0 on success or the seconds until one is available."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+
+class RouteLimit:
+    def __init__(self, concurrency=None, rate=None, burst=None):
+        self.slots = threading.BoundedSemaphore(concurrency) if concurrency else None
+        self.bucket = TokenBucket(rate, burst or rate) if rate else None
+        self.stats = {'admitted': 0, 'queued': 0, 'rejected_rate': 0, 'rejected_busy': 0, 'active': 0}
+
+
+class Admission:
+    def __init__(self, limits, heavy_concurrency, queue_timeout):
+        self.limits = {name: RouteLimit(**opts) for name, opts in limits.items()}
+        self.heavy = threading.BoundedSemaphore(heavy_concurrency)
+        self.heavy_concurrency = heavy_concurrency
+        self.queue_timeout = queue_timeout
+        self._lock = threading.Lock()
+
+    def _count(self, limit, key, delta=1):
+        with self._lock:
+            limit.stats[key] += delta
+
+    def admit(self, endpoint):
+        """Return None if the request may run, else a (status, retry_after) pair."""
+        limit = self.limits.get(endpoint)
+        if limit is None:
+            return None
+        if limit.bucket is not None:
+            wait = limit.bucket.take()
+            if wait:
+                self._count(limit, 'rejected_rate')
+                return 429, wait
+        acquired = []
+        for sem in (limit.slots, self.heavy):
+            if sem is None:
+                continue
+            if not sem.acquire(blocking=False):
+                self._count(limit, 'queued')
+                if not sem.acquire(timeout=self.queue_timeout):
+                    for held in acquired:
+                        held.release()
+                    self._count(limit, 'rejected_busy')
+                    return 503, 1
+            acquired.append(sem)
+        self._count(limit, 'admitted')
+        self._count(limit, 'active')
+        g._admission = (limit, acquired)
+        return None
+
+    def release(self):
+        held = g.pop('_admission', None)
+        if held is None:
+            return
+        limit, sems = held
+        for sem in sems:
+            sem.release()
+        self._count(limit, 'active', -1)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'heavy_concurrency': self.heavy_concurrency,
+                'routes': {name: dict(limit.stats) for name, limit in self.limits.items()},
+            }
+
+
+def init_app(app):
+    """Install the limiter from ``ADMISSION_*`` config and its metrics route."""
+    limits = dict(DEFAULT_LIMITS)
+    limits.update(app.config.get('ADMISSION_LIMITS') or {})
+    admission = Admission(
+        {name: opts for name, opts in limits.items() if opts},
+        heavy_concurrency=app.config['ADMISSION_HEAVY_CONCURRENCY'],
+        queue_timeout=app.config['ADMISSION_QUEUE_TIMEOUT'],
+    )
+    app.extensions['admission'] = admission
+
+    @app.before_request
+    def admit_request():
+        if not app.config['ADMISSION_ENABLED']:
+            return None
+        refused = admission.admit(request.endpoint)
+        if refused is None:
+            return None
+        status, retry_after = refused
+        message = 'Too many requests' if status == 429 else 'Server busy'
+        resp = jsonify({'error': f'{message}, please retry shortly.'})
+        resp.status_code = status
+        resp.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+        return resp
+
+    @app.teardown_request
+    def release_request(exc):
+        admission.release()
+
+    @app.route('/api/metrics/admission')
+    def admission_metrics():
+        return jsonify(admission.snapshot())
+
+    return admission
@@ -1,4 +1,5 @@
-from flask import Flask, render_template, redirect, url_for, session, jsonify, request, flash
+from flask import Flask, Response, current_app, render_template, redirect, url_for, session, jsonify, request, flash, send_from_directory
+from flask.cli import with_appcontext
 from werkzeug.utils import secure_filename
 
 # Import Blueprints
@@ -6,252 +7,555 @@ from routes.auth_routes import auth_bp               # Optional authentication r
 from routes.book_routes import book_bp               # Book management routes
 from routes.member_routes import member_bp           # Member management routes
 from routes.transaction_routes import transaction_bp # Transaction routes
-from routes.report_routes import report_bp            # Reports routes
+from routes.report_routes import configure_job_waiters, report_bp, report_jobs  # Reports routes
+from routes.sync_routes import sync_bp               # Desk client delta sync
+from routes.audit_routes import audit_bp             # Audit log queries
 
 # Import Models
 from models.book_model import BookModel
 from models.member_model import MemberModel
 from models.transaction_model import TransactionModel
 from models.user_model import UserModel
+from models import analytics, archive, audit, avatars, backup, db, events, export, fines, passwords
+import admission
+import assets
+import click
+import logging
 import os
+import queue
+from datetime import datetime
 
 # =======================
-# INITIALIZE APP
+# APPLICATION FACTORY
 # =======================
-app = Flask(__name__)
-app.secret_key = "library_secret_key"  # For session handling security
-app.config['UPLOAD_FOLDER'] = os.path.join('static', 'uploads', 'avatars')
-app.config['MAX_CONTENT_LENGTH'] = 4 * 1024 * 1024  # 4 MB limit
+DEFAULT_CONFIG = {
+    'SECRET_KEY': "library_secret_key",  # For session handling security
+    'DATABASE': os.environ.get('LIBRARY_DATABASE', 'library.db'),
+    'DB_BUSY_TIMEOUT_MS': 5000,
+    'UPLOAD_FOLDER': os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'uploads', 'avatars'),
+    # Resized avatar variants have content-hashed names and never change
+    'AVATAR_MAX_AGE': 365 * 24 * 3600,
+    # Output of `flask --app app assets`; bundle names carry a content hash
+    'ASSETS_DIR': os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'dist'),
+    'ASSETS_MAX_AGE': 365 * 24 * 3600,
+    'MAX_CONTENT_LENGTH': 4 * 1024 * 1024,  # 4 MB limit
+    # Send book/transaction writes through one group-committing writer thread
+    'WRITE_COORDINATOR': os.environ.get('LIBRARY_WRITE_COORDINATOR') == '1',
+    # bcrypt cost factor and the process pool that runs it off the request thread
+    'PASSWORD_ROUNDS': 12,
+    'PASSWORD_WORKERS': passwords.default_workers(),
+    'PASSWORD_MAX_PENDING': 32,
+    # Per-worker cache of user name/email/avatar (entries, seconds)
+    'PROFILE_CACHE_SIZE': 1024,
+    'PROFILE_CACHE_TTL': 60,
+    # Serve reports from a per-worker NumPy copy of the ledger when NumPy is
+    # installed; it is brought up to date at most once per interval (seconds)
+    'ANALYTICS_SNAPSHOT': True,
+    'ANALYTICS_REFRESH_SECONDS': 1.0,
+    # Move loans returned more than this many days ago out of the hot
+    # transactions table (None disables); checked every ARCHIVE_INTERVAL seconds
+    'ARCHIVE_AFTER_DAYS': int(os.environ['LIBRARY_ARCHIVE_AFTER_DAYS']) if os.environ.get('LIBRARY_ARCHIVE_AFTER_DAYS') else None,
+    'ARCHIVE_INTERVAL': 3600,
+    'ARCHIVE_BATCH_SIZE': 500,
+    # Online snapshots of the SQLite file: every BACKUP_INTERVAL seconds
+    # (None disables), copied BACKUP_PAGES pages per step, newest BACKUP_KEEP kept
+    'BACKUP_DIR': os.environ.get('LIBRARY_BACKUP_DIR', 'backups'),
+    'BACKUP_INTERVAL': int(os.environ['LIBRARY_BACKUP_INTERVAL']) if os.environ.get('LIBRARY_BACKUP_INTERVAL') else None,
+    'BACKUP_KEEP': 7,
+    'BACKUP_PAGES': 256,
+    'BACKUP_STEP_SLEEP': 0.01,
+    # Live dashboard streams: each open one holds a server thread for as
+    # long as the page is open, so cap them per process at a quarter of the
+    # threads (the rest stay free for circulation); idle streams get a
+    # comment line every N seconds
+    'SSE_MAX_CLIENTS': max(1, int(os.environ.get('GUNICORN_THREADS', 4)) // 4),
+    'SSE_KEEPALIVE': 15,
+    # Background report jobs: threads running reports at once (the rest of
+    # the server's threads stay free for circulation), queue bound, and how
+    # long finished results are kept (seconds)
+    'REPORT_JOB_WORKERS': 2,
+    'REPORT_JOB_MAX_PENDING': 32,
+    'REPORT_JOB_RESULT_TTL': 600,
+    # Job polls may wait up to REPORT_JOB_MAX_WAIT seconds for a change, and
+    # only REPORT_JOB_WAITERS of them per process; the rest answer at once
+    'REPORT_JOB_MAX_WAIT': 5,
+    'REPORT_JOB_WAITERS': 1,
+    # Admission control for the costly read endpoints (see admission.py):
+    # together they may use at most ADMISSION_HEAVY_CONCURRENCY of a worker's
+    # threads, the rest stay reserved for circulation; a request waits up to
+    # ADMISSION_QUEUE_TIMEOUT seconds for a slot before it is shed with a 503.
+    # ADMISSION_LIMITS overrides the per-endpoint defaults (None disables one)
+    'ADMISSION_ENABLED': True,
+    'ADMISSION_HEAVY_CONCURRENCY': max(1, int(os.environ.get('GUNICORN_THREADS', 4)) - 2),
+    'ADMISSION_QUEUE_TIMEOUT': 0.5,
+    'ADMISSION_LIMITS': {},
+    # Audit events are queued and written in batches of AUDIT_BATCH_SIZE or
+    # every AUDIT_FLUSH_INTERVAL seconds; a full queue falls back to direct writes
+    'AUDIT_BATCH_SIZE': 100,
+    'AUDIT_FLUSH_INTERVAL': 1.0,
+    'AUDIT_QUEUE_SIZE': 10000,
+    # Parquet snapshot written by `flask --app app export` (needs pyarrow)
+    'EXPORT_DIR': os.environ.get('LIBRARY_EXPORT_DIR', 'exports'),
+    'EXPORT_BATCH_SIZE': 10000,
+    # Overdue fines per member_type; 'default' covers the rest and fills in
+    # missing keys. A loan is due loan_days after issue and owes `daily` for
+    # every day past due beyond grace_days, up to max_per_loan (None: no cap)
+    'FINE_RULES': {
+        'default': {'loan_days': 14, 'grace_days': 2, 'daily': 0.25, 'max_per_loan': 10.0},
+        'faculty': {'loan_days': 28},
+        'staff': {'loan_days': 28},
+    },
+    # Fines are accrued once per day by `flask --app app fines` (run it from
+    # cron) or by a background check every FINES_INTERVAL seconds (None disables)
+    'FINES_INTERVAL': int(os.environ['LIBRARY_FINES_INTERVAL']) if os.environ.get('LIBRARY_FINES_INTERVAL') else None,
+}
+
+
+def create_app(config=None):
+    """Build the Flask app without touching the database or the filesystem.
+
+    Schema work lives in the ``flask --app app migrate`` command and the
+    MySQL/SQLite backends are only contacted when a request needs them.
+    """
+    app = Flask(__name__)
+    app.config.from_mapping(DEFAULT_CONFIG)
+    if config:
+        app.config.from_mapping(config)
+    # Queued audit events belong to the database configured so far
+    audit.stop()
+    db.configure(app.config['DATABASE'], app.config['DB_BUSY_TIMEOUT_MS'])
+    audit.configure(
+        batch_size=app.config['AUDIT_BATCH_SIZE'],
+        flush_interval=app.config['AUDIT_FLUSH_INTERVAL'],
+        queue_size=app.config['AUDIT_QUEUE_SIZE'],
+    )
+    if app.config['WRITE_COORDINATOR']:
+        db.enable_write_coordinator()
+    passwords.configure(
+        rounds=app.config['PASSWORD_ROUNDS'],
+        workers=app.config['PASSWORD_WORKERS'],
+        max_pending=app.config['PASSWORD_MAX_PENDING'],
+    )
+    UserModel.profile_cache.configure(
+        maxsize=app.config['PROFILE_CACHE_SIZE'],
+        ttl=app.config['PROFILE_CACHE_TTL'],
+    )
+    analytics.configure(refresh_interval=app.config['ANALYTICS_REFRESH_SECONDS'])
+    archive.stop()
+    if app.config['ARCHIVE_AFTER_DAYS']:
+        archive.start(app.config['ARCHIVE_AFTER_DAYS'],
+                      interval=app.config['ARCHIVE_INTERVAL'],
+                      batch_size=app.config['ARCHIVE_BATCH_SIZE'])
+    fines.configure(app.config['FINE_RULES'])
+    fines.stop()
+    if app.config['FINES_INTERVAL']:
+        fines.start(app.config['FINES_INTERVAL'])
+    events.bus.max_subscribers = app.config['SSE_MAX_CLIENTS']
+    report_jobs.configure(
+        max_workers=app.config['REPORT_JOB_WORKERS'],
+        max_pending=app.config['REPORT_JOB_MAX_PENDING'],
+        result_ttl=app.config['REPORT_JOB_RESULT_TTL'],
+    )
+    configure_job_waiters(app.config['REPORT_JOB_WAITERS'])
+
+    register_blueprints(app)
+    register_routes(app)
+    assets.init_app(app)
+    admission.init_app(app)
+    app.cli.add_command(migrate_command)
+    app.cli.add_command(archive_command)
+    app.cli.add_command(backup_command)
+    app.cli.add_command(export_command)
+    app.cli.add_command(fines_command)
+    return app
+
+
+@click.command('migrate')
+def migrate_command():
+    """Create or upgrade the SQLite tables and the MySQL users columns."""
+    db.migrate()
+    try:
+        UserModel.ensure_profile_image_column()
+    except Exception as e:
+        click.echo(f"Skipped users.profile_image check: {e}")
+    click.echo("Database migrated.")
+
+
+@click.command('archive')
+@click.option('--days', type=int, default=None,
+              help='Archive loans returned more than this many days ago (default: ARCHIVE_AFTER_DAYS).')
+@with_appcontext
+def archive_command(days):
+    """Move old returned transactions to the archive partition now."""
+    days = days if days is not None else current_app.config['ARCHIVE_AFTER_DAYS']
+    if days is None:
+        raise click.UsageError('Pass --days or set ARCHIVE_AFTER_DAYS.')
+    moved = archive.archive_older_than(days, current_app.config['ARCHIVE_BATCH_SIZE'])
+    click.echo(f"Archived {moved} transactions.")
+
+
+def backup_options(app):
+    return {
+        'pages': app.config['BACKUP_PAGES'],
+        'sleep': app.config['BACKUP_STEP_SLEEP'],
+        'keep': app.config['BACKUP_KEEP'],
+    }
 
-# Ensure upload directory exists
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
-# Ensure users table has profile_image column
-try:
-    UserModel.ensure_profile_image_column()
-except Exception:
-    pass
+def start_backups(app):
+    """Start the backup scheduler if BACKUP_INTERVAL is set.
 
-# =======================
-# CREATE DATABASE TABLES
-# =======================
-BookModel.create_table()
-MemberModel.create_table()
-TransactionModel.create_table()
+    Not called by create_app: every worker would take its own backups. The
+    gunicorn master calls it once (``when_ready``).
+    """
+    backup.stop()
+    if app.config['BACKUP_INTERVAL']:
+        backup.start(app.config['BACKUP_DIR'], app.config['BACKUP_INTERVAL'], **backup_options(app))
+
+
+@click.command('backup')
+@with_appcontext
+def backup_command():
+    """Take, verify and rotate one online snapshot of the database."""
+    result = backup.backup(current_app.config['BACKUP_DIR'], **backup_options(current_app))
+    if result is None:
+        raise click.ClickException('Another backup is already running.')
+    click.echo(f"Wrote {result['path']} ({result['pages']} pages) in {result['duration']:.2f}s; "
+               f"longest step {result['max_step']:.3f}s")
+
+
+@click.command('export')
+@click.option('--dest', default=None, help='Output directory (default: EXPORT_DIR).')
+@click.option('--full', is_flag=True, help='Rewrite every month instead of only new or changed ones.')
+@with_appcontext
+def export_command(dest, full):
+    """Write books, members and transactions to partitioned Parquet files."""
+    if not export.is_available():
+        raise click.ClickException('pyarrow is required: pip install pyarrow')
+    dest = dest or current_app.config['EXPORT_DIR']
+    result = export.export(dest, full=full, batch_size=current_app.config['EXPORT_BATCH_SIZE'])
+    click.echo(f"Exported {result['books']} books, {result['members']} members and "
+               f"{result['rows']} transactions in {len(result['months_written'])} months to {dest} "
+               f"({result['months_skipped']} unchanged months skipped).")
+
+
+@click.command('fines')
+@click.option('--day', default=None, help='Accrue through this day, YYYY-MM-DD (default: today).')
+@click.option('--force', is_flag=True, help='Recompute even if the day was already accrued.')
+@with_appcontext
+def fines_command(day, force):
+    """Accrue overdue fines for every open loan; meant to run nightly."""
+    if day is not None:
+        try:
+            datetime.strptime(day, '%Y-%m-%d')
+        except ValueError:
+            raise click.BadParameter('expected YYYY-MM-DD', param_hint='--day')
+    result = fines.accrue(day, force=force)
+    if result['skipped']:
+        click.echo(f"Fines through {result['day']} were already accrued ({result['loans']} loans).")
+    else:
+        click.echo(f"Accrued fines through {result['day']} on {result['loans']} loans "
+                   f"for {result['members']} members.")
 
-# =======================
-# REGISTER BLUEPRINTS
-# =======================
-if 'auth_bp' in globals():
-    app.register_blueprint(auth_bp, url_prefix='/auth')  # Optional
-app.register_blueprint(book_bp, url_prefix='/books')
-app.register_blueprint(member_bp, url_prefix='/members')
-app.register_blueprint(transaction_bp, url_prefix='/transactions')
-app.register_blueprint(report_bp)
 
 # =======================
-# HOME PAGE
+# REGISTER BLUEPRINTS
 # =======================
-@app.route('/')
-def index():
-    """Home page — redirect to login if not authenticated, else show dashboard links."""
-    if 'user_name' in session:
-        return render_template('index.html', user=session['user_name'])
-    # Fallback if auth_bp is not available
-    return redirect(url_for('auth_bp.login')) if 'auth_bp' in globals() else """
-        <h1>Library Management System</h1>
-        <p>
-            <a href='/books'>Books</a> |
-            <a href='/members'>Members</a> |
-            <a href='/transactions'>Transactions</a>
-        </p>
-    """
+def register_blueprints(app):
+    if 'auth_bp' in globals():
+        app.register_blueprint(auth_bp, url_prefix='/auth')  # Optional
+    app.register_blueprint(book_bp, url_prefix='/books')
+    app.register_blueprint(member_bp, url_prefix='/members')
+    app.register_blueprint(transaction_bp, url_prefix='/transactions')
+    app.register_blueprint(report_bp)
+    app.register_blueprint(sync_bp, url_prefix='/sync')
+    app.register_blueprint(audit_bp)
 
-# =======================
-# NAVIGATION ROUTES
-# =======================
-@app.route('/books_page')
-def books_page():
-    return redirect(url_for('book_bp.view_books'))
 
-@app.route('/members_page')
-def members_page():
-    return redirect(url_for('member_bp.view_members'))
+def store_avatar(user_id, raw, upload_folder):
+    """Background job: write the avatar variants and point the user at them."""
+    try:
+        name = avatars.process(raw, upload_folder)
+        UserModel.set_profile_image(user_id, f"uploads/avatars/{name}")
+    except Exception:
+        logging.getLogger(__name__).exception("Avatar processing failed for user %s", user_id)
+
+
+def avatar_url(rel_path):
+    """URL of the default avatar image for a stored profile_image path."""
+    if not rel_path:
+        return None
+    variants = avatars.variants(rel_path)
+    if variants:
+        rel, _ = variants['image/jpeg'][1]
+        return url_for('avatar_file', filename=rel.rsplit('/', 1)[-1])
+    return url_for('static', filename=rel_path)
+
+
+def avatar_srcset(rel_path):
+    """``{mime: "url 64w, url 128w, ..."}`` for processed avatars, else None."""
+    variants = avatars.variants(rel_path) if rel_path else None
+    if not variants:
+        return None
+    return {
+        mime: ', '.join(
+            f"{url_for('avatar_file', filename=rel.rsplit('/', 1)[-1])} {width}w" for rel, width in items
+        )
+        for mime, items in variants.items()
+    }
 
-@app.route('/transactions_page')
-def transactions_page():
-    return redirect(url_for('transaction_bp.view_transactions'))
 
-# =======================
-# PROFILE PAGE AND API
-# =======================
-@app.route('/profile')
-def profile_page():
-    return render_template('profile.html')
-
-@app.route('/settings')
-def settings_page():
-    return render_template('settings.html')
-
-@app.route('/api/profile')
-def api_profile():
-    user = {
-        "name": session.get('user_name', 'Guest')
-    }
-    avatar_rel = None
-    uid = session.get('user_id')
-    if uid:
+def register_routes(app):
+    # =======================
+    # HOME PAGE
+    # =======================
+    @app.route('/')
+    def index():
+        """Home page — redirect to login if not authenticated, else show dashboard links."""
+        if 'user_name' in session:
+            return render_template('index.html', user=session['user_name'])
+        # Fallback if auth_bp is not available
+        return redirect(url_for('auth_bp.login')) if 'auth_bp' in globals() else """
+            <h1>Library Management System</h1>
+            <p>
+                <a href='/books'>Books</a> |
+                <a href='/members'>Members</a> |
+                <a href='/transactions'>Transactions</a>
+            </p>
+        """
+
+    # =======================
+    # NAVIGATION ROUTES
+    # =======================
+    @app.route('/books_page')
+    def books_page():
+        return redirect(url_for('book_bp.view_books'))
+
+    @app.route('/members_page')
+    def members_page():
+        return redirect(url_for('member_bp.view_members'))
+
+    @app.route('/transactions_page')
+    def transactions_page():
+        return redirect(url_for('transaction_bp.view_transactions'))
+
+    # =======================
+    # PROFILE PAGE AND API
+    # =======================
+    @app.route('/profile')
+    def profile_page():
+        return render_template('profile.html')
+
+    @app.route('/settings')
+    def settings_page():
+        return render_template('settings.html')
+
+    @app.route('/api/profile')
+    def api_profile():
+        user = {
+            "name": session.get('user_name', 'Guest')
+        }
+        avatar_rel = None
+        uid = session.get('user_id')
+        if uid:
+            try:
+                avatar_rel = UserModel.get_profile_image(uid)
+            except Exception:
+                avatar_rel = None
+        # Aggregate counts, all from one read-only snapshot
+        conn = db.connect_readonly()
+        cur = conn.cursor()
+        cur.execute('SELECT COUNT(*) as c FROM books')
+        total_books = cur.fetchone()[0]
+
+        cur.execute('SELECT COUNT(*) as c FROM members')
+        total_members = cur.fetchone()[0]
+
+        cur.execute("SELECT COUNT(*) FROM transactions WHERE return_date IS NULL")
+        active_loans = cur.fetchone()[0]
+        cur.execute('''
+            SELECT m.full_name AS member_name, b.title AS book_title, t.issue_date
+            FROM transactions t
+            JOIN members m ON m.id = t.member_id
+            JOIN books b ON b.id = t.book_id
+            ORDER BY t.issue_date DESC
+            LIMIT 10
+        ''')
+        recent = [
+            {"member": r[0], "book": r[1], "issue_date": r[2]} for r in cur.fetchall()
+        ]
+        conn.close()
+
+        return jsonify({
+            "user": {
+                **user,
+                "avatarUrl": avatar_url(avatar_rel),
+                "avatarSrcset": avatar_srcset(avatar_rel)
+            },
+            "stats": {
+                "totalBooks": total_books,
+                "totalMembers": total_members,
+                "activeLoans": active_loans
+            },
+            "recentTransactions": recent
+        })
+
+    # =======================
+    # AVATAR UPLOAD
+    # =======================
+    @app.route('/profile/upload', methods=['POST'])
+    def upload_avatar():
+        if 'user_id' not in session:
+            flash('Please log in to upload an avatar.', 'warning')
+            return redirect(url_for('auth_bp.login')) if 'auth_bp' in globals() else redirect(url_for('index'))
+
+        if 'avatar' not in request.files:
+            flash('No file part', 'danger')
+            return redirect(url_for('profile_page'))
+
+        file = request.files['avatar']
+        if file.filename == '':
+            flash('No selected file', 'danger')
+            return redirect(url_for('profile_page'))
+
+        filename = secure_filename(file.filename)
+        ext = os.path.splitext(filename)[1].lower()
+        if ext not in {'.png', '.jpg', '.jpeg', '.gif', '.webp'}:
+            flash('Invalid file type. Allowed: png, jpg, jpeg, gif, webp', 'danger')
+            return redirect(url_for('profile_page'))
+        os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+
+        if not avatars.is_available():
+            # Without Pillow keep the old behaviour: save as user_id.ext
+            new_name = f"{session['user_id']}{ext}"
+            file.save(os.path.join(app.config['UPLOAD_FOLDER'], new_name))
+            try:
+                UserModel.set_profile_image(session['user_id'], f"uploads/avatars/{new_name}")
+                flash('Avatar updated successfully.', 'success')
+            except Exception:
+                flash('Failed to save avatar.', 'danger')
+            return redirect(url_for('profile_page'))
+
+        raw = file.read()
         try:
-            avatar_rel = UserModel.get_profile_image(uid)
+            avatars.check_image(raw)
         except Exception:
-            avatar_rel = None
-    # Aggregate counts
-    bconn = BookModel.connect()
-    bcur = bconn.cursor()
-    bcur.execute('SELECT COUNT(*) as c FROM books')
-    total_books = bcur.fetchone()[0]
-    bconn.close()
-
-    mconn = MemberModel.connect()
-    mcur = mconn.cursor()
-    mcur.execute('SELECT COUNT(*) as c FROM members')
-    total_members = mcur.fetchone()[0]
-    mconn.close()
-
-    tconn = TransactionModel.connect()
-    tcur = tconn.cursor()
-    tcur.execute("SELECT COUNT(*) FROM transactions WHERE return_date IS NULL")
-    active_loans = tcur.fetchone()[0]
-    tcur.execute('''
-        SELECT m.full_name AS member_name, b.title AS book_title, t.issue_date
-        FROM transactions t
-        JOIN members m ON m.id = t.member_id
-        JOIN books b ON b.id = t.book_id
-        ORDER BY t.issue_date DESC
-        LIMIT 10
-    ''')
-    recent = [
-        {"member": r[0], "book": r[1], "issue_date": r[2]} for r in tcur.fetchall()
-    ]
-    tconn.close()
-
-    return jsonify({
-        "user": {
-            **user,
-            "avatarUrl": (url_for('static', filename=avatar_rel) if avatar_rel else None)
-        },
-        "stats": {
-            "totalBooks": total_books,
-            "totalMembers": total_members,
-            "activeLoans": active_loans
-        },
-        "recentTransactions": recent
-    })
-
-# =======================
-# AVATAR UPLOAD
-# =======================
-@app.route('/profile/upload', methods=['POST'])
-def upload_avatar():
-    if 'user_id' not in session:
-        flash('Please log in to upload an avatar.', 'warning')
-        return redirect(url_for('auth_bp.login')) if 'auth_bp' in globals() else redirect(url_for('index'))
-
-    if 'avatar' not in request.files:
-        flash('No file part', 'danger')
+            flash('Could not read that image.', 'danger')
+            return redirect(url_for('profile_page'))
+        # Decoding and resizing happen off the request thread
+        avatars.submit(store_avatar, session['user_id'], raw, app.config['UPLOAD_FOLDER'])
+        flash('Avatar uploaded. It will appear in a moment.', 'success')
         return redirect(url_for('profile_page'))
 
-    file = request.files['avatar']
-    if file.filename == '':
-        flash('No selected file', 'danger')
-        return redirect(url_for('profile_page'))
-
-    filename = secure_filename(file.filename)
-    ext = os.path.splitext(filename)[1].lower()
-    if ext not in {'.png', '.jpg', '.jpeg', '.gif', '.webp'}:
-        flash('Invalid file type. Allowed: png, jpg, jpeg, gif, webp', 'danger')
-        return redirect(url_for('profile_page'))
-    # Save as user_id.ext to avoid duplicates
-    new_name = f"{session['user_id']}{ext}"
-    save_path = os.path.join(app.config['UPLOAD_FOLDER'], new_name)
-    file.save(save_path)
-
-    # Store relative path from static/ to use with url_for('static')
-    rel_path = os.path.join('uploads', 'avatars', new_name).replace('\\', '/')
-    try:
-        UserModel.set_profile_image(session['user_id'], rel_path)
-        flash('Avatar updated successfully.', 'success')
-    except Exception as e:
-        flash('Failed to save avatar.', 'danger')
-
-    return redirect(url_for('profile_page'))
-
-# =======================
-# LOGOUT FUNCTIONALITY
-# =======================
-
-@app.route('/logout')
-def logout():
-    """Global logout route that works whether auth blueprint is present or not."""
-    if 'auth_bp' in globals():
-        return redirect(url_for('auth_bp.logout'))
-    session.clear()
-    return redirect(url_for('index'))
-# =======================
-# API ENDPOINTS
-# =======================
-
-@app.route('/api/dashboard_stats')
-def api_dashboard_stats():
-    # Aggregate counts
-    bconn = BookModel.connect()
-    bcur = bconn.cursor()
-    bcur.execute('SELECT COUNT(*) as c FROM books')
-    total_books = bcur.fetchone()[0]
-    bconn.close()
-
-    mconn = MemberModel.connect()
-    mcur = mconn.cursor()
-    mcur.execute('SELECT COUNT(*) as c FROM members')
-    total_members = mcur.fetchone()[0]
-    mconn.close()
-
-    tconn = TransactionModel.connect()
-    tcur = tconn.cursor()
-    tcur.execute("SELECT COUNT(*) FROM transactions WHERE return_date IS NULL")
-    books_issued = tcur.fetchone()[0]
-
-    tcur.execute('''
-        SELECT b.title AS book_title, COUNT(*) AS count
-        FROM transactions t
-        JOIN books b ON b.id = t.book_id
-        GROUP BY b.id
-        ORDER BY count DESC
-        LIMIT 5
-    ''')
-    popular_books = [{"title": r[0], "count": r[1]} for r in tcur.fetchall()]
-
-    tcur.execute('''
-        SELECT m.full_name AS member_name, b.title AS book_title, t.issue_date
-        FROM transactions t
-        JOIN members m ON m.id = t.member_id
-        JOIN books b ON b.id = t.book_id
-        ORDER BY t.issue_date DESC
-        LIMIT 5
-    ''')
-    recent_transactions = [
-        {"member": r[0], "book": r[1], "issue_date": r[2]} for r in tcur.fetchall()
-    ]
-    tconn.close()
-
-    data = {
-        "totalBooks": total_books,
-        "totalMembers": total_members,
-        "booksIssued": books_issued,
-        "popularBooks": popular_books,
-        "recentTransactions": recent_transactions
-    }
-    return jsonify(data)
+    @app.route('/avatars/<path:filename>')
+    def avatar_file(filename):
+        """Serve avatars; resized variants are named by content and cached for good."""
+        if avatars.variants(filename) is None:
+            # Legacy single-file avatars keep their name when replaced: revalidate
+            return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+        resp = send_from_directory(app.config['UPLOAD_FOLDER'], filename,
+                                   max_age=app.config['AVATAR_MAX_AGE'])
+        resp.cache_control.public = True
+        resp.cache_control.immutable = True
+        return resp
+
+    # =======================
+    # LOGOUT FUNCTIONALITY
+    # =======================
+
+    @app.route('/logout')
+    def logout():
+        """Global logout route that works whether auth blueprint is present or not."""
+        if 'auth_bp' in globals():
+            return redirect(url_for('auth_bp.logout'))
+        session.clear()
+        return redirect(url_for('index'))
+
+    # =======================
+    # API ENDPOINTS
+    # =======================
+
+    @app.route('/api/dashboard_stats')
+    def api_dashboard_stats():
+        # Aggregate counts, all from one read-only snapshot
+        conn = db.connect_readonly()
+        cur = conn.cursor()
+        cur.execute('SELECT COUNT(*) as c FROM books')
+        total_books = cur.fetchone()[0]
+
+        cur.execute('SELECT COUNT(*) as c FROM members')
+        total_members = cur.fetchone()[0]
+
+        cur.execute("SELECT COUNT(*) FROM transactions WHERE return_date IS NULL")
+        books_issued = cur.fetchone()[0]
+
+        cur.execute('''
+            SELECT b.title AS book_title, COUNT(*) AS count
+            FROM ledger t
+            JOIN books b ON b.id = t.book_id
+            GROUP BY b.id
+            ORDER BY count DESC
+            LIMIT 5
+        ''')
+        popular_books = [{"title": r[0], "count": r[1]} for r in cur.fetchall()]
+
+        cur.execute('''
+            SELECT m.full_name AS member_name, b.title AS book_title, t.issue_date
+            FROM transactions t
+            JOIN members m ON m.id = t.member_id
+            JOIN books b ON b.id = t.book_id
+            ORDER BY t.issue_date DESC
+            LIMIT 5
+        ''')
+        recent_transactions = [
+            {"member": r[0], "book": r[1], "issue_date": r[2]} for r in cur.fetchall()
+        ]
+        conn.close()
+
+        data = {
+            "totalBooks": total_books,
+            "totalMembers": total_members,
+            "booksIssued": books_issued,
+            "popularBooks": popular_books,
+            "recentTransactions": recent_transactions
+        }
+        return jsonify(data)
+
+    @app.route('/api/dashboard/events')
+    def dashboard_events():
+        """Server-Sent Events: ``issued``/``returned`` frames with the issued count.
+
+        Every open dashboard in this worker shares the frames the tail thread
+        reads from the change log (models/events.py); the stream itself never
+        touches the database.
+        """
+        try:
+            q = events.subscribe(request.headers.get('Last-Event-ID', type=int))
+        except events.TooManySubscribers:
+            # The page keeps its initial numbers and retries later
+            return jsonify({'error': 'too many live dashboards'}), 503, {'Retry-After': '30'}
+        keepalive = app.config['SSE_KEEPALIVE']
+
+        def stream():
+            try:
+                yield b'retry: 5000\n\n'
+                while True:
+                    try:
+                        frame = q.get(timeout=keepalive)
+                    except queue.Empty:
+                        yield b': keepalive\n\n'
+                        continue
+                    if frame is events.DISCONNECT:
+                        return
+                    yield frame
+            finally:
+                events.unsubscribe(q)
+
+        return Response(stream(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+app = create_app()
 
 # =======================
 # RUN FLASK APP
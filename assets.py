@@ -0,0 +1,217 @@
+# assets.py
+"""Static asset pipeline: minify, bundle, fingerprint.
+
+``flask --app app assets`` concatenates the source files of every bundle
+below, minifies them, and writes ``static/dist/<bundle>.<hash>.<ext>`` plus
+``manifest.json``. Templates call ``asset_tags('<bundle>')``: with a
+manifest it emits one tag for the fingerprinted file (served by
+``/assets/<file>`` with an immutable Cache-Control); without one (local
+development) it emits one tag per source file so edits show up directly.
+"""
+import hashlib
+import json
+import os
+import re
+
+import click
+from flask import current_app, send_from_directory, url_for
+from flask.cli import with_appcontext
+from markupsafe import Markup, escape
+
+# Logical bundle name -> source files under static/
+BUNDLES = {
+    'base.css': ['css/style.css', 'css/modern-style.css'],
+    'base.js': ['js/main.js'],
+    'auth.css': ['css/style.css', 'css/authentication.css'],
+    'avatar.js': ['js/avatar.js'],
+    'home.css': ['css/home.css'],
+    'books.css': ['css/books.css'],
+    'books.js': ['js/books.js'],
+    'categories.css': ['css/categories.css'],
+    'categories.js': ['js/categories.js'],
+    'members.js': ['js/members.js'],
+    'overdue_members.css': ['css/overdue_members.css'],
+    'overdue_members.js': ['js/overdue_members.js'],
+    'popular_books.css': ['css/popular_books.css'],
+    'popular_books.js': ['js/popular_books.js'],
+    'profile.css': ['css/profile.css'],
+    'profile.js': ['js/profile.js'],
+    'reports.css': ['css/reports.css'],
+    'reports.js': ['js/reports.js'],
+    'settings.css': ['css/settings.css'],
+    'settings.js': ['js/settings.js'],
+}
+
+MANIFEST_NAME = 'manifest.json'
+
+# Loaded manifests keyed by dist directory; rebuilt by init_app()/build().
+_manifests = {}
+
+
+def minify_css(text):
+    """Strip comments and redundant whitespace from a stylesheet."""
+    text = re.sub(r'/\*.*?\*/', '', text, flags=re.S)
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'\s*([{};,])\s*', r'\1', text)
+    return text.replace(';}', '}').strip()
+
+
+def minify_js(text):
+    """Conservative JS minification: drop comment-only lines, indentation and blank lines.
+
+    Whitespace inside a string is part of its value, so a line that starts
+    inside a template literal (or a string continued with a backslash) is
+    kept as it is, and one that ends inside it keeps its trailing spaces.
+    Strings, template literals and comments are followed with
+    :func:`_scan_js`, which does not recognise regex literals: a quote or
+    backtick inside one can throw it off, so keep those out of bundled code.
+    """
+    lines = []
+    stack = []
+    for line in text.splitlines():
+        starts_in_string = bool(stack) and stack[-1] in _JS_STRINGS
+        _scan_js(line, stack)
+        if starts_in_string:
+            lines.append(line)
+            continue
+        stripped = line.lstrip()
+        if not (stack and stack[-1] in _JS_STRINGS):
+            stripped = stripped.rstrip()
+        if not stripped or stripped.startswith('//'):
+            continue
+        lines.append(stripped)
+    return '\n'.join(lines)
+
+
+_JS_STRINGS = ('`', "'", '"')
+
+
+def _scan_js(line, stack):
+    """Advance ``stack`` over one line of JS.
+
+    The stack holds what is open at the end of the line: a quote character
+    for a string or template literal, ``'${'`` and ``'{'`` for an expression
+    inside a template (and braces nested in it), ``'/*'`` for a block comment.
+    """
+    i = 0
+    while i < len(line):
+        c = line[i]
+        top = stack[-1] if stack else None
+        if top == '/*':
+            if line.startswith('*/', i):
+                stack.pop()
+                i += 1
+        elif top in _JS_STRINGS:
+            if c == '\\':
+                i += 1
+            elif c == top:
+                stack.pop()
+            elif top == '`' and line.startswith('${', i):
+                stack.append('${')
+                i += 1
+        elif line.startswith('//', i):
+            break
+        elif line.startswith('/*', i):
+            stack.append('/*')
+            i += 1
+        elif c in _JS_STRINGS:
+            stack.append(c)
+        elif c == '{' and top in ('${', '{'):
+            stack.append('{')
+        elif c == '}' and top in ('${', '{'):
+            stack.pop()
+        i += 1
+    # Quoted strings end with the line unless continued with a backslash
+    if stack and stack[-1] in ("'", '"') and not line.endswith('\\'):
+        stack.pop()
+
+
+def build(static_dir, dist_dir):
+    """Write every bundle to ``dist_dir`` and return the new manifest."""
+    os.makedirs(dist_dir, exist_ok=True)
+    manifest = {}
+    for name, sources in BUNDLES.items():
+        base, ext = os.path.splitext(name)
+        parts = []
+        for src in sources:
+            with open(os.path.join(static_dir, src), encoding='utf-8') as fh:
+                parts.append(fh.read())
+        if ext == '.css':
+            content = '\n'.join(minify_css(p) for p in parts)
+        else:
+            content = ';\n'.join(minify_js(p) for p in parts)
+        data = content.encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()[:12]
+        filename = f'{base}.{digest}{ext}'
+        path = os.path.join(dist_dir, filename)
+        if not os.path.exists(path):
+            tmp = path + '.tmp'
+            with open(tmp, 'wb') as fh:
+                fh.write(data)
+            os.replace(tmp, path)
+        manifest[name] = filename
+
+    tmp = os.path.join(dist_dir, MANIFEST_NAME + '.tmp')
+    with open(tmp, 'w', encoding='utf-8') as fh:
+        json.dump(manifest, fh, indent=2, sort_keys=True)
+    os.replace(tmp, os.path.join(dist_dir, MANIFEST_NAME))
+    _manifests.pop(dist_dir, None)
+    return manifest
+
+
+def load_manifest(dist_dir):
+    """Return the manifest in ``dist_dir`` (cached), or {} when not built."""
+    if dist_dir not in _manifests:
+        try:
+            with open(os.path.join(dist_dir, MANIFEST_NAME), encoding='utf-8') as fh:
+                _manifests[dist_dir] = json.load(fh)
+        except FileNotFoundError:
+            _manifests[dist_dir] = {}
+    return _manifests[dist_dir]
+
+
+def asset_urls(name):
+    """URLs that make up a logical bundle for the current app."""
+    manifest = load_manifest(current_app.config['ASSETS_DIR'])
+    if name in manifest:
+        return [url_for('asset_file', filename=manifest[name])]
+    return [url_for('static', filename=src) for src in BUNDLES[name]]
+
+
+def asset_tags(name, **attrs):
+    """Render <link>/<script> tags for a bundle; extra attrs go on each tag."""
+    extra = ''.join(
+        f' {escape(k)}' if v is True else f' {escape(k)}="{escape(v)}"'
+        for k, v in attrs.items()
+    )
+    tags = []
+    for url in asset_urls(name):
+        if name.endswith('.css'):
+            tags.append(f'<link rel="stylesheet" href="{escape(url)}"{extra}>')
+        else:
+            tags.append(f'<script src="{escape(url)}"{extra}></script>')
+    return Markup('\n'.join(tags))
+
+
+@click.command('assets')
+@with_appcontext
+def assets_command():
+    """Build minified, fingerprinted bundles and their manifest."""
+    manifest = build(current_app.static_folder, current_app.config['ASSETS_DIR'])
+    click.echo(f"Built {len(manifest)} bundles into {current_app.config['ASSETS_DIR']}")
+
+
+def init_app(app):
+    """Register the template helper, the /assets route and the CLI command."""
+    _manifests.pop(app.config['ASSETS_DIR'], None)
+    app.jinja_env.globals['asset_tags'] = asset_tags
+    app.jinja_env.globals['asset_urls'] = asset_urls
+    app.cli.add_command(assets_command)
+
+    @app.route('/assets/<path:filename>')
+    def asset_file(filename):
+        resp = send_from_directory(app.config['ASSETS_DIR'], filename,
+                                   max_age=app.config['ASSETS_MAX_AGE'])
+        resp.cache_control.public = True
+        resp.cache_control.immutable = True
+        return resp
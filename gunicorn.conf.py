@@ -0,0 +1,56 @@
+# gunicorn.conf.py
+"""Gunicorn settings for serving wsgi:app with threaded prefork workers.
+
+Sizing: SQLite allows one writer at a time, so extra processes add read
+throughput but not write throughput. Start with one worker per CPU core and
+4 threads per worker (threads cover the time a request waits on SQLite,
+MySQL or bcrypt) and adjust with loadtest.py. Every knob can be overridden
+from the environment.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+worker_class = 'gthread'
+
+# Import the app once in the master; workers inherit it on fork.
+preload_app = True
+
+# Graceful reload: `kill -HUP <master pid>` starts new workers and lets the
+# old ones finish in-flight requests for up to graceful_timeout seconds.
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+
+# Recycle workers now and then to cap memory growth.
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = 200
+
+accesslog = '-'
+errorlog = '-'
+
+
+def when_ready(server):
+    """Run scheduled backups in the master: once per host, not once per worker."""
+    from app import start_backups
+    from wsgi import app
+    start_backups(app)
+
+
+def on_exit(server):
+    from models import backup
+    backup.stop()
+
+
+def post_fork(server, worker):
+    """Build per-worker DB state only after the fork."""
+    from models import db
+    db.init_worker()
+
+
+def worker_exit(server, worker):
+    """Write out audit events still queued in the worker."""
+    from models import audit
+    audit.stop()
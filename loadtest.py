@@ -0,0 +1,80 @@
+"""Small load harness for sizing gunicorn workers and threads.
+
+Usage:
+    python loadtest.py --url http://127.0.0.1:8000 --concurrency 16 --requests 2000
+
+Fires GET requests at a mix of read endpoints from a thread pool and prints
+throughput, error count and latency percentiles.
+"""
+import argparse
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_PATHS = [
+    '/api/dashboard_stats',
+    '/books/api?page=1&per_page=20',
+    '/books/api/popular',
+    '/members/api/overdue',
+    '/api/reports?type=summary',
+]
+
+
+def fetch(url):
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=30) as resp:
+            resp.read()
+            ok = resp.status < 500
+    except urllib.error.HTTPError as e:
+        ok = e.code < 500
+    except Exception:
+        ok = False
+    return time.perf_counter() - start, ok
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+def run(base_url, concurrency, total, paths):
+    urls = [base_url.rstrip('/') + paths[i % len(paths)] for i in range(total)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(fetch, urls))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(r[0] for r in results)
+    errors = sum(1 for r in results if not r[1])
+    return {
+        'requests': total,
+        'errors': errors,
+        'seconds': elapsed,
+        'rps': total / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--path', action='append', dest='paths',
+                        help='endpoint to hit (repeatable); defaults to the read APIs')
+    args = parser.parse_args()
+
+    stats = run(args.url, args.concurrency, args.requests, args.paths or DEFAULT_PATHS)
+    print(f"{stats['requests']} requests, {stats['errors']} errors in {stats['seconds']:.2f}s "
+          f"({stats['rps']:.1f} req/s)")
+    print(f"p50 {stats['p50_ms']:.1f} ms | p95 {stats['p95_ms']:.1f} ms | p99 {stats['p99_ms']:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,251 @@
+import threading
+import time
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; reports then run as SQL queries
+    np = None
+
+from models import archive, db
+
+# Seconds between incremental refreshes; reports in between reuse the arrays.
+REFRESH_INTERVAL = 1.0
+# Open loans are re-checked for a return_date in chunks of this many ids.
+_ID_CHUNK = 500
+
+_snapshots = {}
+_snapshots_lock = threading.Lock()
+
+
+def is_available():
+    """True when NumPy is installed and reports can use the snapshot."""
+    return np is not None
+
+
+def configure(refresh_interval=None):
+    """Set the refresh interval and drop existing snapshots."""
+    global REFRESH_INTERVAL
+    if refresh_interval is not None:
+        REFRESH_INTERVAL = float(refresh_interval)
+    reset()
+
+
+def get_snapshot():
+    """Return the refreshed ledger snapshot for the configured database."""
+    with _snapshots_lock:
+        snap = _snapshots.get(db.DATABASE)
+        if snap is None:
+            snap = _snapshots[db.DATABASE] = LedgerSnapshot()
+    snap.refresh()
+    return snap
+
+
+def reset():
+    """Drop every snapshot (e.g. after a restore or a schema change)."""
+    with _snapshots_lock:
+        _snapshots.clear()
+
+
+class LedgerSnapshot:
+    """Columnar in-memory copy of the ``ledger`` (hot and archived transactions).
+
+    Columns (row i is one loan, ordered by transaction id):
+      ids          int64  transaction id
+      book_ids     int32
+      member_ids   int32
+      issued       int64  issue_date as epoch seconds (-1 if missing)
+      returned     int64  return_date as epoch seconds (-1 while on loan)
+
+    refresh() appends rows with an id above the last one loaded and fills in
+    return dates of loans that were open at the previous refresh. If the
+    ledger's delete counter (:func:`archive.deletes`) moved since, it falls
+    back to a full reload; archiving moves rows between partitions without
+    changing the ledger or the counter.
+    """
+
+    COLUMNS = (
+        ('ids', 'int64'), ('book_ids', 'int32'), ('member_ids', 'int32'),
+        ('issued', 'int64'), ('returned', 'int64'),
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._size = 0
+        self._cols = {name: np.empty(0, dtype=dtype) for name, dtype in self.COLUMNS}
+        self.last_id = 0
+        self.deletes = None
+        self.refreshed_at = 0.0
+
+    def __len__(self):
+        return self._size
+
+    def columns(self):
+        """Return the current columns as a dict of read-only array views."""
+        with self._lock:
+            n = self._size
+            views = {}
+            for name, _ in self.COLUMNS:
+                view = self._cols[name][:n]
+                view.flags.writeable = False
+                views[name] = view
+            return views
+
+    def refresh(self, force=False):
+        with self._lock:
+            if not force and time.monotonic() - self.refreshed_at < REFRESH_INTERVAL:
+                return
+            conn = db.connect_readonly()
+            try:
+                deletes = archive.deletes(conn)
+                if deletes != self.deletes:
+                    self._clear()
+                    self.deletes = deletes
+                self._load_returns(conn)
+                self._load_new(conn)
+            finally:
+                conn.close()
+            self.refreshed_at = time.monotonic()
+
+    def _clear(self):
+        self._size = 0
+        self.last_id = 0
+
+    def _load_new(self, conn):
+        cur = conn.execute('''
+            SELECT id, book_id, member_id,
+                   COALESCE(CAST(strftime('%s', issue_date) AS INTEGER), -1),
+                   COALESCE(CAST(strftime('%s', NULLIF(return_date, '')) AS INTEGER), -1)
+            FROM ledger
+            WHERE id > ?
+            ORDER BY id
+        ''', (self.last_id,))
+        while True:
+            rows = cur.fetchmany(50000)
+            if not rows:
+                break
+            block = np.array(rows, dtype=np.int64)
+            self._append(block)
+        if self._size:
+            self.last_id = int(self._cols['ids'][self._size - 1])
+
+    def _append(self, block):
+        n = self._size
+        needed = n + len(block)
+        capacity = len(self._cols['ids'])
+        if needed > capacity:
+            capacity = max(needed, capacity * 2, 1024)
+            for name, dtype in self.COLUMNS:
+                grown = np.empty(capacity, dtype=dtype)
+                grown[:n] = self._cols[name][:n]
+                self._cols[name] = grown
+        for i, (name, _) in enumerate(self.COLUMNS):
+            self._cols[name][n:needed] = block[:, i]
+        self._size = needed
+
+    def _load_returns(self, conn):
+        n = self._size
+        if not n:
+            return
+        ids = self._cols['ids'][:n]
+        returned = self._cols['returned'][:n]
+        open_ids = ids[returned < 0]
+        for start in range(0, len(open_ids), _ID_CHUNK):
+            chunk = [int(x) for x in open_ids[start:start + _ID_CHUNK]]
+            marks = ','.join('?' * len(chunk))
+            rows = conn.execute(f'''
+                SELECT id, CAST(strftime('%s', return_date) AS INTEGER) AS ts
+                FROM ledger
+                WHERE id IN ({marks}) AND ts IS NOT NULL
+            ''', chunk).fetchall()
+            if rows:
+                found = np.array(rows, dtype=np.int64)
+                pos = np.searchsorted(ids, found[:, 0])
+                returned[pos] = found[:, 1]
+
+
+# =======================
+# VECTORIZED REPORTS
+# =======================
+DAY = 86400
+
+
+def count_between(values, start, end):
+    """Number of epoch values within [start, end]."""
+    return int(np.count_nonzero((values >= start) & (values <= end)))
+
+
+def issued_by_day(cols, start, days):
+    """Issue counts per day for ``days`` days starting at epoch ``start``."""
+    return _per_day(cols['issued'], start, days)
+
+
+def returned_by_day(cols, start, days):
+    """Return counts per day for ``days`` days starting at epoch ``start``."""
+    return _per_day(cols['returned'], start, days)
+
+
+def _per_day(values, start, days):
+    end = start + days * DAY
+    in_range = values[(values >= start) & (values < end)]
+    return np.bincount((in_range - start) // DAY, minlength=days)[:days]
+
+
+def top_books(cols, start, end, limit):
+    """``[(book_id, count), ...]`` ordered by issues within [start, end], most first."""
+    issued = cols['issued']
+    book_ids = cols['book_ids'][(issued >= start) & (issued <= end)]
+    if not len(book_ids):
+        return []
+    counts = np.bincount(book_ids)
+    candidates = np.flatnonzero(counts)
+    order = np.argsort(-counts[candidates], kind='stable')
+    ranked = candidates[order]
+    return [(int(b), int(counts[b])) for b in ranked[:limit]]
+
+
+def loan_duration_histogram(cols, start, end, edges_days):
+    """Histogram of loan lengths (days) for loans returned within [start, end]."""
+    returned = cols['returned']
+    issued = cols['issued']
+    mask = (returned >= start) & (returned <= end) & (issued >= 0)
+    durations = (returned[mask] - issued[mask]) / DAY
+    counts, _ = np.histogram(durations, bins=np.asarray(edges_days, dtype=float))
+    return [int(c) for c in counts]
+
+
+def loan_seconds_in_range(cols, start, end, now):
+    """Seconds each loan spent on loan within [start, end]; open loans run until ``now``."""
+    issued = cols['issued']
+    returned = np.where(cols['returned'] < 0, now, cols['returned'])
+    lo = np.maximum(issued, start)
+    hi = np.minimum(returned, end + 1)
+    return np.where(issued >= 0, np.clip(hi - lo, 0, None), 0)
+
+
+def loan_seconds_by_book(cols, start, end, now):
+    """``{book_id: seconds on loan within [start, end]}`` for books with any."""
+    secs = loan_seconds_in_range(cols, start, end, now)
+    totals = np.bincount(cols['book_ids'], weights=secs)
+    return {int(b): int(totals[b]) for b in np.flatnonzero(totals)}
+
+
+def issues_by_book(cols, start, end):
+    """``{book_id: issues within [start, end]}``."""
+    issued = cols['issued']
+    counts = np.bincount(cols['book_ids'][(issued >= start) & (issued <= end)])
+    return {int(b): int(counts[b]) for b in np.flatnonzero(counts)}
+
+
+def issues_by_member(cols, start, end):
+    """``{member_id: issues within [start, end]}``."""
+    issued = cols['issued']
+    counts = np.bincount(cols['member_ids'][(issued >= start) & (issued <= end)])
+    return {int(m): int(counts[m]) for m in np.flatnonzero(counts)}
+
+
+def loan_durations(cols, start, end):
+    """Sorted loan lengths (days) for loans returned within [start, end]."""
+    returned = cols['returned']
+    issued = cols['issued']
+    mask = (returned >= start) & (returned <= end) & (issued >= 0) & (returned >= issued)
+    return np.sort((returned[mask] - issued[mask]) / DAY)
@@ -0,0 +1,191 @@
+"""Hot/cold split of the transaction ledger.
+
+Returned loans older than ``ARCHIVE_AFTER_DAYS`` are moved in small batches
+from ``transactions`` (the hot partition the circulation desk works on) to
+``transactions_archive``. The ``ledger`` view is the union of both and is
+what historical reports read. ``archive_state.horizon`` holds the latest
+return_date ever archived: a query whose date range starts after it can
+read the hot partition alone (see :func:`source`). ``archive_state.deletes``
+counts rows that left the ledger for good, kept by triggers that ignore
+rows moved to the archive (see :func:`deletes`).
+"""
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+from models import db
+
+log = logging.getLogger(__name__)
+
+# Rows moved per write transaction, and the pause between batches (seconds)
+BATCH_SIZE = 500
+BATCH_PAUSE = 0.05
+
+_thread = None
+_stop = threading.Event()
+_options = None
+
+
+def create_table():
+    """Create the archive table, its state row and the ``ledger`` view."""
+    conn = db.connect()
+    cur = conn.cursor()
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS transactions_archive (
+            id INTEGER PRIMARY KEY,
+            member_id INTEGER NOT NULL,
+            book_id INTEGER NOT NULL,
+            issue_date TEXT,
+            return_date TEXT,
+            copy_id INTEGER
+        )
+    ''')
+    cur.execute("PRAGMA table_info(transactions_archive)")
+    if 'copy_id' not in {row[1] for row in cur.fetchall()}:
+        cur.execute("ALTER TABLE transactions_archive ADD COLUMN copy_id INTEGER")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_transactions_archive_issue_date ON transactions_archive (issue_date)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_transactions_archive_return_date ON transactions_archive (return_date)")
+    cur.execute("CREATE TABLE IF NOT EXISTS archive_state (key TEXT PRIMARY KEY, value TEXT)")
+    cur.execute("INSERT OR IGNORE INTO archive_state (key, value) VALUES ('deletes', 0)")
+    # Views can't be altered: recreate one from before the copy_id column
+    cur.execute("PRAGMA table_info(ledger)")
+    if 'copy_id' not in {row[1] for row in cur.fetchall()}:
+        cur.execute("DROP VIEW IF EXISTS ledger")
+    cur.execute('''
+        CREATE VIEW IF NOT EXISTS ledger AS
+        SELECT id, member_id, book_id, issue_date, return_date, copy_id FROM transactions
+        UNION ALL
+        SELECT id, member_id, book_id, issue_date, return_date, copy_id FROM transactions_archive
+    ''')
+    # A hot row already copied to the archive is being moved, not deleted
+    cur.execute('''
+        CREATE TRIGGER IF NOT EXISTS transactions_ledger_delete AFTER DELETE ON transactions
+        WHEN NOT EXISTS (SELECT 1 FROM transactions_archive WHERE id = OLD.id)
+        BEGIN
+            UPDATE archive_state SET value = value + 1 WHERE key = 'deletes';
+        END
+    ''')
+    cur.execute('''
+        CREATE TRIGGER IF NOT EXISTS transactions_archive_ledger_delete AFTER DELETE ON transactions_archive
+        BEGIN
+            UPDATE archive_state SET value = value + 1 WHERE key = 'deletes';
+        END
+    ''')
+    conn.commit()
+    conn.close()
+
+
+def horizon(conn):
+    """Latest return_date moved to the archive, or None if nothing was."""
+    row = conn.execute("SELECT value FROM archive_state WHERE key = 'horizon'").fetchone()
+    return row[0] if row else None
+
+
+def deletes(conn):
+    """Number of rows ever deleted from the ledger (archiving doesn't count)."""
+    row = conn.execute("SELECT value FROM archive_state WHERE key = 'deletes'").fetchone()
+    return int(row[0]) if row else 0
+
+
+def source(conn, since=None):
+    """Table to read for rows dated ``since`` ('YYYY-MM-DD HH:MM:SS') or later.
+
+    Archived loans were returned (and so issued) no later than the horizon,
+    so ranges starting after it only need the hot ``transactions`` table.
+    Without ``since`` the whole history is wanted and ``ledger`` is used.
+    """
+    last = horizon(conn)
+    if last is None or (since is not None and since > last):
+        return 'transactions'
+    return 'ledger'
+
+
+def archive_batch(conn, cutoff, batch_size=None):
+    """Move up to ``batch_size`` loans returned before ``cutoff``; returns the count."""
+    ids = [r[0] for r in conn.execute('''
+        SELECT id FROM transactions
+        WHERE return_date IS NOT NULL AND return_date != '' AND return_date < ?
+        ORDER BY id
+        LIMIT ?
+    ''', (cutoff, batch_size or BATCH_SIZE))]
+    if not ids:
+        return 0
+    marks = ','.join('?' * len(ids))
+    # OR IGNORE + the archive check make a batch that raced another archiver a no-op
+    conn.execute(f'''
+        INSERT OR IGNORE INTO transactions_archive (id, member_id, book_id, issue_date, return_date, copy_id)
+        SELECT id, member_id, book_id, issue_date, return_date, copy_id
+        FROM transactions WHERE id IN ({marks})
+    ''', ids)
+    latest = conn.execute(
+        f"SELECT MAX(return_date) FROM transactions_archive WHERE id IN ({marks})", ids
+    ).fetchone()[0]
+    conn.execute(f'''
+        DELETE FROM transactions
+        WHERE id IN ({marks}) AND id IN (SELECT id FROM transactions_archive)
+    ''', ids)
+    conn.execute('''
+        INSERT INTO archive_state (key, value) VALUES ('horizon', ?)
+        ON CONFLICT (key) DO UPDATE SET value = MAX(value, excluded.value)
+    ''', (latest,))
+    return len(ids)
+
+
+def archive_older_than(days, batch_size=None, pause=None):
+    """Archive every loan returned more than ``days`` ago, one batch per write.
+
+    Each batch is its own short transaction so circulation writes are only
+    ever blocked for one batch. Returns the number of rows moved.
+    """
+    cutoff = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+    batch_size = batch_size or BATCH_SIZE
+    moved = 0
+    while True:
+        n = db.write(archive_batch, cutoff, batch_size)
+        moved += n
+        if n < batch_size:
+            return moved
+        time.sleep(BATCH_PAUSE if pause is None else pause)
+
+
+def start(days, interval=3600, batch_size=None):
+    """Archive in a background thread every ``interval`` seconds (per process)."""
+    global _options
+    _options = (days, interval, batch_size)
+    _start_thread()
+
+
+def stop():
+    global _thread, _options
+    # Forget the options too, or the next fork would start it again
+    _options = None
+    _stop.set()
+    if _thread is not None:
+        _thread.join(timeout=5)
+    _thread = None
+
+
+def _start_thread():
+    global _thread
+    _stop.clear()
+    _thread = threading.Thread(target=_run, args=_options, name='archiver', daemon=True)
+    _thread.start()
+
+
+def _run(days, interval, batch_size):
+    # Wait one interval first so app start-up never touches the database
+    while not _stop.wait(interval):
+        try:
+            moved = archive_older_than(days, batch_size)
+            if moved:
+                log.info('Archived %d transactions returned over %s days ago', moved, days)
+        except Exception:
+            log.exception('Archiving transactions failed')
+
+
+@db.register_after_fork
+def _restart_after_fork():
+    # Threads do not survive fork; give each worker its own archiver
+    if _options is not None:
+        _start_thread()
@@ -0,0 +1,264 @@
+"""Append-only audit log of destructive changes.
+
+Models call :func:`record` after a delete or update has committed. The
+event goes into a bounded in-memory queue and a background thread writes
+queued events in one INSERT batch once ``batch_size`` have piled up or
+``flush_interval`` seconds have passed, so auditing adds no write to the
+request itself. When the queue is full the caller writes its event
+directly instead of dropping it (on its own ``conn`` when it passes the
+one of a write in progress), and :func:`stop` (run at exit and when a
+server worker shuts down) flushes whatever is left.
+
+The log is only ever inserted into. Events reach the table within about
+one flush interval; :func:`query` reads the table, newest first.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from models import db
+
+log = logging.getLogger(__name__)
+
+BATCH_SIZE = 100
+FLUSH_INTERVAL = 1.0
+QUEUE_SIZE = 10000
+
+_queue = queue.Queue(QUEUE_SIZE)
+_thread = None
+_pid = None
+# Put on the queue by stop() to wake the writer and end it
+_STOP = object()
+# Held by the writer from taking a batch until it is written, so flush()
+# never returns while events sit in a batch still being collected
+_lock = threading.Lock()
+# Guards starting the writer and the stats counters, which request threads
+# and the writer both update
+_state_lock = threading.Lock()
+stats = {'recorded': 0, 'written': 0, 'batches': 0, 'direct': 0}
+
+
+def create_table():
+    conn = db.connect()
+    cur = conn.cursor()
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS audit_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            occurred_at TEXT NOT NULL,
+            entity TEXT NOT NULL,
+            entity_id INTEGER,
+            action TEXT NOT NULL,
+            actor TEXT,
+            data TEXT
+        )
+    ''')
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_audit_entity ON audit_log (entity, entity_id, occurred_at)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_audit_time ON audit_log (occurred_at)")
+    conn.commit()
+    conn.close()
+
+
+def snapshot(conn, table, row_id):
+    """The row ``row_id`` of ``table`` as a dict (None if missing), read on ``conn``."""
+    cur = conn.execute(f'SELECT * FROM {table} WHERE id = ?', (row_id,))
+    row = cur.fetchone()
+    if row is None:
+        return None
+    return dict(zip([d[0] for d in cur.description], row))
+
+
+def configure(batch_size=None, flush_interval=None, queue_size=None):
+    """Apply settings; a new queue size replaces the (flushed) queue."""
+    global BATCH_SIZE, FLUSH_INTERVAL, QUEUE_SIZE, _queue
+    if batch_size is not None:
+        BATCH_SIZE = int(batch_size)
+    if flush_interval is not None:
+        FLUSH_INTERVAL = float(flush_interval)
+    if queue_size is not None and int(queue_size) != QUEUE_SIZE:
+        stop()
+        QUEUE_SIZE = int(queue_size)
+        _queue = queue.Queue(QUEUE_SIZE)
+
+
+def record(entity, entity_id, action, data=None, actor=None, conn=None):
+    """Queue one audit event; ``data`` is any JSON-serializable detail.
+
+    Pass ``conn`` when calling from inside a ``db.write`` callback: a full
+    queue then inserts on it, where a second ``db.write`` would wait on
+    the write that is running it.
+    """
+    event = (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), entity, entity_id, action,
+             actor if actor is not None else _current_actor(),
+             json.dumps(data, default=str) if data is not None else None)
+    _count(recorded=1)
+    _ensure_thread()
+    try:
+        _queue.put_nowait(event)
+    except queue.Full:
+        # Never lose an event: pay for one synchronous insert instead
+        _count(direct=1)
+        if conn is not None:
+            _insert(conn, [event])
+            _count(written=1, batches=1)
+        else:
+            _write([event])
+
+
+def _count(**deltas):
+    with _state_lock:
+        for name, n in deltas.items():
+            stats[name] += n
+
+
+def _current_actor():
+    try:
+        from flask import has_request_context, session
+    except ImportError:
+        return None
+    if has_request_context():
+        user_id = session.get('user_id')
+        return str(user_id) if user_id is not None else None
+    return None
+
+
+def _write(events):
+    db.write(_insert, events)
+    _count(written=len(events), batches=1)
+
+
+def _insert(conn, events):
+    conn.executemany('''
+        INSERT INTO audit_log (occurred_at, entity, entity_id, action, actor, data)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', events)
+
+
+def _drain(limit=None):
+    events = []
+    while limit is None or len(events) < limit:
+        try:
+            events.append(_queue.get_nowait())
+        except queue.Empty:
+            break
+    return events
+
+
+def flush():
+    """Write every queued event now."""
+    with _lock:
+        while True:
+            events = _drain(BATCH_SIZE)
+            if not events:
+                return
+            _write(events)
+
+
+def _run():
+    stopping = False
+    while not stopping:
+        event = _queue.get()
+        if event is _STOP:
+            return
+        with _lock:
+            events = [event]
+            # Write when the batch is full or one interval after its first event
+            deadline = time.monotonic() + FLUSH_INTERVAL
+            while len(events) < BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    event = _queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if event is _STOP:
+                    stopping = True
+                    break
+                events.append(event)
+            try:
+                _write(events)
+            except Exception:
+                log.exception('Writing %d audit events failed', len(events))
+
+
+def _ensure_thread():
+    """Start the writer lazily, once per process (threads don't survive fork)."""
+    global _thread, _pid
+    if _thread is not None and _pid == os.getpid() and _thread.is_alive():
+        return
+    with _state_lock:
+        if _thread is not None and _pid == os.getpid() and _thread.is_alive():
+            return
+        _pid = os.getpid()
+        _thread = threading.Thread(target=_run, name='audit-writer', daemon=True)
+        _thread.start()
+
+
+def stop():
+    """Stop the writer thread and flush the rest of the queue."""
+    global _thread
+    if _thread is not None and _pid == os.getpid() and _thread.is_alive():
+        try:
+            _queue.put(_STOP, timeout=5)
+        except queue.Full:
+            pass
+        _thread.join(timeout=5)
+    _thread = None
+    try:
+        flush()
+    except Exception:
+        log.exception('Flushing the audit log failed')
+
+
+atexit.register(stop)
+
+
+def query(entity=None, entity_id=None, since=None, until=None, action=None, before_id=None, limit=100):
+    """Audit events matching the filters, newest first.
+
+    Page with ``before_id`` set to the id of the last event of the previous page.
+    """
+    where, params = [], []
+    if entity:
+        where.append('entity = ?')
+        params.append(entity)
+    if entity_id is not None:
+        where.append('entity_id = ?')
+        params.append(entity_id)
+    if since:
+        where.append('occurred_at >= ?')
+        params.append(since)
+    if until:
+        where.append('occurred_at < ?')
+        params.append(until)
+    if action:
+        where.append('action = ?')
+        params.append(action)
+    if before_id is not None:
+        where.append('(occurred_at, id) < (SELECT occurred_at, id FROM audit_log WHERE id = ?)')
+        params.append(before_id)
+    where_sql = ('WHERE ' + ' AND '.join(where)) if where else ''
+    conn = db.connect_readonly()
+    try:
+        rows = conn.execute(f'''
+            SELECT id, occurred_at, entity, entity_id, action, actor, data
+            FROM audit_log {where_sql}
+            ORDER BY occurred_at DESC, id DESC
+            LIMIT ?
+        ''', params + [limit]).fetchall()
+    finally:
+        conn.close()
+    return [{
+        'id': r['id'],
+        'occurred_at': r['occurred_at'],
+        'entity': r['entity'],
+        'entity_id': r['entity_id'],
+        'action': r['action'],
+        'actor': r['actor'],
+        'data': json.loads(r['data']) if r['data'] else None,
+    } for r in rows]
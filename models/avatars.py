@@ -0,0 +1,89 @@
+import hashlib
+import io
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional; uploads are then stored as-is
+    Image = None
+
+# Square variants written for every upload (px) and their encodings.
+SIZES = (64, 128, 256)
+FORMATS = (('webp', 'WEBP', 'image/webp'), ('jpg', 'JPEG', 'image/jpeg'))
+
+# Variant names are "<content hash>-<size>.<ext>", so a URL never changes
+# content and can be cached forever.
+_VARIANT_RE = re.compile(r'^(?P<prefix>.*/)?(?P<digest>[0-9a-f]{16})-(?P<size>\d+)\.(?P<ext>jpg|webp)$')
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def is_available():
+    """True when Pillow is installed and uploads can be resized."""
+    return Image is not None
+
+
+def check_image(raw_bytes):
+    """Cheap header check so obviously broken uploads fail on the request."""
+    with Image.open(io.BytesIO(raw_bytes)) as img:
+        img.verify()
+
+
+def process(raw_bytes, out_dir):
+    """Decode an upload and write metadata-free resized variants to ``out_dir``.
+
+    Returns the file name of the 256 px JPEG; the other variants share its
+    prefix (see :func:`variants`).
+    """
+    digest = hashlib.sha256(raw_bytes).hexdigest()[:16]
+    with Image.open(io.BytesIO(raw_bytes)) as img:
+        img = ImageOps.exif_transpose(img)
+        img = img.convert('RGB')
+        side = min(img.size)
+        left = (img.width - side) // 2
+        top = (img.height - side) // 2
+        img = img.crop((left, top, left + side, top + side))
+        # convert/crop/resize copy ``info`` along (JPEG comments, ICC, ...);
+        # rebuild from the pixels alone so nothing from the upload is saved
+        img = Image.frombytes('RGB', img.size, img.tobytes())
+
+        os.makedirs(out_dir, exist_ok=True)
+        for size in SIZES:
+            resized = img.resize((size, size), Image.LANCZOS)
+            for ext, fmt, _ in FORMATS:
+                path = os.path.join(out_dir, f'{digest}-{size}.{ext}')
+                if not os.path.exists(path):
+                    tmp = path + '.tmp'
+                    resized.save(tmp, fmt, quality=85)
+                    os.replace(tmp, path)
+    return f'{digest}-{max(SIZES)}.jpg'
+
+
+def variants(rel_path):
+    """Map a stored avatar path to ``{mime: [(rel_path, width), ...]}``.
+
+    Returns None for legacy avatars that were stored as a single raw file.
+    """
+    m = _VARIANT_RE.match(rel_path or '')
+    if not m:
+        return None
+    prefix = m.group('prefix') or ''
+    return {
+        mime: [(f"{prefix}{m.group('digest')}-{size}.{ext}", size) for size in SIZES]
+        for ext, _, mime in FORMATS
+    }
+
+
+def submit(fn, *args):
+    """Run ``fn(*args)`` on the background avatar thread; returns a Future."""
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='avatars')
+            _executor_pid = os.getpid()
+        return _executor.submit(fn, *args)
@@ -0,0 +1,173 @@
+"""Online backups of the SQLite database.
+
+Snapshots are taken with SQLite's backup API, ``pages`` pages per step with
+a short sleep in between, into ``<dir>/library-<timestamp>.db``. Each file
+is checked with ``PRAGMA integrity_check`` before it replaces the oldest
+one. In WAL mode the copy reads one pinned snapshot and writers are never
+blocked; in rollback-journal mode each step holds a shared lock, so the
+longest step (``max_step``) is the longest a writer could have waited.
+
+Scheduled backups run on one thread in one process: the gunicorn master
+(see ``when_ready`` in gunicorn.conf.py), or a cron job running the
+``backup`` command instead.
+"""
+import glob
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, one scheduler per host assumed
+    fcntl = None
+
+from models import db
+
+log = logging.getLogger(__name__)
+
+PREFIX = 'library-'
+LOCK_NAME = '.backup.lock'
+
+_thread = None
+_stop = threading.Event()
+last_result = None
+
+
+class BackupError(Exception):
+    """A snapshot could not be written or failed verification."""
+
+
+def backup(dest_dir, pages=256, sleep=0.01, keep=7):
+    """Write, verify and rotate one snapshot; returns a summary dict.
+
+    Returns None when another process is already backing up into ``dest_dir``.
+    """
+    global last_result
+    os.makedirs(dest_dir, exist_ok=True)
+    with open(os.path.join(dest_dir, LOCK_NAME), 'w') as lock:
+        if fcntl is not None:
+            # A POSIX record lock rather than flock: workers forked from the
+            # master while it backs up must not inherit the lock
+            try:
+                fcntl.lockf(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return None
+        result = _backup(dest_dir, pages, sleep)
+        result['removed'] = rotate(dest_dir, keep)
+    last_result = result
+    log.info('Backup %(path)s: %(pages)d pages in %(duration).2fs, longest step %(max_step).3fs', result)
+    return result
+
+
+def _backup(dest_dir, pages, sleep):
+    stamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+    path = os.path.join(dest_dir, f'{PREFIX}{stamp}.db')
+    tmp = path + '.tmp'
+    started = time.monotonic()
+    steps = []
+    last = [started]
+
+    def progress(status, remaining, total):
+        now = time.monotonic()
+        steps.append(now - last[0])
+        time.sleep(sleep)
+        last[0] = time.monotonic()
+
+    src = sqlite3.connect(db.DATABASE)
+    dst = sqlite3.connect(tmp)
+    try:
+        src.execute(f'PRAGMA busy_timeout = {db.BUSY_TIMEOUT_MS}')
+        wal = src.execute('PRAGMA journal_mode').fetchone()[0].lower() == 'wal'
+        if wal:
+            # Pin one read snapshot so concurrent commits neither block on the
+            # copy nor force it to restart from the first page
+            src.execute('BEGIN')
+            src.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()
+        src.backup(dst, pages=pages, progress=progress)
+        total_pages = dst.execute('PRAGMA page_count').fetchone()[0]
+        # The copy inherits WAL mode; make it a self-contained single file
+        dst.execute('PRAGMA journal_mode = DELETE')
+    except Exception:
+        dst.close()
+        _remove(tmp)
+        raise
+    finally:
+        src.close()
+    dst.close()
+
+    status = verify(tmp)
+    if status != 'ok':
+        _remove(tmp)
+        raise BackupError(f'integrity_check failed: {status}')
+    os.replace(tmp, path)
+    return {
+        'path': path,
+        'pages': total_pages,
+        'steps': len(steps),
+        'duration': time.monotonic() - started,
+        'max_step': max(steps, default=0.0),
+        'finished_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+    }
+
+
+def verify(path):
+    """Run ``PRAGMA integrity_check`` on a snapshot; 'ok' when it is sound."""
+    conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        return '\n'.join(r[0] for r in conn.execute('PRAGMA integrity_check'))
+    finally:
+        conn.close()
+
+
+def snapshots(dest_dir):
+    """Snapshot paths in ``dest_dir``, oldest first."""
+    return sorted(glob.glob(os.path.join(dest_dir, f'{PREFIX}*.db')))
+
+
+def rotate(dest_dir, keep):
+    """Delete all but the newest ``keep`` snapshots; returns the removed paths."""
+    old = snapshots(dest_dir)[:-keep] if keep > 0 else []
+    for path in old:
+        _remove(path)
+    return old
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def start(dest_dir, interval, **options):
+    """Back up every ``interval`` seconds on a background thread.
+
+    Call this in one process only; the thread is deliberately not
+    restarted after fork. The lock file in ``dest_dir`` still keeps a
+    manual ``backup`` command from copying at the same time.
+    """
+    global _thread
+    stop()
+    _stop.clear()
+    _thread = threading.Thread(target=_run, args=(dest_dir, interval, options),
+                               name='backup', daemon=True)
+    _thread.start()
+
+
+def stop():
+    global _thread
+    _stop.set()
+    if _thread is not None:
+        _thread.join(timeout=5)
+    _thread = None
+
+
+def _run(dest_dir, interval, options):
+    while not _stop.wait(interval):
+        try:
+            backup(dest_dir, **options)
+        except Exception:
+            log.exception('Backup failed')
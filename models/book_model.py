@@ -1,12 +1,14 @@
-import sqlite3
+import re
+
+from models import audit, db
+from models.copy_model import CopyModel
+from models.recommendation_model import RecommendationModel
 
 class BookModel:
     @staticmethod
     def connect():
         """Create a database connection with row factory."""
-        conn = sqlite3.connect('library.db')
-        conn.row_factory = sqlite3.Row
-        return conn
+        return db.connect()
 
     @staticmethod
     def create_table():
@@ -25,20 +27,65 @@ class BookModel:
                 available_copies INTEGER
             )
         ''')
+        cur.execute("PRAGMA table_info(books)")
+        existing_cols = {row[1] for row in cur.fetchall()}
+        # ISBN-13 as printed in the cover's EAN barcode, and the library's own label
+        for col_name in ('isbn', 'barcode'):
+            if col_name not in existing_cols:
+                cur.execute(f"ALTER TABLE books ADD COLUMN {col_name} TEXT")
+        cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_books_isbn ON books (isbn) WHERE isbn IS NOT NULL")
+        cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_books_barcode ON books (barcode) WHERE barcode IS NOT NULL")
         conn.commit()
         conn.close()
 
     @staticmethod
-    def add_book(title, author, publisher, year_published, category, total_copies, available_copies):
-        """Add a new book to the database."""
-        conn = BookModel.connect()
+    def normalize_isbn(value):
+        """Return ``value`` as an ISBN-13 string, or None when it is not a valid ISBN.
+
+        Hyphens and spaces are ignored and ISBN-10s are converted, so a
+        scanned EAN and a typed ISBN-10 of the same edition match.
+        """
+        if not value:
+            return None
+        digits = re.sub(r'[\s-]', '', str(value)).upper()
+        if re.fullmatch(r'\d{9}[\dX]', digits):
+            check = sum((10 - i) * (10 if c == 'X' else int(c)) for i, c in enumerate(digits))
+            if check % 11:
+                return None
+            digits = '978' + digits[:9]
+            digits += str((10 - sum(int(c) * (3 if i % 2 else 1) for i, c in enumerate(digits)) % 10) % 10)
+        if not re.fullmatch(r'97[89]\d{10}', digits):
+            return None
+        if sum(int(c) * (3 if i % 2 else 1) for i, c in enumerate(digits)) % 10:
+            return None
+        return digits
+
+    @staticmethod
+    def add_book(title, author, publisher, year_published, category, total_copies, available_copies,
+                 isbn=None, barcode=None):
+        """Add a new book with ``total_copies`` copies, ``available_copies`` of them shelved.
+
+        Raises sqlite3.IntegrityError when the ISBN or barcode is already in use.
+        """
+        return db.write(BookModel._insert_book, title, author, publisher, year_published,
+                        category, total_copies, available_copies, isbn, barcode or None)
+
+    @staticmethod
+    def _insert_book(conn, title, author, publisher, year_published, category, total_copies, available_copies,
+                     isbn=None, barcode=None):
         cur = conn.cursor()
+        # The counters start at zero and are raised by the copies' triggers
         cur.execute('''
-            INSERT INTO books (title, author, publisher, year_published, category, total_copies, available_copies)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (title, author, publisher, year_published, category, total_copies, available_copies))
-        conn.commit()
-        conn.close()
+            INSERT INTO books (title, author, publisher, year_published, category, total_copies, available_copies,
+                               isbn, barcode)
+            VALUES (?, ?, ?, ?, ?, 0, 0, ?, ?)
+        ''', (title, author, publisher, year_published, category, isbn, barcode))
+        book_id = cur.lastrowid
+        total = int(total_copies or 0)
+        available = min(int(available_copies or 0), total)
+        CopyModel._insert_copies(conn, book_id, 'available', available)
+        CopyModel._insert_copies(conn, book_id, 'unavailable', total - available)
+        return book_id
 
     @staticmethod
     def get_all():
@@ -50,6 +97,19 @@ class BookModel:
         conn.close()
         return books
 
+    @staticmethod
+    def iter_all():
+        """Yield all books one at a time instead of materializing the list."""
+        return db.iter_rows('SELECT * FROM books')
+
+    @staticmethod
+    def count():
+        """Return the number of books."""
+        conn = BookModel.connect()
+        total = conn.execute('SELECT COUNT(*) FROM books').fetchone()[0]
+        conn.close()
+        return total
+
     @staticmethod
     def get_by_id(book_id):
         """Retrieve a single book by its ID."""
@@ -61,39 +121,40 @@ class BookModel:
         return row
 
     @staticmethod
-    def delete_book(book_id):
-        """Delete a book by its ID."""
-        conn = BookModel.connect()
-        cur = conn.cursor()
-        cur.execute('DELETE FROM books WHERE id = ?', (book_id,))
-        conn.commit()
-        conn.close()
+    def find_by_code(code):
+        """Find a book by scanned barcode or ISBN with one indexed read.
+
+        A copy's own barcode also matches; the row then carries that copy's
+        ``copy_id``, ``copy_status`` and ``copy_location`` (else None).
+        """
+        code = (code or '').strip()
+        if not code:
+            return None
+        conn = db.connect_readonly()
+        try:
+            return conn.execute('''
+                SELECT b.*, c.id AS copy_id, c.status AS copy_status, c.location AS copy_location
+                FROM copies c JOIN books b ON b.id = c.book_id WHERE c.barcode = ?
+                UNION ALL
+                SELECT b.*, NULL, NULL, NULL FROM books b WHERE b.barcode = ?
+                UNION ALL
+                SELECT b.*, NULL, NULL, NULL FROM books b WHERE b.isbn = ?
+                LIMIT 1
+            ''', (code, code, BookModel.normalize_isbn(code))).fetchone()
+        finally:
+            conn.close()
 
     @staticmethod
-    def decrease_available(book_id):
-        """Decrease available copies for a book by 1, not going below 0."""
-        conn = BookModel.connect()
-        cur = conn.cursor()
-        cur.execute('''
-            UPDATE books
-            SET available_copies = CASE
-                WHEN available_copies > 0 THEN available_copies - 1
-                ELSE 0
-            END
-            WHERE id = ?
-        ''', (book_id,))
-        conn.commit()
-        conn.close()
+    def delete_book(book_id):
+        """Delete a book by its ID; the deleted row is kept in the audit log."""
+        before = db.write(BookModel._delete_book, book_id)
+        if before is not None:
+            audit.record('books', book_id, 'delete', before)
 
     @staticmethod
-    def increase_available(book_id):
-        """Increase available copies for a book by 1."""
-        conn = BookModel.connect()
-        cur = conn.cursor()
-        cur.execute('''
-            UPDATE books
-            SET available_copies = available_copies + 1
-            WHERE id = ?
-        ''', (book_id,))
-        conn.commit()
-        conn.close()
+    def _delete_book(conn, book_id):
+        before = audit.snapshot(conn, 'books', book_id)
+        conn.execute('DELETE FROM copies WHERE book_id = ?', (book_id,))
+        conn.execute('DELETE FROM books WHERE id = ?', (book_id,))
+        RecommendationModel.forget_book(conn, book_id)
+        return before
@@ -0,0 +1,104 @@
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after ``ttl`` seconds.
+
+    The cache is per process: with several gunicorn workers an entry
+    invalidated in one worker can stay stale in the others for up to ``ttl``.
+
+    Keys with a load in flight have a generation number that invalidation
+    bumps, so a value loaded before an invalidation is never stored after it.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        # key -> [generation, loads in flight], only while a load is running
+        self._loading = {}
+        self.hits = 0
+        self.misses = 0
+
+    def configure(self, maxsize=None, ttl=None):
+        """Change the bounds and drop every entry."""
+        with self._lock:
+            if maxsize is not None:
+                self.maxsize = int(maxsize)
+            if ttl is not None:
+                self.ttl = float(ttl)
+            self._clear()
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING or entry[0] <= now:
+                if entry is not _MISSING:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._store(key, value)
+
+    def _store(self, key, value):
+        if self.maxsize <= 0:
+            return
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def get_or_load(self, key, loader):
+        """Return the cached value for ``key`` or cache and return ``loader()``.
+
+        The loaded value is returned but not cached when ``key`` was
+        invalidated while ``loader`` ran.
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        with self._lock:
+            loading = self._loading.setdefault(key, [0, 0])
+            loading[1] += 1
+            generation = loading[0]
+        stored = False
+        try:
+            value = loader()
+            stored = True
+        finally:
+            with self._lock:
+                if stored and loading[0] == generation:
+                    self._store(key, value)
+                loading[1] -= 1
+                if loading[1] == 0:
+                    del self._loading[key]
+        return value
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+            if key in self._loading:
+                self._loading[key][0] += 1
+
+    def clear(self):
+        with self._lock:
+            self._clear()
+
+    def _clear(self):
+        self._data.clear()
+        for loading in self._loading.values():
+            loading[0] += 1
+
+    def __len__(self):
+        return len(self._data)
@@ -0,0 +1,114 @@
+"""Versioned change log for offline-capable desk clients.
+
+Triggers on ``books``, ``members`` and ``transactions`` bump a global
+version in ``sync_state`` and record ``(entity, id, version, op)`` in
+``change_log``. The log is keyed by entity and id, so it holds only the
+latest change of each row: a client that asks for everything after the
+version it last saw gets each changed row once, as its current state, and
+a tombstone for each deleted one. Loans moved to the archive leave the hot
+table and so show up as deletes.
+"""
+from models import db
+
+ENTITIES = ('books', 'members', 'transactions')
+
+# Changes returned per request at most; clients page with the returned version
+BATCH_LIMIT = 500
+
+
+def create_table():
+    """Create the log, its version counter and triggers; seed the log with existing rows."""
+    conn = db.connect()
+    cur = conn.cursor()
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS change_log (
+            entity TEXT NOT NULL,
+            entity_id INTEGER NOT NULL,
+            version INTEGER NOT NULL UNIQUE,
+            op TEXT NOT NULL,
+            PRIMARY KEY (entity, entity_id)
+        ) WITHOUT ROWID
+    ''')
+    cur.execute("CREATE TABLE IF NOT EXISTS sync_state (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+    seeded = cur.execute("SELECT 1 FROM sync_state WHERE key = 'version'").fetchone()
+    conn.commit()
+    conn.close()
+    if not seeded:
+        db.write(_seed)
+    db.write(_create_triggers)
+
+
+def _seed(conn):
+    conn.execute("INSERT INTO sync_state (key, value) VALUES ('version', 0)")
+    for entity in ENTITIES:
+        conn.execute(f'''
+            INSERT INTO change_log (entity, entity_id, version, op)
+            SELECT '{entity}', id,
+                   (SELECT value FROM sync_state WHERE key = 'version') + ROW_NUMBER() OVER (ORDER BY id),
+                   'upsert'
+            FROM {entity}
+        ''')
+        conn.execute('''
+            UPDATE sync_state SET value = (SELECT COALESCE(MAX(version), 0) FROM change_log)
+            WHERE key = 'version'
+        ''')
+
+
+def _create_triggers(conn):
+    for entity in ENTITIES:
+        for event, row, op in (('INSERT', 'NEW', 'upsert'), ('UPDATE', 'NEW', 'upsert'), ('DELETE', 'OLD', 'delete')):
+            conn.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {entity}_change_{event.lower()} AFTER {event} ON {entity}
+                BEGIN
+                    UPDATE sync_state SET value = value + 1 WHERE key = 'version';
+                    INSERT OR REPLACE INTO change_log (entity, entity_id, version, op)
+                    VALUES ('{entity}', {row}.id, (SELECT value FROM sync_state WHERE key = 'version'), '{op}');
+                END
+            ''')
+
+
+def current_version(conn):
+    row = conn.execute("SELECT value FROM sync_state WHERE key = 'version'").fetchone()
+    return row[0] if row else 0
+
+
+def changes_since(since, limit=BATCH_LIMIT):
+    """Changes after version ``since``, oldest first, at most ``limit`` of them.
+
+    Returns ``{'version', 'more', 'changes'}`` where ``changes`` maps each
+    entity to ``{'columns', 'rows', 'deleted'}``: rows are lists in column
+    order. Everything is read from one snapshot, so the rows match the
+    returned ``version``; a client passes it as ``since`` next time and
+    repeats while ``more`` is true.
+    """
+    conn = db.connect_readonly()
+    try:
+        log = conn.execute('''
+            SELECT version, entity, entity_id, op FROM change_log
+            WHERE version > ? ORDER BY version LIMIT ?
+        ''', (since, limit + 1)).fetchall()
+        more = len(log) > limit
+        log = log[:limit]
+        version = log[-1]['version'] if more else max(current_version(conn), since)
+        changes = {}
+        for entity in ENTITIES:
+            ids = [r['entity_id'] for r in log if r['entity'] == entity and r['op'] == 'upsert']
+            deleted = [r['entity_id'] for r in log if r['entity'] == entity and r['op'] == 'delete']
+            if not ids and not deleted:
+                continue
+            columns, rows = _rows(conn, entity, ids)
+            changes[entity] = {'columns': columns, 'rows': rows, 'deleted': deleted}
+    finally:
+        conn.close()
+    return {'version': version, 'more': more, 'changes': changes}
+
+
+def _rows(conn, entity, ids, chunk=500):
+    columns = [d[1] for d in conn.execute(f'PRAGMA table_info({entity})')]
+    rows = []
+    for i in range(0, len(ids), chunk):
+        part = ids[i:i + chunk]
+        marks = ','.join('?' * len(part))
+        rows.extend(list(r) for r in conn.execute(
+            f"SELECT {', '.join(columns)} FROM {entity} WHERE id IN ({marks}) ORDER BY id", part))
+    return columns, rows
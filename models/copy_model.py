@@ -0,0 +1,297 @@
+from datetime import datetime
+
+from models import db
+
+
+class NoCopyAvailable(Exception):
+    """Every copy of the book is out, set aside for a hold or off the shelf."""
+
+
+class CopyModel:
+    """One row per physical item of a book.
+
+    ``status`` is ``available`` (on the shelf), ``on_loan``, ``on_hold`` (set
+    aside for a ready hold), ``unavailable`` (in processing or repair),
+    ``lost`` or ``withdrawn``. Loans and ready holds point at the copy they
+    took. Taking a copy off the shelf is a seek on the partial index over
+    available copies, and ``books.total_copies``/``available_copies`` are
+    kept in step by triggers on this table, so they can no longer be moved
+    without a copy moving with them.
+
+    Every change that puts a copy on the shelf or queues a member ends with
+    :meth:`_serve_holds` inside the same write, so a copy never stays on the
+    shelf while a hold on its book is waiting.
+    """
+
+    STATUSES = ('available', 'on_loan', 'on_hold', 'unavailable', 'lost', 'withdrawn')
+    # Statuses staff may set by hand; loans and holds move copies themselves
+    SHELF_STATUSES = ('available', 'unavailable', 'lost', 'withdrawn')
+
+    @staticmethod
+    def connect():
+        return db.connect()
+
+    @staticmethod
+    def create_table():
+        """Create the copies table and triggers, backfilling copies for existing books."""
+        conn = CopyModel.connect()
+        cur = conn.cursor()
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS copies (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                book_id INTEGER NOT NULL,
+                barcode TEXT,
+                status TEXT NOT NULL DEFAULT 'available',
+                location TEXT,
+                added_at TEXT,
+                FOREIGN KEY (book_id) REFERENCES books(id)
+            )
+        ''')
+        cur.execute('''
+            CREATE INDEX IF NOT EXISTS idx_copies_available
+            ON copies (book_id, id) WHERE status = 'available'
+        ''')
+        # Pinned with INDEXED BY below: without ANALYZE stats the planner
+        # would take the plain book_id index and filter on status
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_copies_book ON copies (book_id)")
+        cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_copies_barcode ON copies (barcode) WHERE barcode IS NOT NULL")
+        conn.commit()
+        missing = cur.execute('''
+            SELECT NOT EXISTS (SELECT 1 FROM copies)
+               AND EXISTS (SELECT 1 FROM books)
+        ''').fetchone()[0]
+        conn.close()
+        if missing:
+            db.write(CopyModel._backfill)
+        db.write(CopyModel._create_triggers)
+
+    @staticmethod
+    def _create_triggers(conn):
+        # Withdrawn copies no longer count towards the book's total
+        conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS copies_counts_insert AFTER INSERT ON copies
+            BEGIN
+                UPDATE books
+                SET total_copies = COALESCE(total_copies, 0) + (NEW.status != 'withdrawn'),
+                    available_copies = COALESCE(available_copies, 0) + (NEW.status = 'available')
+                WHERE id = NEW.book_id;
+            END
+        ''')
+        conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS copies_counts_update AFTER UPDATE OF status ON copies
+            WHEN OLD.status != NEW.status
+            BEGIN
+                UPDATE books
+                SET total_copies = COALESCE(total_copies, 0)
+                        + (NEW.status != 'withdrawn') - (OLD.status != 'withdrawn'),
+                    available_copies = COALESCE(available_copies, 0)
+                        + (NEW.status = 'available') - (OLD.status = 'available')
+                WHERE id = NEW.book_id;
+            END
+        ''')
+        conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS copies_counts_delete AFTER DELETE ON copies
+            BEGIN
+                UPDATE books
+                SET total_copies = COALESCE(total_copies, 0) - (OLD.status != 'withdrawn'),
+                    available_copies = COALESCE(available_copies, 0) - (OLD.status = 'available')
+                WHERE id = OLD.book_id;
+            END
+        ''')
+
+    @staticmethod
+    def _backfill(conn):
+        """Create copies from the old counters, tie them to open loans and ready holds.
+
+        Each book gets one ``on_loan`` copy per open loan, one ``on_hold``
+        copy per ready hold, and enough ``available``/``unavailable`` copies
+        to reach its old total. The counters are then recounted from the
+        copies, which also repairs any drift they had.
+        """
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        for transaction_id, book_id in conn.execute(
+                "SELECT id, book_id FROM transactions WHERE return_date IS NULL ORDER BY id").fetchall():
+            cur = conn.execute("INSERT INTO copies (book_id, status, added_at) VALUES (?, 'on_loan', ?)",
+                               (book_id, now))
+            conn.execute("UPDATE transactions SET copy_id = ? WHERE id = ?", (cur.lastrowid, transaction_id))
+        for hold_id, book_id in conn.execute(
+                "SELECT id, book_id FROM holds WHERE status = 'ready' ORDER BY id").fetchall():
+            cur = conn.execute("INSERT INTO copies (book_id, status, added_at) VALUES (?, 'on_hold', ?)",
+                               (book_id, now))
+            conn.execute("UPDATE holds SET copy_id = ? WHERE id = ?", (cur.lastrowid, hold_id))
+        for book_id, total, available in conn.execute(
+                "SELECT id, COALESCE(total_copies, 0), COALESCE(available_copies, 0) FROM books").fetchall():
+            out = conn.execute("SELECT COUNT(*) FROM copies WHERE book_id = ?", (book_id,)).fetchone()[0]
+            shelf = max(available, 0)
+            CopyModel._insert_copies(conn, book_id, 'available', shelf, now)
+            CopyModel._insert_copies(conn, book_id, 'unavailable', max(total - out - shelf, 0), now)
+        CopyModel._recount(conn)
+
+    @staticmethod
+    def _recount(conn, book_id=None):
+        where = 'WHERE id = ?' if book_id is not None else ''
+        conn.execute(f'''
+            UPDATE books SET
+                total_copies = (SELECT COUNT(*) FROM copies c
+                                WHERE c.book_id = books.id AND c.status != 'withdrawn'),
+                available_copies = (SELECT COUNT(*) FROM copies c
+                                    WHERE c.book_id = books.id AND c.status = 'available')
+            {where}
+        ''', () if book_id is None else (book_id,))
+
+    @staticmethod
+    def _insert_copies(conn, book_id, status, count, added_at=None):
+        added_at = added_at or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        conn.executemany(
+            "INSERT INTO copies (book_id, status, added_at) VALUES (?, ?, ?)",
+            [(book_id, status, added_at)] * int(count or 0))
+
+    @staticmethod
+    def add_copy(book_id, barcode=None, location=None, status='available'):
+        """Add one physical copy; raises sqlite3.IntegrityError on a duplicate barcode."""
+        added_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        return db.write(CopyModel._insert_copy, book_id, barcode or None, location or None, status, added_at)
+
+    @staticmethod
+    def _insert_copy(conn, book_id, barcode, location, status, added_at):
+        cur = conn.execute('''
+            INSERT INTO copies (book_id, barcode, status, location, added_at)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (book_id, barcode, status, location, added_at))
+        if status == 'available':
+            CopyModel._serve_holds(conn, book_id, added_at)
+        return cur.lastrowid
+
+    @staticmethod
+    def get_by_id(copy_id):
+        conn = CopyModel.connect()
+        row = conn.execute('SELECT * FROM copies WHERE id = ?', (copy_id,)).fetchone()
+        conn.close()
+        return row
+
+    @staticmethod
+    def find_by_barcode(barcode):
+        """The copy with this barcode, or None."""
+        conn = db.connect_readonly()
+        try:
+            return conn.execute('SELECT * FROM copies WHERE barcode = ?', (barcode,)).fetchone()
+        finally:
+            conn.close()
+
+    @staticmethod
+    def for_book(book_id):
+        """All copies of a book with the loan or hold each one is tied to."""
+        return db.iter_rows('''
+            SELECT c.*, t.id AS transaction_id, t.member_id AS borrower_id, h.id AS hold_id
+            FROM copies c
+            LEFT JOIN transactions t ON t.copy_id = c.id AND t.return_date IS NULL
+            LEFT JOIN holds h ON h.copy_id = c.id AND h.status = 'ready'
+            WHERE c.book_id = ?
+            ORDER BY c.id
+        ''', (book_id,))
+
+    @staticmethod
+    def available_count(book_id):
+        """Copies on the shelf, counted on the partial index."""
+        conn = db.connect_readonly()
+        try:
+            return conn.execute(
+                "SELECT COUNT(*) FROM copies INDEXED BY idx_copies_available"
+                " WHERE book_id = ? AND status = 'available'",
+                (book_id,)).fetchone()[0]
+        finally:
+            conn.close()
+
+    @staticmethod
+    def update(copy_id, status=None, location=None):
+        """Change a copy's shelf status and/or location; returns False if it is unknown or busy."""
+        return db.write(CopyModel._update, copy_id, status, location)
+
+    @staticmethod
+    def _update(conn, copy_id, status, location):
+        row = conn.execute('SELECT status FROM copies WHERE id = ?', (copy_id,)).fetchone()
+        if row is None or (status is not None and row[0] in ('on_loan', 'on_hold')):
+            return False
+        if status == 'available':
+            CopyModel._release(conn, copy_id)
+        elif status is not None:
+            conn.execute('UPDATE copies SET status = ? WHERE id = ?', (status, copy_id))
+        if location is not None:
+            conn.execute('UPDATE copies SET location = ? WHERE id = ?', (location or None, copy_id))
+        return True
+
+    @staticmethod
+    def _take(conn, book_id, copy_id=None, status='on_loan'):
+        """Move an available copy (a given one, or the lowest id) to ``status``.
+
+        Raises NoCopyAvailable when there is none; the caller's write is then
+        rolled back as a whole.
+        """
+        if copy_id is None:
+            row = conn.execute('''
+                SELECT id FROM copies INDEXED BY idx_copies_available
+                WHERE book_id = ? AND status = 'available' ORDER BY id LIMIT 1
+            ''', (book_id,)).fetchone()
+            if row is None:
+                raise NoCopyAvailable(book_id)
+            copy_id = row[0]
+        cur = conn.execute('''
+            UPDATE copies SET status = ? WHERE id = ? AND book_id = ? AND status = 'available'
+        ''', (status, copy_id, book_id))
+        if cur.rowcount == 0:
+            raise NoCopyAvailable(book_id)
+        return copy_id
+
+    @staticmethod
+    def _release(conn, copy_id, now=None):
+        """Put a copy back on the shelf and serve its book's hold queue.
+
+        Returns the id of the hold the copy was set aside for, or None when
+        nobody was waiting (or ``copy_id`` is None).
+        """
+        if copy_id is None:
+            return None
+        rows = conn.execute(
+            "UPDATE copies SET status = 'available' WHERE id = ? RETURNING book_id", (copy_id,)).fetchall()
+        if not rows:
+            return None
+        served = CopyModel._serve_holds(conn, rows[0][0], now)
+        return served[0] if served else None
+
+    @staticmethod
+    def _serve_holds(conn, book_id, now=None):
+        """Set shelved copies of a book aside for its waiting holds, head of the queue first.
+
+        Returns the ids of the holds made ready.
+        """
+        now = now or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        served = []
+        while True:
+            head = conn.execute('''
+                SELECT id FROM holds
+                WHERE book_id = ? AND status = 'waiting'
+                ORDER BY priority, placed_at, id
+                LIMIT 1
+            ''', (book_id,)).fetchone()
+            if head is None:
+                break
+            try:
+                copy_id = CopyModel._take(conn, book_id, status='on_hold')
+            except NoCopyAvailable:
+                break
+            conn.execute("UPDATE holds SET status = 'ready', ready_at = ?, copy_id = ? WHERE id = ?",
+                         (now, copy_id, head[0]))
+            served.append(head[0])
+        return served
+
+    @staticmethod
+    def _queued(conn, book_id):
+        """Whether members are waiting for ``book_id``; walk-ins must not jump the queue."""
+        return conn.execute(
+            "SELECT EXISTS (SELECT 1 FROM holds WHERE book_id = ? AND status = 'waiting')",
+            (book_id,)).fetchone()[0]
+
+    @staticmethod
+    def _set_status(conn, copy_id, status):
+        if copy_id is not None:
+            conn.execute('UPDATE copies SET status = ? WHERE id = ?', (status, copy_id))
@@ -0,0 +1,156 @@
+import sqlite3
+from pathlib import Path
+
+# Path of the SQLite database shared by the book/member/transaction models.
+# create_app() points this at app.config['DATABASE'].
+DATABASE = 'library.db'
+
+# How long a connection waits on a locked database before raising
+# "database is locked" (milliseconds).
+BUSY_TIMEOUT_MS = 5000
+
+# Callbacks that rebuild per-process state (threads, pools, caches) in a
+# freshly forked worker. Nothing here may hold a connection across fork.
+_after_fork_hooks = []
+
+# Optional single-writer queue (see write_coordinator.py); None means every
+# write opens its own connection and commits on its own.
+_writer = None
+
+
+def configure(path, busy_timeout_ms=None):
+    """Set the SQLite database file used by every model connection."""
+    global DATABASE, BUSY_TIMEOUT_MS
+    disable_write_coordinator()
+    DATABASE = path
+    if busy_timeout_ms is not None:
+        BUSY_TIMEOUT_MS = int(busy_timeout_ms)
+
+
+def connect():
+    """Create a connection to the configured database with row factory."""
+    conn = sqlite3.connect(DATABASE)
+    conn.row_factory = sqlite3.Row
+    conn.execute(f'PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}')
+    return conn
+
+
+def connect_readonly():
+    """Open a read-only connection pinned to one snapshot of the database.
+
+    The file is opened with ``mode=ro`` and ``query_only`` so the connection
+    can never take the write lock. A read transaction is started right away:
+    every query on this connection sees the same WAL snapshot until it is
+    closed, so multi-query endpoints return consistent numbers while the
+    circulation desk keeps writing.
+    """
+    uri = Path(DATABASE).absolute().as_uri() + '?mode=ro'
+    conn = sqlite3.connect(uri, uri=True)
+    conn.row_factory = sqlite3.Row
+    conn.execute(f'PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}')
+    conn.execute('PRAGMA query_only = ON')
+    conn.execute('BEGIN')
+    return conn
+
+
+def iter_rows(sql, params=(), batch_size=500, conn=None):
+    """Yield rows of ``sql`` from a read-only snapshot, ``batch_size`` at a time.
+
+    The connection stays open while the caller iterates and is closed when
+    the generator finishes or is closed (e.g. a streamed response aborted by
+    the client), so memory stays bounded by one batch. Pass a
+    :func:`connect_readonly` ``conn`` to stream from a snapshot already read
+    from; the generator then owns and closes it.
+    """
+    if conn is None:
+        conn = connect_readonly()
+    try:
+        cur = conn.execute(sql, params)
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        conn.close()
+
+
+def enable_write_coordinator(**options):
+    """Route db.write() through one group-committing writer thread."""
+    global _writer
+    from models.write_coordinator import WriteCoordinator
+    disable_write_coordinator()
+    _writer = WriteCoordinator(DATABASE, **options)
+    return _writer
+
+
+def disable_write_coordinator():
+    """Flush and stop the writer thread; writes go back to direct commits."""
+    global _writer
+    if _writer is not None:
+        _writer.stop()
+    _writer = None
+
+
+def write(fn, *args, **kwargs):
+    """Run ``fn(conn, *args, **kwargs)`` in a write transaction and return its result."""
+    if _writer is not None:
+        return _writer.submit(fn, *args, **kwargs)
+    conn = connect()
+    try:
+        result = fn(conn, *args, **kwargs)
+        conn.commit()
+        return result
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def register_after_fork(fn):
+    """Run ``fn()`` in every worker process after a prefork server forks."""
+    _after_fork_hooks.append(fn)
+    return fn
+
+
+def init_worker():
+    """Initialize per-worker state; called from the server's post_fork hook."""
+    for fn in _after_fork_hooks:
+        fn()
+    # Open (and immediately release) one connection so a bad DATABASE path
+    # fails the worker at boot instead of on its first request.
+    conn = connect()
+    conn.execute('SELECT 1')
+    conn.close()
+
+
+def migrate():
+    """Create or upgrade every table owned by the SQLite models."""
+    from models import archive, audit, changes, fines, jobs
+    from models.book_model import BookModel
+    from models.copy_model import CopyModel
+    from models.hold_model import HoldModel
+    from models.member_model import MemberModel
+    from models.recommendation_model import RecommendationModel
+    from models.transaction_model import TransactionModel
+
+    # WAL lets read-only report connections run alongside the writer. The
+    # setting is persistent, so it only needs to happen once per file.
+    conn = connect()
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.close()
+
+    BookModel.create_table()
+    MemberModel.create_table()
+    TransactionModel.create_table()
+    archive.create_table()
+    RecommendationModel.create_table()
+    HoldModel.create_table()
+    # Needs loans and holds in place to tie existing ones to copies
+    CopyModel.create_table()
+    audit.create_table()
+    fines.create_table()
+    jobs.create_table()
+    # Last, so the seeded change log sees every existing row
+    changes.create_table()
@@ -0,0 +1,246 @@
+"""Event bus for live dashboards, fed from the shared change log.
+
+Every server worker runs one tail thread while it has dashboards open
+(started by the first subscriber, it ends once the last one has left)
+that reads new ``transactions`` entries from ``change_log`` (see
+changes.py) in version order. Issues and returns made by any worker thus
+reach every worker's dashboards, and the change-log version is the SSE
+event id, so a client reconnecting with Last-Event-ID to a different
+worker resumes where it left off.
+
+Each frame is encoded once and the same bytes are handed to every
+subscriber queue, so the cost of a broadcast does not depend on how many
+dashboards are open. The change log keeps only the latest change of a row:
+a loan issued and returned within one poll arrives as one ``returned``
+event. Frames therefore carry the current issued count rather than a delta.
+"""
+import itertools
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+from models import changes, db
+
+log = logging.getLogger(__name__)
+
+# Frames kept for clients that reconnect with Last-Event-ID
+HISTORY = 256
+# Frames buffered per subscriber; a client that falls this far behind is dropped
+QUEUE_SIZE = 100
+# How often the tail thread looks for new changes (seconds)
+POLL_INTERVAL = 0.5
+
+# Sent to a subscriber queue when it was dropped so its stream can end
+DISCONNECT = object()
+
+
+class TooManySubscribers(Exception):
+    """The per-process cap on open event streams was reached."""
+
+
+def encode(event_id, event, data):
+    return f'id: {event_id}\nevent: {event}\ndata: {json.dumps(data)}\n\n'.encode()
+
+
+class EventBus:
+    """Fan frames out to subscriber queues.
+
+    ``backfill(after, upto)``, when set, returns ``[(id, frame)]`` for
+    reconnecting clients whose Last-Event-ID is older than the history.
+    """
+
+    def __init__(self, max_subscribers=64, backfill=None):
+        self.max_subscribers = max_subscribers
+        self.backfill = backfill
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._history = deque(maxlen=HISTORY)
+        self._ids = itertools.count(1)
+        self.last_id = 0
+        self.published = 0
+        self.dropped = 0
+
+    def has_subscribers(self):
+        return bool(self._subscribers)
+
+    def publish(self, event, data, event_id=None):
+        """Broadcast ``data`` (JSON-serializable) as an ``event`` frame."""
+        with self._lock:
+            event_id = next(self._ids) if event_id is None else event_id
+            frame = encode(event_id, event, data)
+            self._history.append((event_id, frame))
+            self.last_id = max(self.last_id, event_id)
+            self.published += 1
+            for q in list(self._subscribers):
+                try:
+                    q.put_nowait(frame)
+                except queue.Full:
+                    self._drop(q)
+        return event_id
+
+    def subscribe(self, last_event_id=None):
+        """Return a new subscriber queue, pre-filled with frames after ``last_event_id``."""
+        q = queue.Queue(QUEUE_SIZE)
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                raise TooManySubscribers()
+            if last_event_id is not None:
+                for event_id, frame in self._replay(last_event_id):
+                    if q.full():
+                        break
+                    q.put_nowait(frame)
+            self._subscribers.add(q)
+        return q
+
+    def _replay(self, last_event_id):
+        oldest = self._history[0][0] if self._history else self.last_id + 1
+        missed = []
+        if self.backfill is not None and last_event_id + 1 < oldest and last_event_id < self.last_id:
+            missed = self.backfill(last_event_id, min(oldest - 1, self.last_id))
+        return missed + [(i, f) for i, f in self._history if i > last_event_id]
+
+    def advance(self, event_id):
+        """Note that the source has been read up to ``event_id``."""
+        with self._lock:
+            self.last_id = max(self.last_id, event_id)
+
+    def reset(self, event_id=0):
+        """Forget the history and restart ids at ``event_id`` (a new source)."""
+        with self._lock:
+            self._history.clear()
+            self.last_id = event_id
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._subscribers.discard(q)
+
+    def _drop(self, q):
+        self._subscribers.discard(q)
+        self.dropped += 1
+        try:
+            q.get_nowait()
+        except queue.Empty:
+            pass
+        q.put_nowait(DISCONNECT)
+
+    def __len__(self):
+        return len(self._subscribers)
+
+
+def loan_frames(conn, after, upto=None, limit=None):
+    """``[(version, event, data)]`` for loans changed after change-log version ``after``."""
+    sql = '''
+        SELECT c.version, t.id, m.full_name AS member, b.title AS book, t.issue_date, t.return_date
+        FROM change_log c
+        JOIN transactions t ON t.id = c.entity_id
+        LEFT JOIN members m ON m.id = t.member_id
+        LEFT JOIN books b ON b.id = t.book_id
+        WHERE c.entity = 'transactions' AND c.op = 'upsert' AND c.version > ?
+    '''
+    params = [after]
+    if upto is not None:
+        sql += ' AND c.version <= ?'
+        params.append(upto)
+    sql += ' ORDER BY c.version'
+    if limit is not None:
+        sql += ' LIMIT ?'
+        params.append(limit)
+    rows = conn.execute(sql, params).fetchall()
+    if not rows:
+        return []
+    issued = conn.execute("SELECT COUNT(*) FROM transactions WHERE return_date IS NULL").fetchone()[0]
+    return [(r['version'], 'returned' if r['return_date'] else 'issued', {
+        'totals': {'booksIssued': issued},
+        'transaction': {
+            'id': r['id'], 'member': r['member'], 'book': r['book'],
+            'issue_date': r['issue_date'], 'return_date': r['return_date'],
+        },
+    }) for r in rows]
+
+
+def _backfill(after, upto):
+    conn = db.connect_readonly()
+    try:
+        return [(v, encode(v, event, data)) for v, event, data in loan_frames(conn, after, upto, HISTORY)]
+    finally:
+        conn.close()
+
+
+bus = EventBus(backfill=_backfill)
+
+# Change-log version the tail thread has published up to, and the database
+# it belongs to
+_position = 0
+_database = None
+_thread = None
+_pid = None
+_start_lock = threading.Lock()
+
+
+def poll(since):
+    """Publish loan changes after version ``since``; returns the version reached."""
+    conn = db.connect_readonly()
+    try:
+        frames = loan_frames(conn, since, limit=HISTORY) if bus.has_subscribers() else []
+        # Nobody listening, or nothing new: skip ahead without building frames
+        position = frames[-1][0] if len(frames) == HISTORY else max(since, changes.current_version(conn))
+    finally:
+        conn.close()
+    for version, event, data in frames:
+        bus.publish(event, data, event_id=version)
+    bus.advance(position)
+    return position
+
+
+def _run():
+    global _position, _thread
+    while True:
+        time.sleep(POLL_INTERVAL)
+        with _start_lock:
+            if not bus.has_subscribers():
+                # The next subscriber starts a new thread
+                _thread = None
+                return
+        try:
+            _position = poll(_position)
+        except Exception:
+            log.exception('Reading the change log for dashboards failed')
+
+
+def subscribe(last_event_id=None):
+    """Subscribe to :data:`bus`, starting this process's tail thread if it isn't running.
+
+    A (re)started thread begins at the current version; changes made while
+    nobody was listening are only sent to clients that reconnect with an
+    older Last-Event-ID. Raises TooManySubscribers like the bus.
+    """
+    global _thread, _pid, _position, _database
+    with _start_lock:
+        # Threads don't survive fork
+        running = _thread is not None and _pid == os.getpid() and _thread.is_alive()
+        if not running or _database != db.DATABASE:
+            conn = db.connect_readonly()
+            try:
+                _position = changes.current_version(conn)
+            finally:
+                conn.close()
+            if _database != db.DATABASE:
+                _database = db.DATABASE
+                bus.reset(_position)
+            else:
+                bus.advance(_position)
+        q = bus.subscribe(last_event_id)
+        if not running:
+            _pid = os.getpid()
+            _thread = threading.Thread(target=_run, name='dashboard-events', daemon=True)
+            _thread.start()
+        return q
+
+
+def unsubscribe(q):
+    """Remove a subscriber; the tail thread stops after the last one's next poll."""
+    bus.unsubscribe(q)
@@ -0,0 +1,183 @@
+"""Columnar snapshot export for offline analysis.
+
+``flask --app app export`` writes Parquet files that analysts can query
+with pandas, DuckDB or Spark instead of running joins on the live
+database::
+
+    <dest>/books/books.parquet
+    <dest>/members/members.parquet
+    <dest>/transactions/issue_month=YYYY-MM/part-0.parquet
+
+Transactions come from the whole ledger (hot and archived) with book
+titles and member names joined in, one partition per issue month. Rows are
+read from one snapshot and written ``batch_size`` at a time, so memory
+does not grow with the ledger. ``_state.json`` keeps a fingerprint of
+every exported month; later runs only rewrite months whose rows changed
+(new loans, returns, deletes) or that are new; titles and names in
+unchanged months stay as they were exported until a ``--full`` run.
+Members are exported without contact details.
+"""
+import json
+import os
+import shutil
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:  # optional: pip install pyarrow
+    pa = None
+
+from models import db
+
+BATCH_SIZE = 10000
+STATE_FILE = '_state.json'
+# Hive's name for rows whose partition value is NULL
+NULL_PARTITION = '__HIVE_DEFAULT_PARTITION__'
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+BOOK_COLUMNS = ('id', 'title', 'author', 'publisher', 'year_published', 'category',
+                'isbn', 'barcode', 'total_copies', 'available_copies')
+MEMBER_COLUMNS = ('id', 'full_name', 'member_type', 'city', 'state', 'institution', 'membership_date')
+INT_COLUMNS = {'id', 'total_copies', 'available_copies', 'member_id', 'book_id'}
+
+LOAN_COLUMNS = ('id', 'issue_date', 'return_date', 'member_id', 'member_name', 'member_type',
+                'book_id', 'book_title', 'book_author', 'category')
+LOAN_QUERY = '''
+    SELECT l.id, l.issue_date, l.return_date, l.member_id, m.full_name, m.member_type,
+           l.book_id, b.title, b.author, b.category
+    FROM ledger l
+    LEFT JOIN members m ON m.id = l.member_id
+    LEFT JOIN books b ON b.id = l.book_id
+'''
+
+
+def is_available():
+    return pa is not None
+
+
+def _schema(columns, times=()):
+    fields = []
+    for name in columns:
+        if name in times:
+            fields.append(pa.field(name, pa.timestamp('ms')))
+        elif name in INT_COLUMNS:
+            fields.append(pa.field(name, pa.int64()))
+        else:
+            fields.append(pa.field(name, pa.string()))
+    return pa.schema(fields)
+
+
+def _batch(schema, rows, times=()):
+    arrays = []
+    for i, field in enumerate(schema):
+        values = [r[i] for r in rows]
+        if field.name in times:
+            strings = pa.array(values, pa.string())
+            arrays.append(pc.strptime(strings, format=TIME_FORMAT, unit='ms', error_is_null=True))
+        elif field.name in INT_COLUMNS:
+            arrays.append(pa.array(values, pa.int64()))
+        else:
+            arrays.append(pa.array([None if v is None else str(v) for v in values], pa.string()))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def _write(path, schema, cursor, batch_size, times=()):
+    """Stream ``cursor`` into a Parquet file at ``path``; returns the row count."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.tmp'
+    rows = 0
+    try:
+        with pq.ParquetWriter(tmp, schema, compression='zstd') as writer:
+            while True:
+                chunk = cursor.fetchmany(batch_size)
+                if not chunk:
+                    break
+                writer.write_batch(_batch(schema, chunk, times))
+                rows += len(chunk)
+    except Exception:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    os.replace(tmp, path)
+    return rows
+
+
+def month_fingerprints(conn):
+    """{issue month or None: [rows, max id, returned rows, latest return]} over the ledger."""
+    return {
+        r[0]: [r[1], r[2], r[3], r[4]]
+        for r in conn.execute('''
+            SELECT substr(issue_date, 1, 7) AS month, COUNT(*), MAX(id),
+                   COUNT(return_date), MAX(return_date)
+            FROM ledger
+            GROUP BY month
+        ''')
+    }
+
+
+def _month_rows(conn, month):
+    if month is None:
+        return conn.execute(LOAN_QUERY + ' WHERE l.issue_date IS NULL ORDER BY l.id')
+    year, mon = int(month[:4]), int(month[5:7])
+    end = f'{year + mon // 12:04d}-{mon % 12 + 1:02d}'
+    return conn.execute(LOAN_QUERY + ' WHERE l.issue_date >= ? AND l.issue_date < ? ORDER BY l.id',
+                        (month, end))
+
+
+def _partition(month):
+    return f'issue_month={month if month is not None else NULL_PARTITION}'
+
+
+def export(dest_dir, full=False, batch_size=None):
+    """Write the Parquet snapshot into ``dest_dir``; returns a summary dict.
+
+    With ``full`` every month is rewritten, otherwise only new or changed ones.
+    """
+    if pa is None:
+        raise RuntimeError('pyarrow is not installed')
+    batch_size = batch_size or BATCH_SIZE
+    state_path = os.path.join(dest_dir, STATE_FILE)
+    state = {}
+    if not full and os.path.exists(state_path):
+        with open(state_path) as f:
+            state = json.load(f)
+    summary = {'months_written': [], 'months_skipped': 0, 'months_removed': [], 'rows': 0}
+
+    conn = db.connect_readonly()
+    try:
+        summary['books'] = _write(
+            os.path.join(dest_dir, 'books', 'books.parquet'), _schema(BOOK_COLUMNS),
+            conn.execute(f"SELECT {', '.join(BOOK_COLUMNS)} FROM books ORDER BY id"), batch_size)
+        summary['members'] = _write(
+            os.path.join(dest_dir, 'members', 'members.parquet'), _schema(MEMBER_COLUMNS),
+            conn.execute(f"SELECT {', '.join(MEMBER_COLUMNS)} FROM members ORDER BY id"), batch_size)
+
+        months = month_fingerprints(conn)
+        loans_dir = os.path.join(dest_dir, 'transactions')
+        schema = _schema(LOAN_COLUMNS, times=('issue_date', 'return_date'))
+        new_state = {}
+        for month, fingerprint in sorted(months.items(), key=lambda kv: kv[0] or ''):
+            key = _partition(month)
+            new_state[key] = fingerprint
+            path = os.path.join(loans_dir, key, 'part-0.parquet')
+            if state.get(key) == fingerprint and os.path.exists(path):
+                summary['months_skipped'] += 1
+                continue
+            summary['rows'] += _write(path, schema, _month_rows(conn, month), batch_size,
+                                      times=('issue_date', 'return_date'))
+            summary['months_written'].append(month)
+        # Months whose loans were all deleted
+        if os.path.isdir(loans_dir):
+            for key in os.listdir(loans_dir):
+                if key.startswith('issue_month=') and key not in new_state:
+                    shutil.rmtree(os.path.join(loans_dir, key))
+                    summary['months_removed'].append(key.split('=', 1)[1])
+    finally:
+        conn.close()
+
+    tmp = state_path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(new_state, f, indent=1, sort_keys=True)
+    os.replace(tmp, state_path)
+    return summary
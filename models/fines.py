@@ -0,0 +1,255 @@
+"""Overdue fines, accrued by a nightly batch.
+
+A loan is due ``loan_days`` after it was issued. Once it is more than
+``grace_days`` past due it owes ``daily`` for every day beyond the grace
+period, up to ``max_per_loan`` (None for no cap). Rules are set per
+member_type in ``FINE_RULES``; the 'default' rule covers everyone else and
+fills in the keys a member_type leaves out.
+
+:func:`accrue` recomputes, in one INSERT ... SELECT, the fine of every open
+overdue loan and of every loan returned since the previous run, then
+refreshes ``member_fines`` for the members it touched. The member and
+overdue views read those precomputed amounts instead of doing date
+arithmetic per page view. A fine depends only on the loan, its rule and the
+accrual day, so accruing the same day twice changes nothing; ``fine_runs``
+records every day accrued so a repeat returns early. Amounts are stored in
+cents.
+"""
+import logging
+import threading
+from datetime import date
+
+from models import db
+
+log = logging.getLogger(__name__)
+
+DEFAULT_RULE = {'loan_days': 14, 'grace_days': 2, 'daily': 0.25, 'max_per_loan': 10.0}
+RULES = {'default': dict(DEFAULT_RULE)}
+
+_thread = None
+_stop = threading.Event()
+_interval = None
+
+
+def create_table():
+    conn = db.connect()
+    cur = conn.cursor()
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS fines (
+            transaction_id INTEGER PRIMARY KEY,
+            member_id INTEGER NOT NULL,
+            book_id INTEGER NOT NULL,
+            due_date TEXT NOT NULL,
+            days_charged INTEGER NOT NULL,
+            amount_cents INTEGER NOT NULL,
+            accrued_through TEXT NOT NULL
+        )
+    ''')
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_fines_member ON fines (member_id)")
+    # Members touched by one run, for the balance refresh
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_fines_accrued ON fines (accrued_through, member_id)")
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS member_fines (
+            member_id INTEGER PRIMARY KEY,
+            balance_cents INTEGER NOT NULL,
+            fined_loans INTEGER NOT NULL,
+            accrued_through TEXT NOT NULL
+        )
+    ''')
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS fine_runs (
+            day TEXT PRIMARY KEY,
+            ran_at TEXT NOT NULL,
+            loans INTEGER NOT NULL
+        )
+    ''')
+    conn.commit()
+    conn.close()
+
+
+def configure(rules=None):
+    """Set the per-member_type rules; each is completed from 'default'."""
+    global RULES
+    rules = rules or {}
+    default = {**DEFAULT_RULE, **rules.get('default', {})}
+    RULES = {member_type: {**default, **rule} for member_type, rule in rules.items()}
+    RULES['default'] = default
+
+
+def _cents(amount):
+    return None if amount is None else int(round(amount * 100))
+
+
+def _rule_rows():
+    return [(member_type, int(r['loan_days']), int(r['grace_days']), _cents(r['daily']), _cents(r['max_per_loan']))
+            for member_type, r in sorted(RULES.items())]
+
+
+def accrue(day=None, force=False):
+    """Accrue fines through ``day`` ('YYYY-MM-DD', default today); returns a summary.
+
+    Without ``force`` a day that was already accrued is skipped.
+    """
+    day = day or date.today().isoformat()
+    return db.write(_accrue, day, _rule_rows(), force)
+
+
+def _accrue(conn, day, rules, force=False):
+    done = conn.execute('SELECT loans FROM fine_runs WHERE day = ?', (day,)).fetchone()
+    if done is not None and not force:
+        return {'day': day, 'loans': done[0], 'members': 0, 'skipped': True}
+    # Loans returned since the last run get their final amount, up to the return day
+    since = conn.execute('SELECT MAX(day) FROM fine_runs WHERE day < ?', (day,)).fetchone()[0]
+    params = {'day': day, 'since': since}
+    values = []
+    for i, rule in enumerate(rules):
+        names = [f'{key}{i}' for key in ('type', 'loan', 'grace', 'daily', 'cap')]
+        params.update(zip(names, rule))
+        values.append('(' + ', '.join(':' + n for n in names) + ')')
+    returned = ''
+    if since is not None:
+        returned = '''
+            UNION ALL
+            SELECT id, member_id, book_id, issue_date, return_date FROM transactions
+            WHERE return_date >= :since
+        '''
+    cur = conn.execute(f'''
+        INSERT INTO fines (transaction_id, member_id, book_id, due_date, days_charged, amount_cents, accrued_through)
+        WITH rules (member_type, loan_days, grace_days, daily_cents, cap_cents) AS (VALUES {', '.join(values)}),
+        loans AS (
+            SELECT id, member_id, book_id, issue_date, return_date FROM transactions
+            WHERE return_date IS NULL
+            {returned}
+        ),
+        charged AS (
+            SELECT l.id, l.member_id, l.book_id,
+                   date(l.issue_date, '+' || r.loan_days || ' days') AS due_date,
+                   CAST(julianday(MIN(COALESCE(date(l.return_date), :day), :day))
+                        - julianday(date(l.issue_date)) AS INTEGER) - r.loan_days - r.grace_days AS days,
+                   r.daily_cents, r.cap_cents
+            FROM loans l
+            LEFT JOIN members m ON m.id = l.member_id
+            JOIN rules r ON r.member_type = CASE
+                WHEN m.member_type IN (SELECT member_type FROM rules) THEN m.member_type ELSE 'default' END
+            WHERE l.issue_date IS NOT NULL
+        )
+        SELECT id, member_id, book_id, due_date, days,
+               CASE WHEN cap_cents IS NULL THEN days * daily_cents ELSE MIN(days * daily_cents, cap_cents) END,
+               :day
+        FROM charged
+        WHERE days > 0
+        ON CONFLICT (transaction_id) DO UPDATE SET
+            due_date = excluded.due_date,
+            days_charged = excluded.days_charged,
+            amount_cents = excluded.amount_cents,
+            accrued_through = excluded.accrued_through
+        WHERE excluded.accrued_through >= fines.accrued_through
+    ''', params)
+    loans = cur.rowcount
+    members = conn.execute('''
+        INSERT INTO member_fines (member_id, balance_cents, fined_loans, accrued_through)
+        SELECT member_id, SUM(amount_cents), COUNT(*), ?
+        FROM fines
+        WHERE member_id IN (SELECT member_id FROM fines WHERE accrued_through = ?)
+        GROUP BY member_id
+        ON CONFLICT (member_id) DO UPDATE SET
+            balance_cents = excluded.balance_cents,
+            fined_loans = excluded.fined_loans,
+            accrued_through = excluded.accrued_through
+    ''', (day, day)).rowcount
+    conn.execute('''
+        INSERT INTO fine_runs (day, ran_at, loans) VALUES (?, datetime('now', 'localtime'), ?)
+        ON CONFLICT (day) DO UPDATE SET ran_at = excluded.ran_at, loans = excluded.loans
+    ''', (day, loans))
+    return {'day': day, 'loans': loans, 'members': members, 'skipped': False}
+
+
+def _forget(conn, transaction_id):
+    """Drop the fine of a deleted loan and refresh its member's balance."""
+    for (member_id,) in conn.execute(
+            'DELETE FROM fines WHERE transaction_id = ? RETURNING member_id', (transaction_id,)).fetchall():
+        row = conn.execute('SELECT COUNT(*), SUM(amount_cents) FROM fines WHERE member_id = ?',
+                           (member_id,)).fetchone()
+        if row[0]:
+            conn.execute('UPDATE member_fines SET balance_cents = ?, fined_loans = ? WHERE member_id = ?',
+                         (row[1], row[0], member_id))
+        else:
+            conn.execute('DELETE FROM member_fines WHERE member_id = ?', (member_id,))
+
+
+def for_member(member_id):
+    """``{balance, fined_loans, accrued_through, fines: [...]}`` from the last accrual."""
+    conn = db.connect_readonly()
+    try:
+        summary = conn.execute('''
+            SELECT balance_cents, fined_loans, accrued_through FROM member_fines WHERE member_id = ?
+        ''', (member_id,)).fetchone()
+        rows = conn.execute('''
+            SELECT f.transaction_id, f.book_id, b.title, f.due_date, f.days_charged,
+                   f.amount_cents, f.accrued_through
+            FROM fines f
+            LEFT JOIN books b ON b.id = f.book_id
+            WHERE f.member_id = ?
+            ORDER BY f.transaction_id DESC
+        ''', (member_id,)).fetchall()
+    finally:
+        conn.close()
+    return {
+        'balance': summary['balance_cents'] / 100 if summary else 0,
+        'fined_loans': summary['fined_loans'] if summary else 0,
+        'accrued_through': summary['accrued_through'] if summary else None,
+        'fines': [{
+            'transaction_id': r['transaction_id'],
+            'book_id': r['book_id'],
+            'book_title': r['title'],
+            'due_date': r['due_date'],
+            'days_charged': r['days_charged'],
+            'amount': r['amount_cents'] / 100,
+            'accrued_through': r['accrued_through'],
+        } for r in rows],
+    }
+
+
+def start(interval=3600):
+    """Accrue in a background thread every ``interval`` seconds (per process).
+
+    Each day is only accrued once, so the check can run far more often
+    than nightly and every worker can run it.
+    """
+    global _interval
+    _interval = interval
+    _start_thread()
+
+
+def stop():
+    global _thread, _interval
+    _interval = None
+    _stop.set()
+    if _thread is not None:
+        _thread.join(timeout=5)
+    _thread = None
+
+
+def _start_thread():
+    global _thread
+    _stop.clear()
+    _thread = threading.Thread(target=_run, args=(_interval,), name='fines', daemon=True)
+    _thread.start()
+
+
+def _run(interval):
+    # Wait one interval first so app start-up never touches the database
+    while not _stop.wait(interval):
+        try:
+            result = accrue()
+            if not result['skipped']:
+                log.info('Accrued fines through %s on %d loans', result['day'], result['loans'])
+        except Exception:
+            log.exception('Accruing fines failed')
+
+
+@db.register_after_fork
+def _restart_after_fork():
+    # Threads do not survive fork; give each worker its own scheduler
+    if _interval is not None:
+        _start_thread()
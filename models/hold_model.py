@@ -0,0 +1,190 @@
+from datetime import datetime
+
+from models import db
+from models.copy_model import CopyModel
+from models.transaction_model import TransactionModel
+
+
+class HoldNotReady(Exception):
+    """The hold was cancelled or fulfilled, or is not this member's ready hold."""
+
+
+class HoldModel:
+    """Per-book hold queues.
+
+    A hold is ``waiting`` until a copy is returned, then ``ready`` (the copy
+    is kept off the shelf for that member) and finally ``fulfilled`` when the
+    member is issued the book, or ``cancelled``. Each book's queue is ordered
+    by member-type priority, then placement time; the partial index over
+    waiting holds makes finding the head of a queue a single index seek.
+    A ready hold points at the copy set aside for it (``on_hold``). Copies
+    are handed out by ``CopyModel._serve_holds``, which every return, copy
+    change and new hold runs inside its own write.
+    """
+
+    # Lower ranks are served first; unknown types queue behind these
+    MEMBER_PRIORITY = {'faculty': 0, 'staff': 1, 'student': 2, 'community': 3}
+    DEFAULT_PRIORITY = 3
+
+    @staticmethod
+    def connect():
+        return db.connect()
+
+    @staticmethod
+    def create_table():
+        """Create the holds table if it doesn't exist."""
+        conn = HoldModel.connect()
+        cur = conn.cursor()
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS holds (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                book_id INTEGER NOT NULL,
+                member_id INTEGER NOT NULL,
+                priority INTEGER NOT NULL,
+                placed_at TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'waiting',
+                ready_at TEXT,
+                transaction_id INTEGER,
+                FOREIGN KEY (book_id) REFERENCES books(id),
+                FOREIGN KEY (member_id) REFERENCES members(id)
+            )
+        ''')
+        cur.execute('''
+            CREATE INDEX IF NOT EXISTS idx_holds_queue
+            ON holds (book_id, priority, placed_at, id) WHERE status = 'waiting'
+        ''')
+        # One open hold per member and book
+        cur.execute('''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_holds_open
+            ON holds (book_id, member_id) WHERE status IN ('waiting', 'ready')
+        ''')
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_holds_member ON holds (member_id, status)")
+        cur.execute("PRAGMA table_info(holds)")
+        if 'copy_id' not in {row[1] for row in cur.fetchall()}:
+            cur.execute("ALTER TABLE holds ADD COLUMN copy_id INTEGER REFERENCES copies(id)")
+        conn.commit()
+        conn.close()
+
+    @staticmethod
+    def place_hold(member_id, book_id):
+        """Queue ``member_id`` for ``book_id``; returns the hold id.
+
+        Placing a hold the member already has open returns the existing one.
+        A copy on the shelf is set aside for the queue at once.
+        """
+        placed_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        return db.write(HoldModel._insert_hold, member_id, book_id, placed_at)
+
+    @staticmethod
+    def _insert_hold(conn, member_id, book_id, placed_at):
+        member = conn.execute('SELECT member_type FROM members WHERE id = ?', (member_id,)).fetchone()
+        priority = HoldModel.MEMBER_PRIORITY.get(
+            member[0] if member else None, HoldModel.DEFAULT_PRIORITY)
+        # idx_holds_open decides, so two racing placements can't both insert
+        rows = conn.execute('''
+            INSERT INTO holds (book_id, member_id, priority, placed_at)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT DO NOTHING
+            RETURNING id
+        ''', (book_id, member_id, priority, placed_at)).fetchall()
+        if not rows:
+            return conn.execute('''
+                SELECT id FROM holds
+                WHERE book_id = ? AND member_id = ? AND status IN ('waiting', 'ready')
+            ''', (book_id, member_id)).fetchone()[0]
+        CopyModel._serve_holds(conn, book_id, placed_at)
+        return rows[0][0]
+
+    @staticmethod
+    def get_by_id(hold_id):
+        conn = HoldModel.connect()
+        row = conn.execute('SELECT * FROM holds WHERE id = ?', (hold_id,)).fetchone()
+        conn.close()
+        return row
+
+    @staticmethod
+    def position(hold_id):
+        """1-based place of a waiting hold in its book's queue, else None."""
+        conn = db.connect_readonly()
+        try:
+            hold = conn.execute('SELECT * FROM holds WHERE id = ?', (hold_id,)).fetchone()
+            if hold is None or hold['status'] != 'waiting':
+                return None
+            ahead = conn.execute('''
+                SELECT COUNT(*) FROM holds
+                WHERE book_id = ? AND status = 'waiting'
+                  AND (priority, placed_at, id) < (?, ?, ?)
+            ''', (hold['book_id'], hold['priority'], hold['placed_at'], hold['id'])).fetchone()[0]
+        finally:
+            conn.close()
+        return ahead + 1
+
+    @staticmethod
+    def queue(book_id):
+        """Waiting holds for a book in service order, with member names."""
+        return db.iter_rows('''
+            SELECT h.id, h.member_id, m.full_name AS member_name, m.member_type,
+                   h.priority, h.placed_at
+            FROM holds h
+            LEFT JOIN members m ON m.id = h.member_id
+            WHERE h.book_id = ? AND h.status = 'waiting'
+            ORDER BY h.priority, h.placed_at, h.id
+        ''', (book_id,))
+
+    @staticmethod
+    def ready_hold(member_id, book_id):
+        """The member's ``ready`` hold on ``book_id``, if a copy is waiting for them."""
+        conn = HoldModel.connect()
+        row = conn.execute('''
+            SELECT * FROM holds
+            WHERE book_id = ? AND member_id = ? AND status = 'ready'
+        ''', (book_id, member_id)).fetchone()
+        conn.close()
+        return row
+
+    @staticmethod
+    def issue_to_holder(hold_id, member_id, book_id, issue_date):
+        """Issue the copy set aside for a ready hold; returns the transaction id.
+
+        Raises HoldNotReady when the hold is no longer ready for this member
+        and book, e.g. because it was cancelled meanwhile.
+        """
+        transaction_id = db.write(HoldModel._issue_to_holder, hold_id, member_id, book_id, issue_date)
+        return transaction_id
+
+    @staticmethod
+    def _issue_to_holder(conn, hold_id, member_id, book_id, issue_date):
+        # Claim the hold first: a cancel racing this issue either sees it
+        # fulfilled or has already released its copy
+        rows = conn.execute('''
+            UPDATE holds SET status = 'fulfilled'
+            WHERE id = ? AND member_id = ? AND book_id = ? AND status = 'ready'
+            RETURNING copy_id
+        ''', (hold_id, member_id, book_id)).fetchall()
+        if not rows:
+            raise HoldNotReady(hold_id)
+        # The copy set aside for the hold goes straight from on_hold to on_loan
+        copy_id = rows[0][0]
+        CopyModel._set_status(conn, copy_id, 'on_loan')
+        transaction_id = TransactionModel._insert_issue(conn, member_id, book_id, issue_date, copy_id)
+        conn.execute('UPDATE holds SET transaction_id = ? WHERE id = ?', (transaction_id, hold_id))
+        return transaction_id
+
+    @staticmethod
+    def cancel(hold_id):
+        """Cancel an open hold; a copy held for it passes to the next in line."""
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        return db.write(HoldModel._cancel, hold_id, now)
+
+    @staticmethod
+    def _cancel(conn, hold_id, now):
+        # Check and cancel in one statement each, the first of which takes
+        # the write lock: of two racing cancels only one releases the copy
+        ready = conn.execute(
+            "UPDATE holds SET status = 'cancelled' WHERE id = ? AND status = 'ready' RETURNING copy_id",
+            (hold_id,)).fetchall()
+        if ready:
+            CopyModel._release(conn, ready[0][0], now)
+            return True
+        cur = conn.execute("UPDATE holds SET status = 'cancelled' WHERE id = ? AND status = 'waiting'", (hold_id,))
+        return cur.rowcount > 0
@@ -0,0 +1,282 @@
+import json
+import logging
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from models import db
+
+log = logging.getLogger(__name__)
+
+# Job state lives in SQLite so any server worker can answer a poll, not
+# just the one whose thread pool runs the job.
+TABLE = 'report_jobs'
+
+
+class JobQueueFull(Exception):
+    """Too many jobs are queued or running; the caller should retry later."""
+
+
+def create_table():
+    conn = db.connect()
+    cur = conn.cursor()
+    cur.execute(f'''
+        CREATE TABLE IF NOT EXISTS {TABLE} (
+            id TEXT PRIMARY KEY,
+            key TEXT NOT NULL,
+            status TEXT NOT NULL,
+            progress REAL NOT NULL DEFAULT 0,
+            result TEXT,
+            error TEXT,
+            created_at REAL NOT NULL,
+            started_at REAL,
+            finished_at REAL,
+            updated_at REAL NOT NULL,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    # At most one queued/running job per key, across every worker
+    cur.execute(f'''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_{TABLE}_inflight
+        ON {TABLE} (key) WHERE status IN ('queued', 'running')
+    ''')
+    cur.execute(f"CREATE INDEX IF NOT EXISTS idx_{TABLE}_finished ON {TABLE} (finished_at)")
+    conn.commit()
+    conn.close()
+
+
+class Job:
+    """A snapshot of one job row; re-read it with ``JobRunner.get``."""
+
+    def __init__(self, row):
+        self.id = row['id']
+        self.key = row['key']
+        self.status = row['status']
+        self.progress = row['progress']
+        self.result = json.loads(row['result']) if row['result'] is not None else None
+        self.error = row['error']
+        self.created_at = row['created_at']
+        self.started_at = row['started_at']
+        self.finished_at = row['finished_at']
+        # Bumped on every change so waiters can tell whether anything happened
+        self.version = row['version']
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'failed')
+
+    def to_dict(self, with_result=True):
+        data = {
+            'id': self.id,
+            'status': self.status,
+            'progress': round(self.progress, 3),
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'version': self.version,
+        }
+        if self.error is not None:
+            data['error'] = self.error
+        if with_result and self.status == 'done':
+            data['result'] = self.result
+        return data
+
+
+class JobRunner:
+    """Run jobs on a small thread pool, merging identical in-flight submissions.
+
+    ``max_workers`` bounds how many jobs run at once in this process, so
+    heavy work can never occupy more threads than that; ``max_pending``
+    bounds queued plus running jobs over all processes. Finished jobs are
+    kept for ``result_ttl`` seconds. Each process touches the rows of the
+    jobs it runs every ``stale_after / 4`` seconds, so a job whose row has
+    not changed for ``stale_after`` seconds has lost its worker and is
+    failed. The pool is per process and recreated lazily after fork.
+
+    Job rows live in the library database, so progress is written at most
+    once per ``PROGRESS_INTERVAL`` per job; waiters see coarser steps, and
+    circulation writes don't queue behind report bookkeeping.
+    """
+
+    # How often a waiter re-reads a job another process is running (seconds)
+    POLL_INTERVAL = 0.25
+    # Least time between two progress writes of one job (seconds)
+    PROGRESS_INTERVAL = 1.0
+
+    def __init__(self, max_workers=2, max_pending=32, result_ttl=600, stale_after=600):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self.stale_after = stale_after
+        self._cond = threading.Condition()
+        self._executor = None
+        self._pid = None
+        # Jobs running in this process: id -> monotonic time of the last progress write
+        self._running = {}
+        self._heartbeat = None
+        self.merged = 0
+
+    def configure(self, max_workers=None, max_pending=None, result_ttl=None, stale_after=None):
+        with self._cond:
+            if max_workers is not None and max_workers != self.max_workers:
+                self.max_workers = int(max_workers)
+                if self._executor is not None:
+                    self._executor.shutdown(wait=False)
+                self._executor = None
+            if max_pending is not None:
+                self.max_pending = int(max_pending)
+            if result_ttl is not None:
+                self.result_ttl = float(result_ttl)
+            if stale_after is not None:
+                self.stale_after = float(stale_after)
+
+    def submit(self, key, fn):
+        """Queue ``fn(job)`` under ``key``; returns ``(job, merged)``.
+
+        While a job with the same key is queued or running (in any process),
+        that job is returned instead of starting another one.
+        """
+        key = json.dumps(key)
+        try:
+            job_id, merged = db.write(self._insert, key, secrets.token_hex(8), time.time())
+        except sqlite3.IntegrityError:
+            # Another process queued the same key between our check and insert
+            job_id, merged = db.write(self._insert, key, secrets.token_hex(8), time.time())
+        if job_id is None:
+            raise JobQueueFull()
+        job = self.get(job_id)
+        if merged:
+            self.merged += 1
+        else:
+            self._pool().submit(self._run, job, fn)
+        return job, merged
+
+    def _insert(self, conn, key, job_id, now):
+        self._prune(conn, now)
+        row = conn.execute(f'''
+            SELECT id FROM {TABLE} WHERE key = ? AND status IN ('queued', 'running')
+        ''', (key,)).fetchone()
+        if row is not None:
+            return row[0], True
+        inflight = conn.execute(f'''
+            SELECT COUNT(*) FROM {TABLE} WHERE status IN ('queued', 'running')
+        ''').fetchone()[0]
+        if inflight >= self.max_pending:
+            # Commit the prune all the same
+            return None, False
+        conn.execute(f'''
+            INSERT INTO {TABLE} (id, key, status, created_at, updated_at) VALUES (?, ?, 'queued', ?, ?)
+        ''', (job_id, key, now, now))
+        return job_id, False
+
+    def _prune(self, conn, now):
+        conn.execute(f"DELETE FROM {TABLE} WHERE finished_at < ?", (now - self.result_ttl,))
+        conn.execute(f'''
+            UPDATE {TABLE}
+            SET status = 'failed', error = 'worker lost', finished_at = ?, version = version + 1
+            WHERE status IN ('queued', 'running') AND updated_at < ?
+        ''', (now, now - self.stale_after))
+
+    def get(self, job_id):
+        conn = db.connect()
+        try:
+            row = conn.execute(f'''
+                SELECT * FROM {TABLE} WHERE id = ? AND (finished_at IS NULL OR finished_at >= ?)
+            ''', (job_id, time.time() - self.result_ttl)).fetchone()
+        finally:
+            conn.close()
+        return Job(row) if row is not None else None
+
+    def wait(self, job, since_version=None, timeout=5):
+        """Block until ``job`` changes past ``since_version`` or finishes; returns it re-read.
+
+        Jobs run by this process wake the waiter at once, others are polled.
+        """
+        since = job.version if since_version is None else since_version
+        deadline = time.monotonic() + timeout
+        while True:
+            current = self.get(job.id)
+            if current is None or current.version > since or current.finished:
+                return current
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return current
+            with self._cond:
+                self._cond.wait(min(remaining, self.POLL_INTERVAL))
+
+    def set_progress(self, job, fraction):
+        now = time.monotonic()
+        with self._cond:
+            last = self._running.get(job.id)
+            if last is not None and now - last < self.PROGRESS_INTERVAL:
+                return
+            self._running[job.id] = now
+        self._update(job, progress=min(max(fraction, 0.0), 1.0))
+
+    def _run(self, job, fn):
+        self._update(job, status='running', started_at=time.time())
+        with self._cond:
+            self._running[job.id] = float('-inf')
+        try:
+            result = fn(job)
+        except Exception as e:
+            self._update(job, status='failed', error=str(e) or e.__class__.__name__,
+                         finished_at=time.time())
+        else:
+            self._update(job, status='done', result=json.dumps(result), progress=1.0,
+                         finished_at=time.time())
+        finally:
+            with self._cond:
+                self._running.pop(job.id, None)
+
+    def _beat(self):
+        # Keep the rows of this process's running jobs fresh so _prune
+        # only fails jobs whose worker is really gone
+        while True:
+            time.sleep(self.stale_after / 4)
+            with self._cond:
+                ids = list(self._running)
+            if not ids:
+                continue
+            marks = ','.join('?' * len(ids))
+            try:
+                db.write(lambda conn: conn.execute(
+                    f"UPDATE {TABLE} SET updated_at = ? WHERE id IN ({marks}) AND status = 'running'",
+                    [time.time()] + ids))
+            except Exception:
+                log.exception('Report job heartbeat failed')
+
+    def _update(self, job, **fields):
+        fields['updated_at'] = time.time()
+        assignments = ', '.join(f'{name} = ?' for name in fields)
+        db.write(lambda conn: conn.execute(
+            f'UPDATE {TABLE} SET {assignments}, version = version + 1 WHERE id = ?',
+            list(fields.values()) + [job.id]))
+        with self._cond:
+            self._cond.notify_all()
+
+    def _pool(self):
+        with self._cond:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix='jobs')
+                if self._pid != os.getpid():
+                    self._running = {}
+                self._pid = os.getpid()
+            # Threads don't survive fork either
+            if self._heartbeat is None or not self._heartbeat.is_alive():
+                self._heartbeat = threading.Thread(target=self._beat, name='jobs-heartbeat', daemon=True)
+                self._heartbeat.start()
+            return self._executor
+
+    def __len__(self):
+        conn = db.connect()
+        try:
+            return conn.execute(f'''
+                SELECT COUNT(*) FROM {TABLE} WHERE status IN ('queued', 'running')
+            ''').fetchone()[0]
+        finally:
+            conn.close()
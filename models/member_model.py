@@ -1,12 +1,11 @@
-import sqlite3
+from models import audit, db
+from models.recommendation_model import RecommendationModel
 
 class MemberModel:
     @staticmethod
     def connect():
         """Create a connection to the SQLite database."""
-        conn = sqlite3.connect('library.db')
-        conn.row_factory = sqlite3.Row  # Allows dict-like access
-        return conn
+        return db.connect()
 
     @staticmethod
     def create_table():
@@ -45,6 +44,15 @@ class MemberModel:
         for col_name, col_type in columns_to_add:
             if col_name not in existing_cols:
                 cur.execute(f"ALTER TABLE members ADD COLUMN {col_name} {col_type}")
+        # Indexes backing the filters and keyset sorts of /members/api
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_members_name ON members (COALESCE(full_name, ''), id)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_members_membership_date ON members (COALESCE(membership_date, ''), id)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_members_member_type ON members (member_type)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_members_city ON members (city)")
+        # The sorts order by the same expressions as MEMBER_SORTS; the plain
+        # column indexes above only serve the equality filters
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_members_member_type_sort ON members (COALESCE(member_type, ''), id)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_members_city_sort ON members (COALESCE(city, ''), id)")
         conn.commit()
         conn.close()
 
@@ -101,23 +109,57 @@ class MemberModel:
         return data
 
     @staticmethod
-    def update_member(member_id, full_name, email, phone, address):
-        """Update an existing member's information."""
+    def iter_all():
+        """Yield all members one at a time instead of materializing the list."""
+        return db.iter_rows('SELECT * FROM members')
+
+    @staticmethod
+    def count():
+        """Return the number of members."""
         conn = MemberModel.connect()
-        cur = conn.cursor()
-        cur.execute('''
+        total = conn.execute('SELECT COUNT(*) FROM members').fetchone()[0]
+        conn.close()
+        return total
+
+    @staticmethod
+    def get_by_id(member_id):
+        """Retrieve a single member by ID."""
+        conn = MemberModel.connect()
+        row = conn.execute('SELECT * FROM members WHERE id = ?', (member_id,)).fetchone()
+        conn.close()
+        return row
+
+    @staticmethod
+    def update_member(member_id, full_name, email, phone, address):
+        """Update an existing member's information; changed fields go to the audit log."""
+        changed = db.write(MemberModel._update_member, member_id, full_name, email, phone, address)
+        if changed:
+            audit.record('members', member_id, 'update', changed)
+
+    @staticmethod
+    def _update_member(conn, member_id, full_name, email, phone, address):
+        before = audit.snapshot(conn, 'members', member_id)
+        if before is None:
+            return None
+        conn.execute('''
             UPDATE members
             SET full_name = ?, email = ?, phone = ?, address = ?
             WHERE id = ?
         ''', (full_name, email, phone, address, member_id))
-        conn.commit()
-        conn.close()
+        after = {'full_name': full_name, 'email': email, 'phone': phone, 'address': address}
+        # {field: [old, new]} for the fields that actually changed
+        return {k: [before[k], v] for k, v in after.items() if before[k] != v}
 
     @staticmethod
     def delete_member(member_id):
-        """Delete a member from the database by ID."""
-        conn = MemberModel.connect()
-        cur = conn.cursor()
-        cur.execute('DELETE FROM members WHERE id=?', (member_id,))
-        conn.commit()
-        conn.close()
+        """Delete a member from the database by ID; the deleted row is kept in the audit log."""
+        before = db.write(MemberModel._delete_member, member_id)
+        if before is not None:
+            audit.record('members', member_id, 'delete', before)
+
+    @staticmethod
+    def _delete_member(conn, member_id):
+        before = audit.snapshot(conn, 'members', member_id)
+        conn.execute('DELETE FROM members WHERE id=?', (member_id,))
+        RecommendationModel.forget_member(conn, member_id)
+        return before
@@ -0,0 +1,136 @@
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import bcrypt
+
+log = logging.getLogger(__name__)
+
+# bcrypt cost factor for new hashes; existing hashes with another cost are
+# rehashed on the next successful login.
+ROUNDS = 12
+
+
+def default_workers():
+    """Hashing processes per server worker: the cores shared among the workers.
+
+    Every gunicorn worker (WEB_CONCURRENCY, one per core by default) has
+    its own pool, so a pool per core in each would run about cores²
+    hashing processes.
+    """
+    cpus = os.cpu_count() or 1
+    return max(1, cpus // int(os.environ.get('WEB_CONCURRENCY', cpus)))
+
+
+# Size of the hashing process pool (0 hashes inline on the calling thread).
+WORKERS = default_workers()
+# Hash/check calls allowed in flight per process before callers get
+# PasswordPoolBusy instead of queueing behind a login storm.
+MAX_PENDING = 32
+# Seconds a caller waits for its result before giving up.
+TIMEOUT = 10
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(MAX_PENDING)
+
+
+class PasswordPoolBusy(Exception):
+    """Raised when the hashing pool already has MAX_PENDING jobs queued."""
+
+
+def configure(rounds=None, workers=None, max_pending=None):
+    """Apply the PASSWORD_* settings; resets the pool so they take effect."""
+    global ROUNDS, WORKERS, MAX_PENDING, _slots
+    if rounds is not None:
+        ROUNDS = int(rounds)
+    if workers is not None:
+        WORKERS = int(workers)
+    if max_pending is not None:
+        MAX_PENDING = int(max_pending)
+    _slots = threading.BoundedSemaphore(MAX_PENDING)
+    shutdown()
+
+
+def shutdown():
+    """Stop the hashing processes of this process, if any."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def hash_password(password):
+    """Return a bcrypt hash of ``password`` at the configured cost."""
+    return _run(_hash, password.encode('utf-8'), ROUNDS)
+
+
+def check_password(password, hashed):
+    """Return True if ``password`` matches the stored bcrypt ``hashed`` value."""
+    if not hashed:
+        return False
+    return _run(_check, password.encode('utf-8'), hashed.encode('utf-8'))
+
+
+def needs_rehash(hashed):
+    """True when ``hashed`` was produced with a cost other than ROUNDS."""
+    try:
+        return int(hashed.split('$')[2]) != ROUNDS
+    except (AttributeError, IndexError, ValueError):
+        return True
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _check(password, hashed):
+    try:
+        return bcrypt.checkpw(password, hashed)
+    except ValueError:
+        # Malformed stored hash
+        return False
+
+
+def _get_pool():
+    global _pool, _pool_pid
+    with _pool_lock:
+        # Executors do not survive fork; build a fresh one per worker process.
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ProcessPoolExecutor(max_workers=WORKERS)
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def _drop_pool(pool):
+    """Forget ``pool`` (if it is still the current one) so the next call builds a new one."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _run(fn, *args):
+    if WORKERS <= 0:
+        return fn(*args)
+    slots = _slots
+    if not slots.acquire(blocking=False):
+        raise PasswordPoolBusy()
+    try:
+        pool = _get_pool()
+        try:
+            return pool.submit(fn, *args).result(timeout=TIMEOUT)
+        except BrokenProcessPool:
+            # A hashing process died (e.g. OOM-killed); rebuild the pool once
+            log.warning('Password hashing pool broke; starting a new one')
+            _drop_pool(pool)
+            return _get_pool().submit(fn, *args).result(timeout=TIMEOUT)
+    except TimeoutError:
+        raise PasswordPoolBusy()
+    finally:
+        slots.release()
@@ -0,0 +1,160 @@
+from models import db
+
+
+class RecommendationModel:
+    """Co-borrowing counts ("members who borrowed X also borrowed Y").
+
+    ``member_books`` holds each distinct (member, book) borrow once, with
+    the number of loans behind it. ``book_pairs`` counts, for every ordered
+    pair of books, how many members borrowed both. When a member borrows a
+    book for the first time, the pair counts with each book already in their
+    history go up by one, inside the same write as the issue itself.
+    Deleting a member, a book or a member's last loan of a book takes the
+    counts down again in the delete's own write. Reading the top related
+    books is an index range scan on ``(book_id, score)``.
+    """
+
+    @staticmethod
+    def connect():
+        return db.connect()
+
+    @staticmethod
+    def create_table():
+        """Create the co-occurrence tables and backfill them from the ledger."""
+        conn = RecommendationModel.connect()
+        cur = conn.cursor()
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS member_books (
+                member_id INTEGER NOT NULL,
+                book_id INTEGER NOT NULL,
+                loans INTEGER NOT NULL DEFAULT 1,
+                PRIMARY KEY (member_id, book_id)
+            ) WITHOUT ROWID
+        ''')
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_member_books_book ON member_books (book_id)")
+        cur.execute("PRAGMA table_info(member_books)")
+        # Tables from before the loan counts are rebuilt to fill them in
+        stale = 'loans' not in {row[1] for row in cur.fetchall()}
+        if stale:
+            cur.execute("ALTER TABLE member_books ADD COLUMN loans INTEGER NOT NULL DEFAULT 1")
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS book_pairs (
+                book_id INTEGER NOT NULL,
+                related_id INTEGER NOT NULL,
+                score INTEGER NOT NULL,
+                PRIMARY KEY (book_id, related_id)
+            ) WITHOUT ROWID
+        ''')
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_book_pairs_top ON book_pairs (book_id, score DESC, related_id)")
+        conn.commit()
+        empty = cur.execute("SELECT NOT EXISTS (SELECT 1 FROM member_books)").fetchone()[0]
+        conn.close()
+        if empty or stale:
+            db.write(RecommendationModel._rebuild)
+
+    @staticmethod
+    def rebuild():
+        """Recompute both tables from the transaction history of existing members and books."""
+        db.write(RecommendationModel._rebuild)
+
+    @staticmethod
+    def _rebuild(conn):
+        conn.execute("DELETE FROM member_books")
+        conn.execute("DELETE FROM book_pairs")
+        conn.execute('''
+            INSERT INTO member_books (member_id, book_id, loans)
+            SELECT l.member_id, l.book_id, COUNT(*)
+            FROM ledger l
+            JOIN members m ON m.id = l.member_id
+            JOIN books b ON b.id = l.book_id
+            GROUP BY l.member_id, l.book_id
+        ''')
+        conn.execute('''
+            INSERT INTO book_pairs (book_id, related_id, score)
+            SELECT a.book_id, b.book_id, COUNT(*)
+            FROM member_books a
+            JOIN member_books b ON b.member_id = a.member_id AND b.book_id != a.book_id
+            GROUP BY a.book_id, b.book_id
+        ''')
+
+    @staticmethod
+    def record_borrow(conn, member_id, book_id):
+        """Count a borrow on ``conn``; repeat borrows of the same book leave the pairs alone."""
+        loans = conn.execute('''
+            INSERT INTO member_books (member_id, book_id) VALUES (?, ?)
+            ON CONFLICT (member_id, book_id) DO UPDATE SET loans = loans + 1
+            RETURNING loans
+        ''', (member_id, book_id)).fetchall()[0][0]
+        if loans > 1:
+            return
+        others = [(r[0],) for r in conn.execute(
+            "SELECT book_id FROM member_books WHERE member_id = ? AND book_id != ?",
+            (member_id, book_id))]
+        upsert = '''
+            INSERT INTO book_pairs (book_id, related_id, score) VALUES (?, ?, 1)
+            ON CONFLICT (book_id, related_id) DO UPDATE SET score = score + 1
+        '''
+        conn.executemany(upsert, [(book_id, other) for (other,) in others])
+        conn.executemany(upsert, [(other, book_id) for (other,) in others])
+
+    @staticmethod
+    def forget_borrow(conn, member_id, book_id):
+        """Uncount one deleted loan on ``conn``; the member's last loan of the book drops its pairs."""
+        rows = conn.execute('''
+            UPDATE member_books SET loans = loans - 1
+            WHERE member_id = ? AND book_id = ?
+            RETURNING loans
+        ''', (member_id, book_id)).fetchall()
+        if rows and rows[0][0] <= 0:
+            RecommendationModel._forget(conn, member_id, [book_id])
+
+    @staticmethod
+    def forget_member(conn, member_id):
+        """Drop a deleted member's borrows and their pair counts on ``conn``."""
+        books = [r[0] for r in conn.execute(
+            "SELECT book_id FROM member_books WHERE member_id = ?", (member_id,))]
+        RecommendationModel._forget(conn, member_id, books)
+
+    @staticmethod
+    def _forget(conn, member_id, books):
+        """Remove ``books`` from a member's history, taking each pair they formed down by one."""
+        if not books:
+            return
+        marks = ','.join('?' * len(books))
+        conn.execute(f"DELETE FROM member_books WHERE member_id = ? AND book_id IN ({marks})",
+                     [member_id] + books)
+        # Pairs among the forgotten books, and between them and the rest
+        conn.execute(f'''
+            UPDATE book_pairs SET score = score - 1
+            WHERE (book_id IN ({marks}) AND related_id IN (SELECT book_id FROM member_books WHERE member_id = ?))
+               OR (related_id IN ({marks}) AND book_id IN (SELECT book_id FROM member_books WHERE member_id = ?))
+               OR (book_id IN ({marks}) AND related_id IN ({marks}))
+        ''', books + [member_id] + books + [member_id] + books + books)
+        conn.execute(f'''
+            DELETE FROM book_pairs
+            WHERE score <= 0 AND (book_id IN ({marks}) OR related_id IN ({marks}))
+        ''', books + books)
+
+    @staticmethod
+    def forget_book(conn, book_id):
+        """Drop a deleted book from every history and pair on ``conn``."""
+        conn.execute("DELETE FROM member_books WHERE book_id = ?", (book_id,))
+        related = [r[0] for r in conn.execute(
+            "DELETE FROM book_pairs WHERE book_id = ? RETURNING related_id", (book_id,)).fetchall()]
+        conn.executemany("DELETE FROM book_pairs WHERE book_id = ? AND related_id = ?",
+                         [(other, book_id) for other in related])
+
+    @staticmethod
+    def related(book_id, limit=10):
+        """Top ``limit`` books co-borrowed with ``book_id``, most shared borrowers first."""
+        conn = db.connect_readonly()
+        rows = conn.execute('''
+            SELECT b.id, b.title, b.author, b.category, p.score
+            FROM book_pairs p
+            JOIN books b ON b.id = p.related_id
+            WHERE p.book_id = ?
+            ORDER BY p.score DESC, p.related_id
+            LIMIT ?
+        ''', (book_id, limit)).fetchall()
+        conn.close()
+        return rows
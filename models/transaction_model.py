@@ -1,13 +1,13 @@
-import sqlite3
+from models import audit, db, fines
+from models.copy_model import CopyModel, NoCopyAvailable
+from models.recommendation_model import RecommendationModel
 from datetime import datetime
 
 class TransactionModel:
     @staticmethod
     def connect():
         """Create a database connection with row access as dictionary-like."""
-        conn = sqlite3.connect('library.db')
-        conn.row_factory = sqlite3.Row
-        return conn
+        return db.connect()
 
     @staticmethod
     def create_table():
@@ -25,6 +25,20 @@ class TransactionModel:
                 FOREIGN KEY (book_id) REFERENCES books(id)
             )
         ''')
+        cur.execute("PRAGMA table_info(transactions)")
+        if 'copy_id' not in {row[1] for row in cur.fetchall()}:
+            cur.execute("ALTER TABLE transactions ADD COLUMN copy_id INTEGER REFERENCES copies(id)")
+        # Open loans by book, for returns keyed by a scanned book, and by copy
+        cur.execute('''
+            CREATE INDEX IF NOT EXISTS idx_transactions_open
+            ON transactions (book_id, member_id) WHERE return_date IS NULL
+        ''')
+        # Issue-date ranges (per-month export, dated reports)
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_transactions_issue_date ON transactions (issue_date)")
+        cur.execute('''
+            CREATE INDEX IF NOT EXISTS idx_transactions_open_copy
+            ON transactions (copy_id) WHERE return_date IS NULL
+        ''')
         conn.commit()
         conn.close()
 
@@ -44,6 +58,55 @@ class TransactionModel:
         conn.close()
         return data
 
+    @staticmethod
+    def iter_all(conn=None):
+        """Yield transactions with member and book names, one at a time.
+
+        Loans of deleted members or books are kept, with a None name.
+        """
+        return db.iter_rows('''
+            SELECT t.id, m.full_name AS member_name, b.title AS book_title,
+                   t.issue_date, t.return_date
+            FROM transactions t
+            LEFT JOIN members m ON t.member_id = m.id
+            LEFT JOIN books b ON t.book_id = b.id
+        ''', conn=conn)
+
+    @staticmethod
+    def listing():
+        """Hot-table stats and an :meth:`iter_all` iterator read from one snapshot."""
+        conn = db.connect_readonly()
+        try:
+            stats = TransactionModel._stats(conn, include_archive=False)
+        except Exception:
+            conn.close()
+            raise
+        return stats, TransactionModel.iter_all(conn)
+
+    @staticmethod
+    def get_stats(include_archive=True):
+        """Return total, issued (not returned) and returned transaction counts.
+
+        Archived transactions are all returned, so they only add to the total;
+        ``include_archive=False`` counts the hot table alone, as listed on the
+        transactions page.
+        """
+        conn = TransactionModel.connect()
+        try:
+            return TransactionModel._stats(conn, include_archive)
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _stats(conn, include_archive):
+        archived = '+ (SELECT COUNT(*) FROM transactions_archive)' if include_archive else ''
+        row = conn.execute(f'''
+            SELECT COUNT(*) {archived} AS total,
+                   COALESCE(SUM(CASE WHEN return_date IS NULL OR return_date = '' THEN 1 ELSE 0 END), 0) AS issued
+            FROM transactions
+        ''').fetchone()
+        return {"total": row['total'], "issued": row['issued'], "returned": row['total'] - row['issued']}
+
     @staticmethod
     def get_by_id(transaction_id):
         """Get a single transaction by ID."""
@@ -55,37 +118,101 @@ class TransactionModel:
         return data
 
     @staticmethod
-    def issue_book(member_id, book_id, issue_date=None):
-        """Insert a new transaction (issue a book)."""
-        if issue_date is None:
-            issue_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    def open_loans(book_id, member_id=None):
+        """Unreturned transactions of a book, optionally for one member, oldest first."""
         conn = TransactionModel.connect()
-        cur = conn.cursor()
-        cur.execute('''
-            INSERT INTO transactions (member_id, book_id, issue_date)
-            VALUES (?, ?, ?)
-        ''', (member_id, book_id, issue_date))
-        conn.commit()
+        if member_id is None:
+            rows = conn.execute('''
+                SELECT * FROM transactions WHERE book_id = ? AND return_date IS NULL ORDER BY id
+            ''', (book_id,)).fetchall()
+        else:
+            rows = conn.execute('''
+                SELECT * FROM transactions
+                WHERE book_id = ? AND member_id = ? AND return_date IS NULL ORDER BY id
+            ''', (book_id, member_id)).fetchall()
         conn.close()
+        return rows
 
     @staticmethod
-    def return_book(transaction_id):
-        """Mark a transaction as returned and set return_date."""
+    def open_loan_of_copy(copy_id):
+        """The unreturned transaction holding ``copy_id``, or None."""
         conn = TransactionModel.connect()
+        row = conn.execute('''
+            SELECT * FROM transactions WHERE copy_id = ? AND return_date IS NULL
+        ''', (copy_id,)).fetchone()
+        conn.close()
+        return row
+
+    @staticmethod
+    def issue_book(member_id, book_id, issue_date=None, copy_id=None):
+        """Issue a copy (``copy_id``, or any shelved one) of a book; returns the transaction id.
+
+        Raises NoCopyAvailable when that copy, or every copy, is off the
+        shelf, or when members are queued for the book.
+        """
+        if issue_date is None:
+            issue_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        transaction_id = db.write(TransactionModel._issue, member_id, book_id, issue_date, copy_id)
+        return transaction_id
+
+    @staticmethod
+    def _issue(conn, member_id, book_id, issue_date, copy_id=None):
+        if CopyModel._queued(conn, book_id):
+            raise NoCopyAvailable(book_id)
+        copy_id = CopyModel._take(conn, book_id, copy_id)
+        return TransactionModel._insert_issue(conn, member_id, book_id, issue_date, copy_id)
+
+    @staticmethod
+    def _insert_issue(conn, member_id, book_id, issue_date, copy_id):
         cur = conn.cursor()
         cur.execute('''
+            INSERT INTO transactions (member_id, book_id, issue_date, copy_id)
+            VALUES (?, ?, ?, ?)
+        ''', (member_id, book_id, issue_date, copy_id))
+        RecommendationModel.record_borrow(conn, member_id, book_id)
+        return cur.lastrowid
+
+    @staticmethod
+    def return_book(transaction_id):
+        """Mark a transaction as returned and release its copy to the hold queue or the shelf.
+
+        Returns the id of the hold the copy was set aside for, or None.
+        """
+        return_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        return db.write(TransactionModel._return, transaction_id, return_date)
+
+    @staticmethod
+    def _return(conn, transaction_id, return_date):
+        copy_id = TransactionModel._mark_returned(conn, transaction_id, return_date)
+        return CopyModel._release(conn, copy_id, return_date)
+
+    @staticmethod
+    def _mark_returned(conn, transaction_id, return_date):
+        """Close an open loan; returns the id of the copy it released, if any."""
+        rows = conn.execute('''
             UPDATE transactions
             SET return_date = ?
-            WHERE id = ?
-        ''', (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), transaction_id))
-        conn.commit()
-        conn.close()
+            WHERE id = ? AND return_date IS NULL
+            RETURNING copy_id
+        ''', (return_date, transaction_id)).fetchall()
+        return rows[0][0] if rows else None
 
     @staticmethod
     def delete_transaction(transaction_id):
-        """Delete a transaction by ID."""
-        conn = TransactionModel.connect()
-        cur = conn.cursor()
-        cur.execute('DELETE FROM transactions WHERE id=?', (transaction_id,))
-        conn.commit()
-        conn.close()
+        """Delete a transaction by ID; the deleted row is kept in the audit log."""
+        before = db.write(TransactionModel._delete_transaction, transaction_id)
+        if before is not None:
+            audit.record('transactions', transaction_id, 'delete', before)
+
+    @staticmethod
+    def _delete_transaction(conn, transaction_id):
+        before = audit.snapshot(conn, 'transactions', transaction_id)
+        # Deleting an open loan releases its copy like a return
+        for copy_id, return_date, member_id, book_id in conn.execute(
+                'DELETE FROM transactions WHERE id=? RETURNING copy_id, return_date, member_id, book_id',
+                (transaction_id,)).fetchall():
+            if return_date is None:
+                CopyModel._release(conn, copy_id)
+            RecommendationModel.forget_borrow(conn, member_id, book_id)
+        fines._forget(conn, transaction_id)
+        return before
@@ -6,15 +6,37 @@ try:
 except ModuleNotFoundError:
     sys.path.append(os.path.dirname(os.path.dirname(__file__)))
     from config import get_db_connection
-import bcrypt
+from models import passwords
+from models.cache import TTLCache
 
 
 class UserModel:
+    # user id -> {"id", "full_name", "email", "profile_image"}; dropped on
+    # every profile, avatar or password change made through this model.
+    profile_cache = TTLCache(maxsize=1024, ttl=60)
+
+    @staticmethod
+    def get_profile(user_id):
+        """Return the cached name/email/avatar of a user, loading it on a miss."""
+        return UserModel.profile_cache.get_or_load(user_id, lambda: UserModel._load_profile(user_id))
+
+    @staticmethod
+    def _load_profile(user_id):
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, full_name, email, profile_image FROM users WHERE id = %s", (user_id,))
+        row = cursor.fetchone()
+        cursor.close()
+        conn.close()
+        if not row:
+            return None
+        return {"id": row[0], "full_name": row[1], "email": row[2], "profile_image": row[3]}
+
     @staticmethod
     def create_user(username, email, password):
         conn = get_db_connection()
         cursor = conn.cursor()
-        hashed_pw = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        hashed_pw = passwords.hash_password(password)
         cursor.execute(
             "INSERT INTO users (username, email, password) VALUES (%s, %s, %s)",
             (username, email, hashed_pw)
@@ -49,13 +71,8 @@ class UserModel:
 
     @staticmethod
     def get_profile_image(user_id):
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT profile_image FROM users WHERE id = %s", (user_id,))
-        row = cursor.fetchone()
-        cursor.close()
-        conn.close()
-        return row[0] if row else None
+        profile = UserModel.get_profile(user_id)
+        return profile["profile_image"] if profile else None
 
     @staticmethod
     def set_profile_image(user_id, relative_path):
@@ -65,16 +82,14 @@ class UserModel:
         conn.commit()
         cursor.close()
         conn.close()
+        UserModel.profile_cache.invalidate(user_id)
 
     @staticmethod
     def get_by_id(user_id):
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT id, full_name, email FROM users WHERE id = %s", (user_id,))
-        row = cursor.fetchone()
-        cursor.close()
-        conn.close()
-        return row
+        profile = UserModel.get_profile(user_id)
+        if not profile:
+            return None
+        return (profile["id"], profile["full_name"], profile["email"])
 
     @staticmethod
     def update_profile(user_id, username, email):
@@ -84,6 +99,7 @@ class UserModel:
         conn.commit()
         cursor.close()
         conn.close()
+        UserModel.profile_cache.invalidate(user_id)
 
     @staticmethod
     def verify_password(user_id, password_plain):
@@ -95,15 +111,15 @@ class UserModel:
         conn.close()
         if not row:
             return False
-        stored = row[0] or ''
-        return bcrypt.checkpw(password_plain.encode('utf-8'), stored.encode('utf-8'))
+        return passwords.check_password(password_plain, row[0] or '')
 
     @staticmethod
     def update_password(user_id, new_password):
         conn = get_db_connection()
         cursor = conn.cursor()
-        hashed_pw = bcrypt.hashpw(new_password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        hashed_pw = passwords.hash_password(new_password)
         cursor.execute("UPDATE users SET password = %s WHERE id = %s", (hashed_pw, user_id))
         conn.commit()
         cursor.close()
         conn.close()
+        UserModel.profile_cache.invalidate(user_id)
@@ -0,0 +1,168 @@
+import os
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+_STOP = object()
+
+
+class WriteTimeout(sqlite3.OperationalError):
+    """The writer did not finish an operation within ``submit_timeout``."""
+
+
+class WriteCoordinator:
+    """Funnel SQLite writes through one thread and commit them in groups.
+
+    Each submitted operation is a callable ``fn(conn, *args)``. The writer
+    thread drains whatever is queued (up to ``max_batch`` operations, waiting
+    at most ``max_wait`` seconds for stragglers), runs every operation inside
+    its own SAVEPOINT of a single transaction and commits once. A failing
+    operation is rolled back to its savepoint and only its caller sees the
+    exception; the rest of the batch still commits. If the transaction
+    itself fails (a busy or I/O error), every operation of that batch fails
+    and the writer carries on with a fresh connection.
+    """
+
+    def __init__(self, path, max_batch=64, max_wait=0.002, busy_timeout_ms=5000, submit_timeout=30):
+        self.path = path
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.busy_timeout_ms = busy_timeout_ms
+        self.submit_timeout = submit_timeout
+        self._queue = queue.Queue()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.operations = 0
+
+    def submit(self, fn, *args, **kwargs):
+        """Queue ``fn(conn, *args, **kwargs)`` and block until it is committed.
+
+        Raises WriteTimeout if the writer has not started the operation after
+        ``submit_timeout`` seconds (it is then dropped), or has not finished
+        it after twice that (its outcome is then unknown).
+        """
+        if threading.current_thread() is self._thread:
+            # From inside an operation: the writer would wait on itself
+            raise RuntimeError('nested write: use the connection passed to the operation')
+        self._ensure_started()
+        future = Future()
+        self._queue.put((fn, args, kwargs, future))
+        try:
+            return future.result(self.submit_timeout)
+        except FutureTimeout:
+            pass
+        if future.cancel():
+            raise WriteTimeout('database writer did not start the operation')
+        try:
+            return future.result(self.submit_timeout)
+        except FutureTimeout:
+            raise WriteTimeout('database write did not finish and may still commit') from None
+
+    def stop(self, timeout=5):
+        """Flush pending operations and stop the writer thread."""
+        thread = self._thread
+        if thread is None or self._pid != os.getpid():
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout)
+        self._thread = None
+
+    def _ensure_started(self):
+        # A forked worker inherits the object but not the thread, and a
+        # thread can die: restart it.
+        if self._running():
+            return
+        with self._lock:
+            if self._running():
+                return
+            if self._pid != os.getpid():
+                self._queue = queue.Queue()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='sqlite-writer', daemon=True)
+            self._thread.start()
+
+    def _running(self):
+        return self._thread is not None and self._pid == os.getpid() and self._thread.is_alive()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute(f'PRAGMA busy_timeout = {int(self.busy_timeout_ms)}')
+        return conn
+
+    def _next_batch(self):
+        first = self._queue.get()
+        if first is _STOP:
+            return [], True
+        batch = [first]
+        while len(batch) < self.max_batch:
+            try:
+                item = self._queue.get(timeout=self.max_wait)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self):
+        conn = self._connect()
+        try:
+            stopping = False
+            while not stopping:
+                batch, stopping = self._next_batch()
+                if not batch:
+                    continue
+                try:
+                    self._commit_batch(conn, batch)
+                except Exception as e:
+                    # SAVEPOINT/ROLLBACK TO failed: give up on this batch only
+                    for _, _, _, future in batch:
+                        if not future.done():
+                            future.set_exception(e)
+                    conn.close()
+                    conn = self._connect()
+        finally:
+            conn.close()
+
+    def _commit_batch(self, conn, batch):
+        # Callers that timed out cancelled their operation; skip it
+        batch[:] = [item for item in batch if item[3].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        results = []
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+        except Exception as e:
+            for _, _, _, future in batch:
+                future.set_exception(e)
+            return
+
+        for fn, args, kwargs, future in batch:
+            conn.execute('SAVEPOINT op')
+            try:
+                results.append((future, fn(conn, *args, **kwargs), None))
+                conn.execute('RELEASE op')
+            except Exception as e:
+                conn.execute('ROLLBACK TO op')
+                conn.execute('RELEASE op')
+                results.append((future, None, e))
+
+        try:
+            conn.execute('COMMIT')
+        except Exception as e:
+            conn.execute('ROLLBACK')
+            for future, _, _ in results:
+                future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.operations += len(batch)
+        for future, value, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(value)
@@ -0,0 +1,31 @@
+from flask import Blueprint, jsonify, request
+from models import audit
+
+audit_bp = Blueprint('audit_bp', __name__)
+
+
+# =====================
+# AUDIT LOG
+# =====================
+@audit_bp.route('/api/audit', methods=['GET'])
+def api_audit():
+    """Audit events, newest first; filter by entity/entity_id/action and a since/until range."""
+    try:
+        entity_id = int(request.args['entity_id']) if request.args.get('entity_id') else None
+        before_id = int(request.args['before_id']) if request.args.get('before_id') else None
+        limit = max(1, min(500, int(request.args.get('limit', 100))))
+    except ValueError:
+        return jsonify({'error': 'entity_id, before_id and limit must be numbers'}), 400
+    items = audit.query(
+        entity=request.args.get('entity') or None,
+        entity_id=entity_id,
+        since=request.args.get('since') or None,
+        until=request.args.get('until') or None,
+        action=request.args.get('action') or None,
+        before_id=before_id,
+        limit=limit,
+    )
+    return jsonify({
+        'items': items,
+        'next_before_id': items[-1]['id'] if len(items) == limit else None,
+    })
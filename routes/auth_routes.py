@@ -1,9 +1,18 @@
 # routes/auth_routes.py
+import logging
+
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash, jsonify
 from models.user_model import UserModel
-import bcrypt
+from models import passwords
 
 auth_bp = Blueprint('auth_bp', __name__, url_prefix='/auth')
+log = logging.getLogger(__name__)
+
+@auth_bp.app_errorhandler(passwords.PasswordPoolBusy)
+def password_pool_busy(e):
+    """Shed load instead of queueing more bcrypt work behind a login storm."""
+    return jsonify({"error": "Server busy, please retry shortly"}), 503, {'Retry-After': '1'}
+
 
 @auth_bp.route('/register', methods=['GET', 'POST'])
 def register():
@@ -33,7 +42,14 @@ def login():
 
         if user:
             user_id, full_name, user_email, hashed_pw = user
-            if bcrypt.checkpw(password.encode('utf-8'), hashed_pw.encode('utf-8')):
+            if passwords.check_password(password, hashed_pw):
+                if passwords.needs_rehash(hashed_pw):
+                    # Cost factor changed since this hash was made; upgrade it.
+                    # Best effort: the login stands even if the upgrade fails
+                    try:
+                        UserModel.update_password(user_id, password)
+                    except Exception:
+                        log.warning("Rehashing the password of user %s failed", user_id, exc_info=True)
                 session['user_id'] = user_id
                 session['user_name'] = full_name
                 flash("Login successful!", "success")
@@ -109,5 +125,7 @@ def change_password():
             return jsonify({"error": "Current password is incorrect"}), 400
         UserModel.update_password(user_id, new_password)
         return jsonify({"message": "Password changed"})
+    except passwords.PasswordPoolBusy:
+        raise
     except Exception:
         return jsonify({"error": "Failed to change password"}), 500
@@ -22,14 +22,14 @@ def add_book():
     if request.method == 'POST':
         data = request.form
         BookModel.add_book(
-            data['isbn'],
             data['title'],
             data['author'],
             data['publisher'],
             data['year'],
             data['category'],
             data['total'],
-            data['available']
+            data['available'],
+            isbn=BookModel.normalize_isbn(data.get('isbn'))
         )
         return redirect(url_for('book_bp.view_books'))
     return render_template('add_book.html')
@@ -1,6 +1,11 @@
+import sqlite3
+
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from models import archive, db
 from models.book_model import BookModel
+from models.copy_model import CopyModel
 from models.member_model import MemberModel
+from models.recommendation_model import RecommendationModel
 
 # =====================
 # BOOK BLUEPRINT
@@ -35,7 +40,7 @@ def api_books_list():
         sort = 'title'
     order_sql = 'DESC' if order.lower() == 'desc' else 'ASC'
 
-    conn = BookModel.connect()
+    conn = db.connect_readonly()
     cur = conn.cursor()
     where = []
     params = []
@@ -53,7 +58,8 @@ def api_books_list():
 
     offset = (page - 1) * per_page
     cur.execute(
-        f'''SELECT id, title, author, publisher, year_published, category, total_copies, available_copies
+        f'''SELECT id, title, author, publisher, year_published, category, total_copies, available_copies,
+                   isbn, barcode
             FROM books {where_sql}
             ORDER BY {sort} {order_sql}
             LIMIT ? OFFSET ?''',
@@ -70,7 +76,9 @@ def api_books_list():
             'year_published': r['year_published'],
             'category': r['category'],
             'total_copies': r['total_copies'],
-            'available_copies': r['available_copies']
+            'available_copies': r['available_copies'],
+            'isbn': r['isbn'],
+            'barcode': r['barcode']
         } for r in rows
     ]
     return jsonify({'total': total, 'page': page, 'per_page': per_page, 'items': items})
@@ -108,8 +116,9 @@ def api_popular_books():
     start_s = start_dt.strftime('%Y-%m-%d 00:00:00')
     end_s = end_dt.strftime('%Y-%m-%d 23:59:59')
 
-    conn = BookModel.connect()
+    conn = db.connect_readonly()
     cur = conn.cursor()
+    ledger = archive.source(conn, start_s)
 
     where = ['t.issue_date BETWEEN ? AND ?']
     params = [start_s, end_s]
@@ -137,7 +146,7 @@ def api_popular_books():
             b.total_copies,
             b.available_copies,
             COUNT(*) as count
-        FROM transactions t
+        FROM {ledger} t
         JOIN books b ON b.id = t.book_id
         WHERE {where_sql}
         GROUP BY b.id
@@ -164,10 +173,99 @@ def api_popular_books():
         'items': items
     })
 
+# Books co-borrowed with this one ("members who borrowed this also borrowed")
+@book_bp.route('/api/<int:book_id>/related', methods=['GET'])
+def api_related_books(book_id):
+    try:
+        limit = max(1, min(50, int(request.args.get('limit', 10))))
+    except Exception:
+        limit = 10
+    rows = RecommendationModel.related(book_id, limit)
+    return jsonify({
+        'book_id': book_id,
+        'items': [{
+            'id': r['id'],
+            'title': r['title'],
+            'author': r['author'],
+            'category': r['category'],
+            'score': r['score']
+        } for r in rows]
+    })
+
+# Scan lookup: barcode or ISBN -> book and availability
+@book_bp.route('/api/lookup/<code>', methods=['GET'])
+def api_lookup_book(code):
+    book = BookModel.find_by_code(code)
+    if book is None:
+        return jsonify({'error': 'No book with this barcode or ISBN.'}), 404
+    return jsonify({
+        'id': book['id'],
+        'title': book['title'],
+        'author': book['author'],
+        'isbn': book['isbn'],
+        'barcode': book['barcode'],
+        'total_copies': book['total_copies'],
+        'available_copies': book['available_copies'],
+        'available': (book['available_copies'] or 0) > 0,
+        'copy': {
+            'id': book['copy_id'],
+            'status': book['copy_status'],
+            'location': book['copy_location']
+        } if book['copy_id'] else None
+    })
+
+# Physical copies of a book: where each one is and who has it
+def copy_json(c):
+    return {
+        'id': c['id'],
+        'book_id': c['book_id'],
+        'barcode': c['barcode'],
+        'status': c['status'],
+        'location': c['location'],
+        'added_at': c['added_at']
+    }
+
+@book_bp.route('/api/<int:book_id>/copies', methods=['GET'])
+def api_book_copies(book_id):
+    items = []
+    for c in CopyModel.for_book(book_id):
+        item = copy_json(c)
+        item['transaction_id'] = c['transaction_id']
+        item['borrower_id'] = c['borrower_id']
+        item['hold_id'] = c['hold_id']
+        items.append(item)
+    return jsonify({'book_id': book_id, 'available': CopyModel.available_count(book_id), 'items': items})
+
+@book_bp.route('/api/<int:book_id>/copies', methods=['POST'])
+def api_add_copy(book_id):
+    data = request.get_json(silent=True) or request.form
+    if not BookModel.get_by_id(book_id):
+        return jsonify({'error': 'Book not found.'}), 404
+    status = data.get('status', 'available')
+    if status not in CopyModel.SHELF_STATUSES:
+        return jsonify({'error': f"status must be one of {', '.join(CopyModel.SHELF_STATUSES)}"}), 400
+    try:
+        copy_id = CopyModel.add_copy(book_id, data.get('barcode'), data.get('location'), status)
+    except sqlite3.IntegrityError:
+        return jsonify({'error': 'Another copy already has this barcode.'}), 409
+    return jsonify(copy_json(CopyModel.get_by_id(copy_id))), 201
+
+@book_bp.route('/api/copies/<int:copy_id>', methods=['POST'])
+def api_update_copy(copy_id):
+    data = request.get_json(silent=True) or request.form
+    status = data.get('status')
+    if status is not None and status not in CopyModel.SHELF_STATUSES:
+        return jsonify({'error': f"status must be one of {', '.join(CopyModel.SHELF_STATUSES)}"}), 400
+    if CopyModel.get_by_id(copy_id) is None:
+        return jsonify({'error': 'Copy not found.'}), 404
+    if not CopyModel.update(copy_id, status, data.get('location')):
+        return jsonify({'error': 'The copy is on loan or set aside for a hold.'}), 409
+    return jsonify(copy_json(CopyModel.get_by_id(copy_id)))
+
 # Categories endpoint for filters
 @book_bp.route('/api/categories', methods=['GET'])
 def api_books_categories():
-    conn = BookModel.connect()
+    conn = db.connect_readonly()
     cur = conn.cursor()
     cur.execute('SELECT DISTINCT category FROM books WHERE category IS NOT NULL AND TRIM(category) != "" ORDER BY category ASC')
     cats = [r[0] for r in cur.fetchall()]
@@ -199,7 +297,7 @@ def api_categories_stats():
         sort = 'category'
     order_sql = 'DESC' if order.lower() == 'desc' else 'ASC'
 
-    conn = BookModel.connect()
+    conn = db.connect_readonly()
     cur = conn.cursor()
     where = ""
     params = []
@@ -259,8 +357,18 @@ def add_book():
         category = data.get('category')
         total = data.get('total')
         available = data.get('available')
+        isbn = data.get('isbn', '').strip()
+        barcode = data.get('barcode', '').strip()
 
-        BookModel.add_book(title, author, publisher, year, category, total, available)
+        if isbn and BookModel.normalize_isbn(isbn) is None:
+            flash("That ISBN is not valid.", "danger")
+            return render_template('add_book.html')
+        try:
+            BookModel.add_book(title, author, publisher, year, category, total, available,
+                               isbn=BookModel.normalize_isbn(isbn), barcode=barcode)
+        except sqlite3.IntegrityError:
+            flash("Another book already has this ISBN or barcode.", "danger")
+            return render_template('add_book.html')
         flash("Book added successfully!", "success")
         return redirect(url_for('book_bp.view_books'))
 
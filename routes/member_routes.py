@@ -1,6 +1,8 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from datetime import date
-import sqlite3
+import base64
+import json
+from models import db, fines
 from models.member_model import MemberModel
 
 member_bp = Blueprint('member_bp', __name__, url_prefix='/members')
@@ -10,9 +12,143 @@ member_bp = Blueprint('member_bp', __name__, url_prefix='/members')
 # =====================
 @member_bp.route('/')
 def view_members():
-    """Display all members in the database."""
-    members = MemberModel.get_all()
-    return render_template('members.html', members=members)
+    """Display the members page; rows are loaded via JS from /members/api."""
+    return render_template('members.html')
+
+# Columns a client may request through ?fields=
+MEMBER_FIELDS = (
+    'id', 'full_name', 'first_name', 'last_name', 'email', 'phone', 'address',
+    'date_of_birth', 'gender', 'city', 'state', 'postal_code', 'member_type',
+    'membership_date', 'institution', 'emergency_contact_name',
+    'emergency_contact_phone', 'notes', 'terms_agreed', 'created_at'
+)
+# Computed fields: the outstanding fine balance from the last accrual
+MEMBER_EXTRA_FIELDS = {
+    'fine_balance': '(SELECT balance_cents FROM member_fines WHERE member_id = members.id)',
+}
+DEFAULT_MEMBER_FIELDS = (
+    'id', 'full_name', 'first_name', 'last_name', 'email', 'phone',
+    'city', 'member_type', 'membership_date'
+)
+# Sortable columns; NULLs sort as '' so keyset comparisons stay total
+MEMBER_SORTS = {
+    'id': 'id',
+    'full_name': "COALESCE(full_name, '')",
+    'membership_date': "COALESCE(membership_date, '')",
+    'city': "COALESCE(city, '')",
+    'member_type': "COALESCE(member_type, '')",
+}
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """``[sort_key, id]`` from a cursor, or None if it is not one we issued.
+
+    Sort keys are COALESCEd, so never NULL; bools are JSON, but not keys.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except Exception:
+        return None
+    if not (isinstance(values, list) and len(values) == 2):
+        return None
+    key, last_id = values
+    if isinstance(key, bool) or not isinstance(key, (str, int, float)):
+        return None
+    if isinstance(last_id, bool) or not isinstance(last_id, int):
+        return None
+    return values
+
+# =====================
+# MEMBERS JSON API
+# =====================
+@member_bp.route('/api', methods=['GET'])
+def api_members_list():
+    """Keyset-paginated member list.
+    Params: fields (comma list), q (name/email/phone), member_type, city,
+    membership_from, membership_to (YYYY-MM-DD), sort, order, limit, cursor
+    """
+    fields = [f for f in (request.args.get('fields') or '').split(',')
+              if f in MEMBER_FIELDS or f in MEMBER_EXTRA_FIELDS]
+    if not fields:
+        fields = list(DEFAULT_MEMBER_FIELDS)
+    if 'id' not in fields:
+        fields.insert(0, 'id')
+    q = (request.args.get('q') or '').strip()
+    member_type = (request.args.get('member_type') or '').strip()
+    city = (request.args.get('city') or '').strip()
+    membership_from = (request.args.get('membership_from') or '').strip()
+    membership_to = (request.args.get('membership_to') or '').strip()
+    sort = request.args.get('sort', 'full_name')
+    if sort not in MEMBER_SORTS:
+        sort = 'full_name'
+    desc = request.args.get('order', 'asc').lower() == 'desc'
+    try:
+        limit = min(100, max(1, int(request.args.get('limit', 25))))
+    except Exception:
+        limit = 25
+    cursor = request.args.get('cursor')
+
+    where = []
+    params = []
+    if q:
+        where.append('(full_name LIKE ? OR email LIKE ? OR phone LIKE ?)')
+        like = f"%{q}%"
+        params.extend([like, like, like])
+    if member_type:
+        where.append('member_type = ?')
+        params.append(member_type)
+    if city:
+        where.append('city = ?')
+        params.append(city)
+    if membership_from:
+        where.append('membership_date >= ?')
+        params.append(membership_from)
+    if membership_to:
+        where.append('membership_date <= ?')
+        params.append(membership_to)
+    filter_where = list(where)
+    filter_params = list(params)
+
+    sort_sql = MEMBER_SORTS[sort]
+    after = decode_cursor(cursor) if cursor else None
+    if cursor and after is None:
+        return jsonify({'error': 'invalid cursor'}), 400
+    if after:
+        where.append(f"({sort_sql}, id) {'<' if desc else '>'} (?, ?)")
+        params.extend(after)
+    where_sql = ('WHERE ' + ' AND '.join(where)) if where else ''
+    order_sql = 'DESC' if desc else 'ASC'
+
+    conn = db.connect_readonly()
+    cur = conn.cursor()
+    total = None
+    if not cursor:
+        # Only the first page pays for the count
+        filter_sql = ('WHERE ' + ' AND '.join(filter_where)) if filter_where else ''
+        cur.execute(f'SELECT COUNT(*) FROM members {filter_sql}', filter_params)
+        total = cur.fetchone()[0]
+    cur.execute(f'''
+        SELECT {', '.join(MEMBER_EXTRA_FIELDS[f] + ' AS ' + f if f in MEMBER_EXTRA_FIELDS else f for f in fields)},
+               {sort_sql} AS sort_key
+        FROM members {where_sql}
+        ORDER BY {sort_sql} {order_sql}, id {order_sql}
+        LIMIT ?
+    ''', params + [limit + 1])
+    rows = cur.fetchall()
+    conn.close()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    items = [{f: r[f] for f in fields} for r in rows]
+    if 'fine_balance' in fields:
+        for item in items:
+            item['fine_balance'] = (item['fine_balance'] or 0) / 100
+    next_cursor = encode_cursor([rows[-1]['sort_key'], rows[-1]['id']]) if has_more else None
+    return jsonify({'total': total, 'limit': limit, 'next_cursor': next_cursor, 'items': items})
 
 # =====================
 # ADD MEMBER
@@ -149,6 +285,14 @@ def delete_member(id):
     flash("Member deleted.", "info")
     return redirect(url_for('member_bp.view_members'))
 
+# =====================
+# MEMBER FINES
+# =====================
+@member_bp.route('/api/<int:id>/fines', methods=['GET'])
+def api_member_fines(id):
+    """Fine balance and per-loan fines of a member as of the last accrual."""
+    return jsonify(fines.for_member(id))
+
 # =====================
 # OVERDUE MEMBERS
 # =====================
@@ -158,8 +302,8 @@ def overdue_members_page():
 
 @member_bp.route('/api/overdue', methods=['GET'])
 def api_overdue_members():
-    """List overdue borrowings (unreturned beyond N days).
-    Params: q (search member/book), days (min overdue days, default 14), sort (days_overdue|member|book|issue_date), order, page, per_page
+    """List overdue borrowings (unreturned beyond N days) with their accrued fines.
+    Params: q (search member/book), days (min overdue days, default 14), sort (days_overdue|member|book|issue_date|fine), order, page, per_page
     """
     q = (request.args.get('q') or '').strip()
     try:
@@ -181,13 +325,13 @@ def api_overdue_members():
         'days_overdue': 'days_overdue',
         'member': 'member_name',
         'book': 'book_title',
-        'issue_date': 'issue_date'
+        'issue_date': 'issue_date',
+        'fine': 'fine_cents'
     }
     sort_sql = allowed_sort.get(sort, 'days_overdue')
     order_sql = 'DESC' if order.lower() == 'desc' else 'ASC'
 
-    conn = sqlite3.connect('library.db')
-    conn.row_factory = sqlite3.Row
+    conn = db.connect_readonly()
     cur = conn.cursor()
 
     where = ["t.return_date IS NULL", f"julianday('now') - julianday(t.issue_date) > ?"]
@@ -217,10 +361,13 @@ def api_overdue_members():
             b.id as book_id,
             b.title as book_title,
             t.issue_date as issue_date,
-            CAST(ROUND(julianday('now') - julianday(t.issue_date)) AS INTEGER) as days_overdue
+            CAST(ROUND(julianday('now') - julianday(t.issue_date)) AS INTEGER) as days_overdue,
+            COALESCE(f.amount_cents, 0) as fine_cents,
+            f.due_date as due_date
         FROM transactions t
         JOIN members m ON m.id = t.member_id
         JOIN books b ON b.id = t.book_id
+        LEFT JOIN fines f ON f.transaction_id = t.id
         WHERE {where_sql}
         ORDER BY {sort_sql} {order_sql}
         LIMIT ? OFFSET ?
@@ -237,7 +384,9 @@ def api_overdue_members():
             'book_id': r['book_id'],
             'book_title': r['book_title'],
             'issue_date': r['issue_date'],
-            'days_overdue': r['days_overdue']
+            'days_overdue': r['days_overdue'],
+            'due_date': r['due_date'],
+            'fine': r['fine_cents'] / 100
         })
 
     return jsonify({'total': total, 'page': page, 'per_page': per_page, 'days': days, 'items': items})
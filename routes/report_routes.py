@@ -1,13 +1,64 @@
-from flask import Blueprint, render_template, request, jsonify
+import bisect
+import calendar
+import threading
+from collections import namedtuple
+from flask import Blueprint, current_app, render_template, request, jsonify, url_for
 from datetime import datetime, timedelta
-import sqlite3
+from models import analytics, archive, db
+from models.jobs import JobQueueFull, JobRunner
 
 report_bp = Blueprint('report_bp', __name__)
 
+# Background runner for /api/reports/jobs; create_app() sizes it
+report_jobs = JobRunner()
+# Long-polls parked on a job at once in this process, so waiting clients
+# can never take the threads circulation needs; create_app() sizes it
+job_waiters = threading.BoundedSemaphore(1)
+# Query parameters that change a report's result (and so its job key)
+REPORT_PARAMS = ('type', 'start', 'end', 'limit')
+
+# What every report function gets: the whole-day range, the row limit of
+# ranked reports (None for their default), whether to read the NumPy
+# snapshot, and progress(fraction), called as stages finish
+ReportQuery = namedtuple('ReportQuery', 'start_dt end_dt limit snapshot progress')
+
+# Loan-duration histogram buckets, in days: [0,1), [1,3), ... [90, inf)
+DURATION_EDGES = [0, 1, 3, 7, 14, 21, 30, 60, 90, float('inf')]
+
+
 def connect_db():
-    conn = sqlite3.connect('library.db')
-    conn.row_factory = sqlite3.Row
-    return conn
+    return db.connect_readonly()
+
+
+class UnknownReport(ValueError):
+    """The requested report type does not exist."""
+
+
+def use_snapshot():
+    return analytics.is_available() and current_app.config.get('ANALYTICS_SNAPSHOT', True)
+
+
+def epoch_range(start_dt, end_dt):
+    """Whole-day [start, end] bounds as epoch seconds, matching start_s/end_s."""
+    start = calendar.timegm(start_dt.date().timetuple())
+    end = calendar.timegm(end_dt.date().timetuple()) + analytics.DAY - 1
+    return start, end
+
+
+def day_labels(start_dt, end_dt):
+    days = []
+    cur_day = start_dt.date()
+    while cur_day <= end_dt.date():
+        days.append(cur_day.strftime('%Y-%m-%d'))
+        cur_day += timedelta(days=1)
+    return days
+
+
+def duration_labels(edges):
+    labels = []
+    for lo, hi in zip(edges, edges[1:]):
+        labels.append(f'{lo:g}+ days' if hi == float('inf') else f'{lo:g}-{hi:g} days')
+    return labels
 
 
 def parse_dates(start, end):
@@ -29,92 +80,494 @@ def reports_page():
     return render_template('reports.html')
 
 
+# =======================
+# REPORT JOBS
+# =======================
+# Heavy reports run on the report_jobs pool instead of the request thread:
+# POST returns a job id at once, the client long-polls the job and reads
+# the stored result. Identical reports already queued or running are shared.
+def run_report_job(job, params, snapshot):
+    """Compute the report described by ``params`` for ``job``, reporting progress."""
+    limit = int(params['limit']) if 'limit' in params else None
+    return compute_report(params.get('type', 'summary'), params.get('start'), params.get('end'),
+                          limit, snapshot, progress=lambda fraction: report_jobs.set_progress(job, fraction))
+
+
+def configure_job_waiters(limit):
+    global job_waiters
+    job_waiters = threading.BoundedSemaphore(max(1, int(limit)))
+
+
+def job_response(job, status=200):
+    resp = jsonify(job.to_dict())
+    resp.status_code = status
+    resp.headers['Location'] = url_for('report_bp.get_report_job', job_id=job.id)
+    return resp
+
+
+@report_bp.app_errorhandler(JobQueueFull)
+def report_jobs_busy(e):
+    resp = jsonify({'error': 'Too many reports are running, please retry shortly.'})
+    resp.status_code = 503
+    resp.headers['Retry-After'] = '5'
+    return resp
+
+
+@report_bp.route('/api/reports/jobs', methods=['POST'])
+def submit_report_job():
+    source = request.get_json(silent=True) or request.values
+    params = {k: str(source[k]) for k in REPORT_PARAMS if source.get(k) not in (None, '')}
+    params.setdefault('type', 'summary')
+    snapshot = use_snapshot()
+    job, merged = report_jobs.submit(
+        ('report', tuple(sorted(params.items()))),
+        lambda job: run_report_job(job, params, snapshot))
+    return job_response(job, 200 if merged else 202)
+
+
+@report_bp.route('/api/reports/jobs/<job_id>')
+def get_report_job(job_id):
+    """Job status; ``?wait=N`` holds the request until it changes.
+
+    The wait is capped at REPORT_JOB_MAX_WAIT seconds, and when this
+    process already has REPORT_JOB_WAITERS polls parked the status is
+    returned at once; clients poll again after a pause.
+    """
+    job = report_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'unknown or expired job'}), 404
+    wait = min(max(request.args.get('wait', 0, type=float), 0), current_app.config['REPORT_JOB_MAX_WAIT'])
+    if wait and not job.finished and job_waiters.acquire(blocking=False):
+        try:
+            job = report_jobs.wait(job, request.args.get('version', type=int), timeout=wait) or job
+        finally:
+            job_waiters.release()
+    return job_response(job)
+
+
+@report_bp.route('/api/reports/jobs/<job_id>/result')
+def get_report_job_result(job_id):
+    job = report_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'unknown or expired job'}), 404
+    if job.status == 'failed':
+        return jsonify({'error': job.error}), 500
+    if job.status != 'done':
+        return job_response(job, 202)
+    return jsonify(job.result)
+
+
 @report_bp.route('/api/reports')
 def api_reports():
-    rtype = request.args.get('type', 'summary')
-    start = request.args.get('start')
-    end = request.args.get('end')
+    try:
+        data = compute_report(request.args.get('type', 'summary'), request.args.get('start'),
+                              request.args.get('end'), request.args.get('limit', type=int), use_snapshot())
+    except UnknownReport as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(data)
+
+
+def compute_report(rtype='summary', start=None, end=None, limit=None, snapshot=False, progress=None):
+    """Compute one report as a JSON-serializable dict.
+
+    Shared by ``/api/reports`` and report jobs, so it needs no request or
+    app context. Raises UnknownReport for an unknown ``rtype``.
+    """
     start_dt, end_dt = parse_dates(start, end)
-    start_s = start_dt.strftime('%Y-%m-%d 00:00:00')
-    end_s = end_dt.strftime('%Y-%m-%d 23:59:59')
+    q = ReportQuery(start_dt, end_dt, limit, snapshot and analytics.is_available(),
+                    progress or (lambda fraction: None))
+    q.progress(0.05)
+    if q.snapshot and rtype in SNAPSHOT_REPORTS:
+        return SNAPSHOT_REPORTS[rtype](q)
+    if rtype in ROLLUP_REPORTS:
+        return ROLLUP_REPORTS[rtype](q)
+    if rtype in SQL_REPORTS:
+        return SQL_REPORTS[rtype](q)
+    raise UnknownReport('unknown report type')
+
+
+def date_bounds(q):
+    return q.start_dt.strftime('%Y-%m-%d 00:00:00'), q.end_dt.strftime('%Y-%m-%d 23:59:59')
 
-    conn = connect_db()
-    cur = conn.cursor()
 
-    if rtype == 'summary':
+# =======================
+# SQL REPORTS
+# =======================
+def sql_summary(q):
+    start_s, end_s = date_bounds(q)
+    conn = connect_db()
+    try:
+        cur = conn.cursor()
+        # Ranges that start after everything archived only need the hot table
+        ledger = archive.source(conn, start_s)
         cur.execute("SELECT COUNT(*) FROM books")
         total_books = cur.fetchone()[0]
         cur.execute("SELECT COUNT(*) FROM members")
         total_members = cur.fetchone()[0]
-        cur.execute("SELECT COUNT(*) FROM transactions WHERE issue_date BETWEEN ? AND ?", (start_s, end_s))
+        q.progress(0.2)
+        cur.execute(f"SELECT COUNT(*) FROM {ledger} WHERE issue_date BETWEEN ? AND ?", (start_s, end_s))
         issued = cur.fetchone()[0]
-        cur.execute("SELECT COUNT(*) FROM transactions WHERE return_date BETWEEN ? AND ?", (start_s, end_s))
+        q.progress(0.5)
+        cur.execute(f"SELECT COUNT(*) FROM {ledger} WHERE return_date BETWEEN ? AND ?", (start_s, end_s))
         returned = cur.fetchone()[0]
+        q.progress(0.8)
         cur.execute("SELECT COUNT(*) FROM transactions WHERE return_date IS NULL")
         active_loans = cur.fetchone()[0]
-        data = {
-            'range': {'start': start_dt.strftime('%Y-%m-%d'), 'end': end_dt.strftime('%Y-%m-%d')},
-            'totals': {
-                'books': total_books,
-                'members': total_members,
-                'issued': issued,
-                'returned': returned,
-                'activeLoans': active_loans
-            }
-        }
+    finally:
         conn.close()
-        return jsonify(data)
+    return {
+        'range': {'start': q.start_dt.strftime('%Y-%m-%d'), 'end': q.end_dt.strftime('%Y-%m-%d')},
+        'totals': {
+            'books': total_books,
+            'members': total_members,
+            'issued': issued,
+            'returned': returned,
+            'activeLoans': active_loans
+        }
+    }
+
 
-    if rtype == 'popular_books':
-        limit = int(request.args.get('limit', 10))
-        cur.execute(
-            '''
+def sql_popular_books(q):
+    start_s, end_s = date_bounds(q)
+    conn = connect_db()
+    try:
+        rows = conn.execute(
+            f'''
             SELECT b.title, COUNT(*) AS c
-            FROM transactions t
+            FROM {archive.source(conn, start_s)} t
             JOIN books b ON b.id = t.book_id
             WHERE t.issue_date BETWEEN ? AND ?
             GROUP BY b.id
-            ORDER BY c DESC
+            ORDER BY c DESC, b.id
             LIMIT ?
-            ''', (start_s, end_s, limit)
-        )
-        rows = cur.fetchall()
+            ''', (start_s, end_s, 10 if q.limit is None else q.limit)
+        ).fetchall()
+    finally:
         conn.close()
-        return jsonify({'items': [{'title': r['title'], 'count': r['c']} for r in rows]})
+    return {'items': [{'title': r['title'], 'count': r['c']} for r in rows]}
+
 
-    if rtype == 'transactions_by_day':
-        cur.execute(
-            '''
+def sql_transactions_by_day(q):
+    start_s, end_s = date_bounds(q)
+    conn = connect_db()
+    try:
+        ledger = archive.source(conn, start_s)
+        issued = dict(conn.execute(
+            f'''
             SELECT substr(issue_date, 1, 10) AS day, COUNT(*) AS c
-            FROM transactions
+            FROM {ledger}
             WHERE issue_date BETWEEN ? AND ?
             GROUP BY day
-            ORDER BY day ASC
             ''', (start_s, end_s)
-        )
-        issued = {r['day']: r['c'] for r in cur.fetchall()}
-        cur.execute(
-            '''
+        ).fetchall())
+        q.progress(0.5)
+        returned = dict(conn.execute(
+            f'''
             SELECT substr(return_date, 1, 10) AS day, COUNT(*) AS c
-            FROM transactions
+            FROM {ledger}
             WHERE return_date BETWEEN ? AND ?
             GROUP BY day
-            ORDER BY day ASC
             ''', (start_s, end_s)
-        )
-        returned = {r['day']: r['c'] for r in cur.fetchall()}
+        ).fetchall())
+    finally:
         conn.close()
-        days = []
-        cur_day = start_dt.date()
-        while cur_day <= end_dt.date():
-            days.append(cur_day.strftime('%Y-%m-%d'))
-            cur_day += timedelta(days=1)
-        series = {
-            'labels': days,
-            'issued': [issued.get(d, 0) for d in days],
-            'returned': [returned.get(d, 0) for d in days]
+    days = day_labels(q.start_dt, q.end_dt)
+    return {
+        'labels': days,
+        'issued': [issued.get(d, 0) for d in days],
+        'returned': [returned.get(d, 0) for d in days]
+    }
+
+
+def sql_loan_durations(q):
+    start_s, end_s = date_bounds(q)
+    conn = connect_db()
+    try:
+        rows = conn.execute(
+            f'''
+            SELECT julianday(return_date) - julianday(issue_date) AS d
+            FROM {archive.source(conn, start_s)}
+            WHERE return_date BETWEEN ? AND ? AND issue_date IS NOT NULL
+            ''', (start_s, end_s)
+        ).fetchall()
+    finally:
+        conn.close()
+    counts = [0] * (len(DURATION_EDGES) - 1)
+    for (d,) in rows:
+        if d is not None and d >= 0:
+            counts[bisect.bisect_right(DURATION_EDGES, d) - 1] += 1
+    return {'labels': duration_labels(DURATION_EDGES), 'counts': counts}
+
+
+SQL_REPORTS = {
+    'summary': sql_summary,
+    'popular_books': sql_popular_books,
+    'transactions_by_day': sql_transactions_by_day,
+    'loan_durations': sql_loan_durations,
+}
+
+
+# =======================
+# SNAPSHOT REPORTS
+# =======================
+# Same results as the SQL reports above, computed with NumPy over the
+# in-memory ledger (models/analytics.py) instead of scanning transactions.
+def snapshot_summary(q):
+    start_dt, end_dt = q.start_dt, q.end_dt
+    start, end = epoch_range(start_dt, end_dt)
+    cols = analytics.get_snapshot().columns()
+    q.progress(0.5)
+    conn = connect_db()
+    try:
+        total_books = conn.execute("SELECT COUNT(*) FROM books").fetchone()[0]
+        total_members = conn.execute("SELECT COUNT(*) FROM members").fetchone()[0]
+    finally:
+        conn.close()
+    return {
+        'range': {'start': start_dt.strftime('%Y-%m-%d'), 'end': end_dt.strftime('%Y-%m-%d')},
+        'totals': {
+            'books': total_books,
+            'members': total_members,
+            'issued': analytics.count_between(cols['issued'], start, end),
+            'returned': analytics.count_between(cols['returned'], start, end),
+            'activeLoans': int((cols['returned'] < 0).sum()),
         }
-        return jsonify(series)
+    }
+
+
+def snapshot_popular_books(q):
+    start_dt, end_dt = q.start_dt, q.end_dt
+    start, end = epoch_range(start_dt, end_dt)
+    limit = 10 if q.limit is None else q.limit
+    cols = analytics.get_snapshot().columns()
+    q.progress(0.5)
+    ranked = analytics.top_books(cols, start, end, len(cols['ids']))
+    items = []
+    conn = connect_db()
+    try:
+        # Titles for the leaders only; ids of deleted books are skipped like the JOIN does
+        for i in range(0, len(ranked), max(limit, 1)):
+            if len(items) >= limit:
+                break
+            chunk = ranked[i:i + max(limit, 1)]
+            marks = ','.join('?' * len(chunk))
+            titles = dict(conn.execute(
+                f"SELECT id, title FROM books WHERE id IN ({marks})", [b for b, _ in chunk]
+            ).fetchall())
+            for book_id, count in chunk:
+                if book_id in titles and len(items) < limit:
+                    items.append({'title': titles[book_id], 'count': count})
+    finally:
+        conn.close()
+    return {'items': items}
+
+
+def snapshot_transactions_by_day(q):
+    start_dt, end_dt = q.start_dt, q.end_dt
+    start, _ = epoch_range(start_dt, end_dt)
+    days = day_labels(start_dt, end_dt)
+    cols = analytics.get_snapshot().columns()
+    q.progress(0.5)
+    return {
+        'labels': days,
+        'issued': analytics.issued_by_day(cols, start, len(days)).tolist(),
+        'returned': analytics.returned_by_day(cols, start, len(days)).tolist(),
+    }
+
+
+def snapshot_loan_durations(q):
+    start_dt, end_dt = q.start_dt, q.end_dt
+    start, end = epoch_range(start_dt, end_dt)
+    cols = analytics.get_snapshot().columns()
+    q.progress(0.5)
+    counts = analytics.loan_duration_histogram(cols, start, end, DURATION_EDGES)
+    return {'labels': duration_labels(DURATION_EDGES), 'counts': counts}
+
+
+SNAPSHOT_REPORTS = {
+    'summary': snapshot_summary,
+    'popular_books': snapshot_popular_books,
+    'transactions_by_day': snapshot_transactions_by_day,
+    'loan_durations': snapshot_loan_durations,
+}
+
+
+# =======================
+# ROLLUP REPORTS
+# =======================
+# Each report reads one per-book/per-member rollup of the ledger (from the
+# NumPy snapshot, or one GROUP BY pass over the ledger without it) and
+# joins it in Python with a single scan of books or members.
+PERCENTILES = (50, 75, 90, 95, 99)
+
+
+def now_epoch():
+    # Stored dates are naive local times, read as UTC like strftime('%s') does
+    return calendar.timegm(datetime.now().timetuple())
+
+
+def percentile(sorted_values, q):
+    """Linear-interpolated percentile of an ascending sequence (numpy's default)."""
+    pos = (len(sorted_values) - 1) * q / 100
+    lo = int(pos)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return float(sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (pos - lo))
+
+
+def loan_seconds_by_book(start_dt, end_dt, snapshot):
+    start, end = epoch_range(start_dt, end_dt)
+    now = now_epoch()
+    if snapshot:
+        return analytics.loan_seconds_by_book(analytics.get_snapshot().columns(), start, end, now)
+    conn = connect_db()
+    try:
+        start_s = start_dt.strftime('%Y-%m-%d 00:00:00')
+        rows = conn.execute(
+            f'''
+            SELECT book_id, SUM(MAX(0,
+                MIN(COALESCE(CAST(strftime('%s', NULLIF(return_date, '')) AS INTEGER), :now), :end + 1)
+                - MAX(CAST(strftime('%s', issue_date) AS INTEGER), :start))) AS secs
+            FROM {archive.source(conn, start_s)}
+            WHERE issue_date <= :end_s
+            GROUP BY book_id
+            ''', {'now': now, 'start': start, 'end': end,
+                  'end_s': end_dt.strftime('%Y-%m-%d 23:59:59')}
+        ).fetchall()
+    finally:
+        conn.close()
+    return {r['book_id']: r['secs'] for r in rows if r['secs']}
+
+
+def issues_by(column, start_dt, end_dt, snapshot):
+    """``{book_id or member_id: issues in range}``."""
+    if snapshot:
+        start, end = epoch_range(start_dt, end_dt)
+        cols = analytics.get_snapshot().columns()
+        if column == 'book_id':
+            return analytics.issues_by_book(cols, start, end)
+        return analytics.issues_by_member(cols, start, end)
+    conn = connect_db()
+    try:
+        start_s = start_dt.strftime('%Y-%m-%d 00:00:00')
+        rows = conn.execute(
+            f'''
+            SELECT {column}, COUNT(*)
+            FROM {archive.source(conn, start_s)}
+            WHERE issue_date BETWEEN ? AND ?
+            GROUP BY {column}
+            ''', (start_s, end_dt.strftime('%Y-%m-%d 23:59:59'))
+        ).fetchall()
+    finally:
+        conn.close()
+    return dict(rows)
+
+
+def sorted_durations(start_dt, end_dt, snapshot):
+    """Ascending loan lengths (days) of loans returned in range, and their sum."""
+    if snapshot:
+        start, end = epoch_range(start_dt, end_dt)
+        durations = analytics.loan_durations(analytics.get_snapshot().columns(), start, end)
+        return durations, float(durations.sum())
+    conn = connect_db()
+    try:
+        start_s = start_dt.strftime('%Y-%m-%d 00:00:00')
+        rows = conn.execute(
+            f'''
+            SELECT (CAST(strftime('%s', return_date) AS INTEGER)
+                    - CAST(strftime('%s', issue_date) AS INTEGER)) / 86400.0 AS d
+            FROM {archive.source(conn, start_s)}
+            WHERE return_date BETWEEN ? AND ? AND d >= 0
+            ORDER BY d
+            ''', (start_s, end_dt.strftime('%Y-%m-%d 23:59:59'))
+        ).fetchall()
+    finally:
+        conn.close()
+    durations = [r[0] for r in rows]
+    return durations, sum(durations)
+
+
+def report_book_utilization(q):
+    """Share of each book's copy-days in range that were spent on loan."""
+    start_dt, end_dt = q.start_dt, q.end_dt
+    limit = 20 if q.limit is None else q.limit
+    days = len(day_labels(start_dt, end_dt))
+    secs = loan_seconds_by_book(start_dt, end_dt, q.snapshot)
+    q.progress(0.6)
+    items = []
+    for r in db.iter_rows("SELECT id, title, category, total_copies FROM books"):
+        copies = r['total_copies'] or 0
+        loan_days = secs.get(r['id'], 0) / analytics.DAY
+        items.append({
+            'id': r['id'],
+            'title': r['title'],
+            'category': r['category'],
+            'copies': copies,
+            'loanDays': round(loan_days, 2),
+            'utilization': round(loan_days / (copies * days), 4) if copies else None,
+        })
+    items.sort(key=lambda i: (-(i['utilization'] or 0), i['id']))
+    return {'days': days, 'items': items[:limit]}
+
+
+def report_duration_percentiles(q):
+    """Loan-length percentiles (days) of loans returned in range."""
+    start_dt, end_dt = q.start_dt, q.end_dt
+    durations, total = sorted_durations(start_dt, end_dt, q.snapshot)
+    q.progress(0.6)
+    count = len(durations)
+    return {
+        'count': count,
+        'meanDays': round(total / count, 2) if count else None,
+        'percentiles': {
+            f'p{q}': round(percentile(durations, q), 2) if count else None for q in PERCENTILES
+        },
+    }
+
+
+def report_category_turnover(q):
+    """Issues per copy in range, per category."""
+    start_dt, end_dt = q.start_dt, q.end_dt
+    issues = issues_by('book_id', start_dt, end_dt, q.snapshot)
+    q.progress(0.6)
+    categories = {}
+    for r in db.iter_rows("SELECT id, category, total_copies FROM books"):
+        cat = categories.setdefault(r['category'] or 'Uncategorized',
+                                    {'titles': 0, 'copies': 0, 'issues': 0})
+        cat['titles'] += 1
+        cat['copies'] += r['total_copies'] or 0
+        cat['issues'] += issues.get(r['id'], 0)
+    items = [
+        {'category': name, **c,
+         'turnover': round(c['issues'] / c['copies'], 4) if c['copies'] else None}
+        for name, c in categories.items()
+    ]
+    items.sort(key=lambda i: (-(i['turnover'] or 0), i['category']))
+    return {'items': items}
+
+
+def report_member_cohorts(q):
+    """Members grouped by membership month, with their borrowing in range."""
+    start_dt, end_dt = q.start_dt, q.end_dt
+    issues = issues_by('member_id', start_dt, end_dt, q.snapshot)
+    q.progress(0.6)
+    cohorts = {}
+    for r in db.iter_rows("SELECT id, membership_date FROM members"):
+        key = (r['membership_date'] or '')[:7] or 'Unknown'
+        cohort = cohorts.setdefault(key, {'members': 0, 'activeMembers': 0, 'loans': 0})
+        loans = issues.get(r['id'], 0)
+        cohort['members'] += 1
+        cohort['activeMembers'] += 1 if loans else 0
+        cohort['loans'] += loans
+    items = [
+        {'cohort': key, **c, 'activeRate': round(c['activeMembers'] / c['members'], 4)}
+        for key, c in sorted(cohorts.items())
+    ]
+    return {'items': items}
+
 
-    conn.close()
-    return jsonify({'error': 'unknown report type'}), 400
+ROLLUP_REPORTS = {
+    'book_utilization': report_book_utilization,
+    'loan_duration_percentiles': report_duration_percentiles,
+    'category_turnover': report_category_turnover,
+    'member_cohorts': report_member_cohorts,
+}
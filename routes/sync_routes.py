@@ -0,0 +1,25 @@
+from flask import Blueprint, jsonify, request
+from models import changes
+
+sync_bp = Blueprint('sync_bp', __name__, url_prefix='/sync')
+
+
+# =====================
+# DELTA SYNC
+# =====================
+@sync_bp.route('/changes', methods=['GET'])
+def api_changes():
+    """Books, members and transactions changed after ``since`` (0 = everything)."""
+    try:
+        since = max(0, int(request.args.get('since', 0)))
+    except ValueError:
+        return jsonify({'error': 'since must be a version number'}), 400
+    try:
+        limit = max(1, min(changes.BATCH_LIMIT, int(request.args.get('limit', changes.BATCH_LIMIT))))
+    except ValueError:
+        limit = changes.BATCH_LIMIT
+    result = changes.changes_since(since, limit)
+    result['since'] = since
+    resp = jsonify(result)
+    resp.headers['Cache-Control'] = 'no-store'
+    return resp
@@ -1,29 +1,73 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import (Blueprint, Response, current_app, jsonify, request, redirect, url_for, flash,
+                   get_flashed_messages, stream_with_context)
 from models.transaction_model import TransactionModel
 from models.book_model import BookModel
+from models.copy_model import NoCopyAvailable
+from models.hold_model import HoldModel, HoldNotReady
 from models.member_model import MemberModel
 from datetime import datetime
 
 transaction_bp = Blueprint('transaction_bp', __name__, url_prefix='/transactions')
 
+# Template items (not bytes) buffered before each streamed chunk is sent
+STREAM_BUFFER_ITEMS = 64
+
+
+def stream_page(template_name, **context):
+    """Render a template as a streamed response.
+
+    The page shell is sent as soon as the first buffer fills, while the
+    generator-backed lists in ``context`` are still being read, so time to
+    first byte no longer grows with table size and memory stays bounded.
+    """
+    app = current_app._get_current_object()
+    # Take the flashed messages out of the session now: the session cookie
+    # is saved before the body streams, so popping them from the template
+    # would leave them in place for the next page. The template's own
+    # get_flashed_messages() call then reads this request's cached copy.
+    get_flashed_messages()
+    app.update_template_context(context)
+    stream = app.jinja_env.get_template(template_name).stream(context)
+    stream.enable_buffering(STREAM_BUFFER_ITEMS)
+    return Response(stream_with_context(stream), mimetype='text/html')
+
+
+def desk_reply(message, category, status, endpoint, **payload):
+    """Answer a circulation request: JSON for scanner clients, flash + redirect for forms."""
+    if request.is_json:
+        return jsonify({'message': message, **payload}), status
+    flash(message, category)
+    return redirect(url_for(endpoint))
+
+
+def resolve_book(data):
+    """``(book, copy_id)`` named by a scanned ``barcode`` or a ``book_id``.
+
+    ``copy_id`` is set when the barcode was a copy's own label.
+    """
+    code = (data.get('barcode') or '').strip()
+    if code:
+        book = BookModel.find_by_code(code)
+        return book, (book['copy_id'] if book else None)
+    book_id = data.get('book_id')
+    return (BookModel.get_by_id(book_id) if book_id else None), None
+
 # =====================
 # VIEW ALL TRANSACTIONS
 # =====================
 @transaction_bp.route('/')
 def view_transactions():
     """Display all transactions with member and book info."""
-    transactions = TransactionModel.get_all()
-    total = len(transactions)
-    issued = sum(1 for t in transactions if not t['return_date'])
-    returned = total - issued
-    members = MemberModel.get_all()
-    books = BookModel.get_all()
-    return render_template(
+    # Stats and rows come from one snapshot of the hot partition
+    stats, transactions = TransactionModel.listing()
+    return stream_page(
         'transactions.html',
         transactions=transactions,
-        members=members,
-        books=books,
-        stats={"total": total, "issued": issued, "returned": returned}
+        members=MemberModel.iter_all(),
+        books=BookModel.iter_all(),
+        has_members=MemberModel.count() > 0,
+        has_books=BookModel.count() > 0,
+        stats=stats
     )
 
 # =====================
@@ -31,28 +75,45 @@ def view_transactions():
 # =====================
 @transaction_bp.route('/issue', methods=['GET', 'POST'])
 def issue_book():
-    members = MemberModel.get_all()
-    books = BookModel.get_all()
-
     if request.method == 'POST':
-        member_id = request.form['member_id']
-        book_id = request.form['book_id']
+        data = request.get_json(silent=True) or request.form
+        member_id = data.get('member_id')
+        book, copy_id = resolve_book(data)
+        if not member_id or book is None:
+            return desk_reply("Unknown member or book.", "danger", 404, 'transaction_bp.issue_book')
+        book_id = book['id']
         issue_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-        # Check if book is available
-        book = BookModel.get_by_id(book_id)
-        if book['available_copies'] < 1:
-            flash("Book is not available for issue.", "danger")
-            return redirect(url_for('transaction_bp.issue_book'))
+        # A copy set aside for this member's hold
+        hold = HoldModel.ready_hold(member_id, book_id)
+        if hold:
+            try:
+                transaction_id = HoldModel.issue_to_holder(hold['id'], member_id, book_id, issue_date)
+            except HoldNotReady:
+                return desk_reply("The member's hold was cancelled or already issued.", "danger", 409,
+                                  'transaction_bp.issue_book', hold_id=hold['id'])
+            return desk_reply("Book issued from the member's hold.", "success", 201,
+                              'transaction_bp.view_transactions', transaction_id=transaction_id, book_id=book_id)
 
-        # Issue book
-        TransactionModel.issue_book(member_id, book_id, issue_date)
-        BookModel.decrease_available(book_id)
-        flash("Book issued successfully.", "success")
-        return redirect(url_for('transaction_bp.view_transactions'))
+        # Take a copy off the shelf; if there is none, or others are queued, queue the member
+        try:
+            transaction_id = TransactionModel.issue_book(member_id, book_id, issue_date, copy_id)
+        except NoCopyAvailable:
+            if copy_id is not None:
+                return desk_reply("This copy is not on the shelf, or members are queued for the book.", "danger", 409,
+                                  'transaction_bp.issue_book', copy_id=copy_id)
+            hold_id = HoldModel.place_hold(member_id, book_id)
+            position = HoldModel.position(hold_id)
+            if position:
+                return desk_reply(
+                    f"Book is not available for issue. A hold was placed (position {position} in the queue).",
+                    "warning", 409, 'transaction_bp.issue_book', hold_id=hold_id, position=position)
+            return desk_reply("Book is not available for issue.", "danger", 409, 'transaction_bp.issue_book')
+        return desk_reply("Book issued successfully.", "success", 201, 'transaction_bp.view_transactions',
+                          transaction_id=transaction_id, book_id=book_id)
 
     today = datetime.today().strftime("%Y-%m-%d")
-    return render_template('issue_book.html', members=members, books=books, today=today)
+    return stream_page('issue_book.html', members=MemberModel.iter_all(), books=BookModel.iter_all(), today=today)
 
 # =====================
 # RETURN A BOOK
@@ -61,11 +122,89 @@ def issue_book():
 def return_book(transaction_id):
     transaction = TransactionModel.get_by_id(transaction_id)
     if transaction and not transaction['return_date']:
-        TransactionModel.return_book(transaction_id)
-        BookModel.increase_available(transaction['book_id'])
-        flash("Book returned successfully.", "success")
+        hold_id = TransactionModel.return_book(transaction_id)
+        if hold_id:
+            flash("Book returned and set aside for the next hold.", "success")
+        else:
+            flash("Book returned successfully.", "success")
     return redirect(url_for('transaction_bp.view_transactions'))
 
+
+@transaction_bp.route('/return', methods=['POST'])
+def return_scanned():
+    """Return the open loan of a scanned copy or book (``member_id`` picks one of several)."""
+    data = request.get_json(silent=True) or request.form
+    book, copy_id = resolve_book(data)
+    if book is None:
+        return desk_reply("No book with this barcode or ISBN.", "danger", 404, 'transaction_bp.view_transactions')
+    if copy_id is not None:
+        loan = TransactionModel.open_loan_of_copy(copy_id)
+        loans = [loan] if loan else []
+    else:
+        loans = TransactionModel.open_loans(book['id'], data.get('member_id') or None)
+    if not loans:
+        return desk_reply("This book has no open loan.", "danger", 404, 'transaction_bp.view_transactions')
+    if len(loans) > 1:
+        return desk_reply("Several members have this book out; pick the member.", "warning", 409,
+                          'transaction_bp.view_transactions', member_ids=[t['member_id'] for t in loans])
+    hold_id = TransactionModel.return_book(loans[0]['id'])
+    message = "Book returned and set aside for the next hold." if hold_id else "Book returned successfully."
+    return desk_reply(message, "success", 200, 'transaction_bp.view_transactions',
+                      transaction_id=loans[0]['id'], hold_id=hold_id)
+
+# =====================
+# HOLDS
+# =====================
+def hold_json(hold):
+    return {
+        'id': hold['id'],
+        'book_id': hold['book_id'],
+        'member_id': hold['member_id'],
+        'status': hold['status'],
+        'placed_at': hold['placed_at'],
+        'ready_at': hold['ready_at'],
+        'position': HoldModel.position(hold['id']),
+    }
+
+
+@transaction_bp.route('/holds', methods=['POST'])
+def place_hold():
+    data = request.get_json(silent=True) or request.form
+    try:
+        member_id = int(data['member_id'])
+        book_id = int(data['book_id'])
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'member_id and book_id are required'}), 400
+    if not BookModel.get_by_id(book_id) or not MemberModel.get_by_id(member_id):
+        return jsonify({'error': 'unknown member or book'}), 404
+    hold_id = HoldModel.place_hold(member_id, book_id)
+    return jsonify(hold_json(HoldModel.get_by_id(hold_id))), 201
+
+
+@transaction_bp.route('/holds/<int:hold_id>')
+def get_hold(hold_id):
+    hold = HoldModel.get_by_id(hold_id)
+    if hold is None:
+        return jsonify({'error': 'not found'}), 404
+    return jsonify(hold_json(hold))
+
+
+@transaction_bp.route('/holds/<int:hold_id>/cancel', methods=['POST'])
+def cancel_hold(hold_id):
+    if not HoldModel.cancel(hold_id):
+        return jsonify({'error': 'no open hold'}), 404
+    return jsonify(hold_json(HoldModel.get_by_id(hold_id)))
+
+
+@transaction_bp.route('/api/books/<int:book_id>/holds')
+def book_holds(book_id):
+    items = [
+        {'id': h['id'], 'member_id': h['member_id'], 'member_name': h['member_name'],
+         'member_type': h['member_type'], 'placed_at': h['placed_at'], 'position': i}
+        for i, h in enumerate(HoldModel.queue(book_id), start=1)
+    ]
+    return jsonify({'book_id': book_id, 'items': items})
+
 # =====================
 # DELETE A TRANSACTION
 # =====================
@@ -0,0 +1,14 @@
+// Pick the smallest variant from an avatar srcset that covers the element
+// at the current pixel density, preferring WebP.
+function pickAvatar(user, cssSize){
+  const sets = user?.avatarSrcset;
+  if (!sets) return user?.avatarUrl;
+  const wanted = cssSize * (window.devicePixelRatio || 1);
+  const srcset = sets['image/webp'] || sets['image/jpeg'];
+  const entries = srcset.split(',').map(part => {
+    const [url, w] = part.trim().split(/\s+/);
+    return { url, width: parseInt(w, 10) };
+  });
+  const fit = entries.find(e => e.width >= wanted) || entries[entries.length - 1];
+  return fit.url;
+}
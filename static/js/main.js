@@ -118,9 +118,9 @@ document.addEventListener('DOMContentLoaded', () => {
     });
   }
 
-  // Initialize dashboard stats if on homepage
+  // Initialize dashboard stats if on homepage, then follow live updates
   if (document.getElementById('dashboard-stats')) {
-    updateDashboardStats();
+    updateDashboardStats().then(subscribeDashboardEvents);
   }
 
   initCountupObserver();
@@ -222,6 +222,34 @@ async function updateDashboardStats() {
   }
 }
 
+// Apply issue/return events pushed by /api/dashboard/events
+function subscribeDashboardEvents() {
+  if (!window.EventSource) return;
+  const source = new EventSource('/api/dashboard/events');
+  const onLoan = (e) => {
+    const msg = JSON.parse(e.data);
+    const elIssued = document.getElementById('books-issued');
+    if (elIssued) {
+      elIssued.textContent = msg.totals.booksIssued.toLocaleString();
+    }
+    const txBody = document.getElementById('recent-transactions');
+    if (txBody && e.type === 'issued') {
+      const tx = msg.transaction;
+      const tr = document.createElement('tr');
+      [tx.member, tx.book, tx.issue_date].forEach(v => {
+        const td = document.createElement('td');
+        td.textContent = v ?? '';
+        tr.appendChild(td);
+      });
+      txBody.querySelector('td[colspan]')?.parentElement.remove();
+      txBody.prepend(tr);
+      while (txBody.children.length > 5) txBody.lastElementChild.remove();
+    }
+  };
+  source.addEventListener('issued', onLoan);
+  source.addEventListener('returned', onLoan);
+}
+
 function animateCount(el, to, duration = 1000) {
   const start = 0;
   const diff = (to || 0) - start;
@@ -0,0 +1,293 @@
+(function(){
+  const urls = window.MEMBER_URLS;
+  const tableBody = document.getElementById('memberTableBody');
+  const searchInput = document.getElementById('searchInput');
+  const memberTypeFilter = document.getElementById('memberTypeFilter');
+  const cityFilter = document.getElementById('cityFilter');
+  const membershipFrom = document.getElementById('membershipFrom');
+  const membershipTo = document.getElementById('membershipTo');
+  const resetFiltersBtn = document.getElementById('resetFilters');
+  const loadMoreBtn = document.getElementById('loadMoreMembers');
+  const showingTo = document.getElementById('showingTo');
+  const totalMembers = document.getElementById('totalMembers');
+  const statTotal = document.getElementById('statTotalMembers');
+  const selectAllCheckbox = document.getElementById('selectAll');
+  const bulkActionsToast = new bootstrap.Toast(document.getElementById('bulkActions'));
+  const deleteConfirmModal = new bootstrap.Modal(document.getElementById('deleteConfirmModal'));
+
+  const FIELDS = 'id,full_name,first_name,last_name,email,phone,city,member_type,membership_date,fine_balance';
+  const PAGE_SIZE = 25;
+
+  let state = { cursor: null, loaded: 0, total: 0, loading: false, requestId: 0 };
+  let memberToDelete = null;
+
+  function escapeHtml(s){
+    return String(s ?? '').replace(/[&<>"']/g, c => ({'&':'&amp;','<':'&lt;','>':'&gt;','"':'&quot;',"'":'&#39;'}[c]));
+  }
+
+  function buildQuery(){
+    const p = new URLSearchParams();
+    p.set('fields', FIELDS);
+    p.set('limit', PAGE_SIZE);
+    if (searchInput.value.trim()) p.set('q', searchInput.value.trim());
+    if (memberTypeFilter.value) p.set('member_type', memberTypeFilter.value);
+    if (cityFilter.value.trim()) p.set('city', cityFilter.value.trim());
+    if (membershipFrom.value) p.set('membership_from', membershipFrom.value);
+    if (membershipTo.value) p.set('membership_to', membershipTo.value);
+    if (state.cursor) p.set('cursor', state.cursor);
+    return p.toString();
+  }
+
+  function memberIcon(type){
+    if (type === 'student') return 'user-graduate';
+    if (type === 'faculty') return 'chalkboard-teacher';
+    if (type === 'staff') return 'user-tie';
+    return 'user';
+  }
+
+  function initials(m){
+    const first = (m.first_name || m.full_name || '?').charAt(0);
+    const last = (m.last_name || '').charAt(0);
+    return (first + last).toUpperCase();
+  }
+
+  function rowHtml(m){
+    const name = m.full_name || `${m.first_name || ''} ${m.last_name || ''}`.trim();
+    const type = m.member_type || 'community';
+    return `
+      <td>
+        <div class="form-check">
+          <input class="form-check-input member-checkbox" type="checkbox" value="${m.id}">
+        </div>
+      </td>
+      <td>
+        <div class="d-flex align-items-center">
+          <div class="avatar avatar-md me-3">
+            <span class="avatar-text rounded-circle bg-soft-primary text-primary">${escapeHtml(initials(m))}</span>
+          </div>
+          <div>
+            <h6 class="mb-0">${escapeHtml(name)}</h6>
+            <small class="text-muted">ID: ${m.id}${m.city ? ' · ' + escapeHtml(m.city) : ''}</small>
+          </div>
+        </div>
+      </td>
+      <td>
+        <div class="text-muted">
+          <div><i class="fas fa-envelope me-2"></i> ${escapeHtml(m.email || 'N/A')}</div>
+          <div><i class="fas fa-phone me-2"></i> ${escapeHtml(m.phone || 'N/A')}</div>
+        </div>
+      </td>
+      <td>
+        <span class="badge bg-light text-dark">
+          <i class="fas fa-${memberIcon(type)} me-1"></i>
+          ${escapeHtml(type.charAt(0).toUpperCase() + type.slice(1))}
+        </span>
+        <div class="small text-muted mt-1">Since ${escapeHtml(m.membership_date || 'N/A')}</div>
+      </td>
+      <td><span class="small text-muted">—</span></td>
+      <td>
+        <span class="badge bg-success-light">Active</span>
+        ${m.fine_balance ? `<div class="small text-danger mt-1">Owes ${m.fine_balance.toFixed(2)}</div>` : ''}
+      </td>
+      <td class="text-end">
+        <div class="dropdown">
+          <button class="btn btn-sm btn-outline-secondary dropdown-toggle" type="button" data-bs-toggle="dropdown" aria-expanded="false">
+            <i class="fas fa-ellipsis-v"></i>
+          </button>
+          <ul class="dropdown-menu dropdown-menu-end">
+            <li><a class="dropdown-item" href="${urls.edit.replace(/0$/, m.id)}"><i class="far fa-eye me-2"></i>View Profile</a></li>
+            <li><a class="dropdown-item" href="${urls.edit.replace(/0$/, m.id)}"><i class="far fa-edit me-2"></i>Edit</a></li>
+            <li><a class="dropdown-item" href="${urls.issue}"><i class="fas fa-book-reader me-2"></i>Issue Book</a></li>
+            <li><hr class="dropdown-divider"></li>
+            <li><a class="dropdown-item text-danger delete-member" href="#" data-id="${m.id}"><i class="far fa-trash-alt me-2"></i>Delete</a></li>
+          </ul>
+        </div>
+      </td>`;
+  }
+
+  function renderEmpty(){
+    tableBody.innerHTML = `
+      <tr>
+        <td colspan="7" class="text-center py-5">
+          <div class="py-5">
+            <i class="fas fa-users fa-3x text-muted mb-3"></i>
+            <h5>No members found</h5>
+            <p class="text-muted">Add your first member to get started</p>
+            <a href="${urls.add}" class="btn btn-primary mt-2"><i class="fas fa-user-plus me-1"></i> Add Member</a>
+          </div>
+        </td>
+      </tr>`;
+  }
+
+  // Fetch the next page and append it; a new filter resets the cursor.
+  async function load(reset){
+    if (reset) {
+      state = { cursor: null, loaded: 0, total: 0, loading: false, requestId: state.requestId + 1 };
+    } else if (state.loading || !state.cursor) {
+      return;
+    }
+    const requestId = state.requestId;
+    state.loading = true;
+    loadMoreBtn.disabled = true;
+    try {
+      const res = await fetch(`${urls.api}?${buildQuery()}`);
+      const data = await res.json();
+      if (requestId !== state.requestId) return; // filters changed meanwhile
+      if (reset) {
+        tableBody.innerHTML = '';
+        state.total = data.total || 0;
+        totalMembers.textContent = state.total;
+        if (statTotal && !hasFilters()) statTotal.textContent = state.total;
+      }
+      const frag = document.createDocumentFragment();
+      (data.items || []).forEach(m => {
+        const tr = document.createElement('tr');
+        tr.dataset.memberId = m.id;
+        tr.dataset.type = m.member_type || 'community';
+        tr.innerHTML = rowHtml(m);
+        frag.appendChild(tr);
+      });
+      tableBody.appendChild(frag);
+      state.loaded += (data.items || []).length;
+      state.cursor = data.next_cursor;
+      if (state.loaded === 0) renderEmpty();
+      showingTo.textContent = state.loaded;
+      loadMoreBtn.classList.toggle('d-none', !state.cursor);
+    } catch (e) {
+      showToast('Failed to load members', 'danger');
+    } finally {
+      if (requestId === state.requestId) state.loading = false;
+      loadMoreBtn.disabled = false;
+    }
+  }
+
+  function hasFilters(){
+    return !!(searchInput.value.trim() || memberTypeFilter.value || cityFilter.value.trim() ||
+      membershipFrom.value || membershipTo.value);
+  }
+
+  function debounce(fn, ms){
+    let t;
+    return (...args) => { clearTimeout(t); t = setTimeout(() => fn(...args), ms); };
+  }
+
+  // Selection and bulk actions
+  function selectedIds(){
+    return Array.from(tableBody.querySelectorAll('.member-checkbox:checked')).map(cb => cb.value);
+  }
+
+  function updateSelectedCount(){
+    const all = tableBody.querySelectorAll('.member-checkbox');
+    const count = selectedIds().length;
+    document.getElementById('selectedCount').textContent = count;
+    if (count > 0) bulkActionsToast.show(); else bulkActionsToast.hide();
+    selectAllCheckbox.checked = all.length > 0 && count === all.length;
+    selectAllCheckbox.indeterminate = count > 0 && count < all.length;
+  }
+
+  function showToast(message, type = 'info'){
+    const container = document.createElement('div');
+    container.className = 'position-fixed bottom-0 end-0 p-3';
+    container.style.zIndex = '11';
+    container.innerHTML = `
+      <div class="toast show ${type}" role="alert" aria-live="assertive" aria-atomic="true">
+        <div class="toast-header bg-${type} text-white">
+          <strong class="me-auto">${type.charAt(0).toUpperCase() + type.slice(1)}</strong>
+          <button type="button" class="btn-close btn-close-white" aria-label="Close"></button>
+        </div>
+        <div class="toast-body">${escapeHtml(message)}</div>
+      </div>`;
+    document.body.appendChild(container);
+    const remove = () => container.parentNode && document.body.removeChild(container);
+    container.querySelector('.btn-close').addEventListener('click', remove);
+    setTimeout(remove, 5000);
+  }
+
+  document.addEventListener('DOMContentLoaded', () => {
+    const reload = debounce(() => load(true), 250);
+    searchInput.addEventListener('input', reload);
+    cityFilter.addEventListener('input', reload);
+    memberTypeFilter.addEventListener('change', () => load(true));
+    membershipFrom.addEventListener('change', () => load(true));
+    membershipTo.addEventListener('change', () => load(true));
+    resetFiltersBtn.addEventListener('click', () => {
+      searchInput.value = '';
+      memberTypeFilter.value = '';
+      cityFilter.value = '';
+      membershipFrom.value = '';
+      membershipTo.value = '';
+      load(true);
+    });
+    loadMoreBtn.addEventListener('click', () => load(false));
+
+    // Pull the next page automatically when the button scrolls into view
+    if ('IntersectionObserver' in window) {
+      new IntersectionObserver(entries => {
+        if (entries.some(e => e.isIntersecting)) load(false);
+      }).observe(loadMoreBtn);
+    }
+
+    selectAllCheckbox.addEventListener('change', () => {
+      tableBody.querySelectorAll('.member-checkbox').forEach(cb => { cb.checked = selectAllCheckbox.checked; });
+      updateSelectedCount();
+    });
+    tableBody.addEventListener('change', e => {
+      if (e.target.classList.contains('member-checkbox')) updateSelectedCount();
+    });
+    tableBody.addEventListener('click', e => {
+      const btn = e.target.closest('.delete-member');
+      if (!btn) return;
+      e.preventDefault();
+      memberToDelete = [btn.dataset.id];
+      deleteConfirmModal.show();
+    });
+
+    document.getElementById('confirmDelete').addEventListener('click', () => {
+      if (!memberToDelete || !memberToDelete.length) return;
+      const ids = memberToDelete;
+      memberToDelete = null;
+      deleteConfirmModal.hide();
+      Promise.all(ids.map(id => fetch(urls.remove.replace(/0$/, id), { credentials: 'same-origin' })))
+        .then(() => {
+          showToast(`Deleted ${ids.length} member(s)`, 'success');
+          bulkActionsToast.hide();
+          selectAllCheckbox.checked = false;
+          load(true);
+        })
+        .catch(() => showToast('Failed to delete member(s)', 'danger'));
+    });
+
+    document.getElementById('importMembers').addEventListener('click', () => {
+      showToast('Importing members is not supported yet', 'info');
+    });
+
+    document.getElementById('applyBulkAction').addEventListener('click', () => {
+      const action = document.getElementById('bulkActionSelect').value;
+      const ids = selectedIds();
+      if (ids.length === 0) {
+        showToast('Please select at least one member', 'danger');
+        return;
+      }
+      if (action === 'delete') {
+        memberToDelete = ids;
+        document.querySelector('#deleteConfirmModal .modal-body p')
+          .textContent = `Are you sure you want to delete ${ids.length} selected member(s)? This action cannot be undone.`;
+        deleteConfirmModal.show();
+      } else if (action) {
+        showToast(`${action.charAt(0).toUpperCase() + action.slice(1)}: ${ids.length} member(s)`, 'info');
+      }
+    });
+
+    document.getElementById('downloadTemplate').addEventListener('click', () => {
+      const headers = ['First Name', 'Last Name', 'Email', 'Phone', 'Date of Birth', 'Gender', 'Address', 'City', 'State', 'Postal Code', 'Member Type', 'Institution'];
+      const link = document.createElement('a');
+      link.setAttribute('href', encodeURI('data:text/csv;charset=utf-8,' + headers.join(',')));
+      link.setAttribute('download', 'member_import_template.csv');
+      document.body.appendChild(link);
+      link.click();
+      document.body.removeChild(link);
+    });
+
+    load(true);
+  });
+})();
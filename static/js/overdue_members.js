@@ -44,6 +44,7 @@
         <td><a href="/books?q=${encodeURIComponent(it.book_title||'')}" class="text-decoration-none">${escapeHtml(it.book_title || '')}</a></td>
         <td>${escapeHtml(it.issue_date || '')}</td>
         <td class="text-center">${daysBadge(it.days_overdue || 0)}</td>
+        <td class="text-end">${it.fine ? it.fine.toFixed(2) : '—'}</td>
         <td>
           <div class="btn-group btn-group-sm" role="group">
             <a class="btn btn-outline-success" href="/transactions/return/${it.transaction_id}"><i class="fas fa-undo"></i> Return</a>
@@ -19,7 +19,7 @@
     const data = await res.json();
     nameEl.textContent = data.user?.name || 'Guest';
     if (data.user?.avatarUrl) {
-      avatarEl.style.backgroundImage = `url('${data.user.avatarUrl}')`;
+      avatarEl.style.backgroundImage = `url('${pickAvatar(data.user, 56)}')`;
       avatarEl.style.backgroundSize = 'cover';
       avatarEl.style.backgroundPosition = 'center';
     } else {
@@ -40,13 +40,24 @@
     return '/api/reports?' + params.toString();
   }
 
+  // Reports run as background jobs: submit, then long-poll until done
   async function fetchData() {
-    const url = buildQuery();
-    const res = await fetch(url);
+    const params = new URLSearchParams(buildQuery().split('?')[1]);
+    let res = await fetch('/api/reports/jobs', { method: 'POST', body: params });
     if (!res.ok) {
-      throw new Error('Failed to fetch report');
+      throw new Error(res.status === 503 ? 'The server is busy, please retry shortly' : 'Failed to fetch report');
     }
-    return await res.json();
+    let job = await res.json();
+    while (job.status !== 'done') {
+      if (job.status === 'failed') throw new Error(job.error || 'Report failed');
+      const version = job.version;
+      res = await fetch(`/api/reports/jobs/${job.id}?wait=5&version=${version}`);
+      if (!res.ok) throw new Error('Failed to fetch report');
+      job = await res.json();
+      // Unchanged: the server had no thread to park the poll on, back off
+      if (job.version === version) await new Promise(r => setTimeout(r, 1000));
+    }
+    return job.result;
   }
 
   function renderSummary(data) {
@@ -67,6 +78,33 @@
     });
   }
 
+  // Generic table for the rollup reports: columns is [[header, key], ...]
+  function renderTable(columns, rows) {
+    thead.innerHTML = '<tr>' + columns.map(c => `<th>${escapeHtml(c[0])}</th>`).join('') + '</tr>';
+    tbody.innerHTML = '';
+    rows.forEach(row => {
+      const tr = document.createElement('tr');
+      tr.innerHTML = columns.map(c => `<td>${escapeHtml(row[c[1]] ?? '—')}</td>`).join('');
+      tbody.appendChild(tr);
+    });
+  }
+
+  const TABLE_REPORTS = {
+    book_utilization: data => renderTable(
+      [['Title', 'title'], ['Category', 'category'], ['Copies', 'copies'], ['Loan days', 'loanDays'], ['Utilization', 'utilization']],
+      data.items || []),
+    category_turnover: data => renderTable(
+      [['Category', 'category'], ['Titles', 'titles'], ['Copies', 'copies'], ['Issues', 'issues'], ['Turnover', 'turnover']],
+      data.items || []),
+    member_cohorts: data => renderTable(
+      [['Cohort', 'cohort'], ['Members', 'members'], ['Active', 'activeMembers'], ['Loans', 'loans'], ['Active rate', 'activeRate']],
+      data.items || []),
+    loan_duration_percentiles: data => renderTable(
+      [['Statistic', 'name'], ['Days', 'value']],
+      [{ name: 'Loans', value: data.count }, { name: 'Mean', value: data.meanDays }]
+        .concat(Object.entries(data.percentiles || {}).map(([name, value]) => ({ name, value })))),
+  };
+
   function renderTransactionsChart(series) {
     if (chart) { chart.destroy(); }
     thead.innerHTML = '';
@@ -88,6 +126,24 @@
     });
   }
 
+  function renderDurationChart(hist) {
+    if (chart) { chart.destroy(); }
+    thead.innerHTML = '';
+    tbody.innerHTML = '';
+    chart = new Chart(ctx, {
+      type: 'bar',
+      data: {
+        labels: hist.labels,
+        datasets: [{ label: 'Returned loans', data: hist.counts, backgroundColor: 'rgba(74,111,165,.6)' }]
+      },
+      options: {
+        responsive: true,
+        maintainAspectRatio: false,
+        scales: { y: { beginAtZero: true } }
+      }
+    });
+  }
+
   function toggleSections({ showSummary = false, showTable = false, showChart = false }) {
     summaryCards.style.display = showSummary ? '' : 'none';
     tableSection.style.display = showTable ? '' : 'none';
@@ -148,6 +204,12 @@
       } else if (type === 'transactions_by_day') {
         toggleSections({ showSummary: false, showTable: false, showChart: true });
         renderTransactionsChart(data);
+      } else if (type === 'loan_durations') {
+        toggleSections({ showSummary: false, showTable: false, showChart: true });
+        renderDurationChart(data);
+      } else if (TABLE_REPORTS[type]) {
+        toggleSections({ showSummary: false, showTable: true, showChart: false });
+        TABLE_REPORTS[type](data);
       }
     } catch (err) {
       console.error(err);
@@ -252,6 +314,10 @@
       ];
       const csv = toCSV(['Metric', 'Value'], rows);
       download('summary.csv', csv);
+    } else if (TABLE_REPORTS[type]) {
+      const headers = Array.from(thead.querySelectorAll('th')).map(th => th.textContent.trim());
+      const rows = Array.from(tbody.querySelectorAll('tr')).map(tr => Array.from(tr.children).map(td => td.textContent.trim()));
+      download(`${type}.csv`, toCSV(headers, rows));
     } else {
       alert('Export is available for Summary and Popular Books');
     }
@@ -34,7 +34,7 @@
       if (!res.ok) return;
       const data = await res.json();
       if (data.user?.avatarUrl) {
-        avatarEl.style.backgroundImage = `url('${data.user.avatarUrl}')`;
+        avatarEl.style.backgroundImage = `url('${pickAvatar(data.user, 64)}')`;
         avatarEl.style.backgroundSize = 'cover';
         avatarEl.style.backgroundPosition = 'center';
       } else {
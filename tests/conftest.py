@@ -1,42 +1,37 @@
 import pytest
-import sqlite3
-from app import app as flask_app
-from models.book_model import BookModel
-from models.member_model import MemberModel
-from models.transaction_model import TransactionModel
+from app import create_app
+from models import db
 from models.user_model import UserModel
 
-@pytest.fixture(scope='session')
+@pytest.fixture
 def test_app(tmp_path, monkeypatch):
     """Create a Flask app with a temporary SQLite DB for model operations.
 
-    This fixture monkeypatches the `connect` methods for the sqlite-backed models
-    to use a temporary file-based SQLite DB under pytest's tmp_path. It also stubs
-    a few UserModel methods to avoid MySQL calls during tests.
+    The app factory points every sqlite-backed model at a temporary file under
+    pytest's tmp_path and the schema is created with the explicit migration.
+    A few UserModel methods are stubbed to avoid MySQL calls during tests.
     """
     db_path = tmp_path / "test_library.db"
-    db_path_str = str(db_path)
-
-    def connect_factory():
-        conn = sqlite3.connect(db_path_str)
-        conn.row_factory = sqlite3.Row
-        return conn
-
-    # Monkeypatch the models to use the temporary DB
-    monkeypatch.setattr(BookModel, 'connect', staticmethod(connect_factory))
-    monkeypatch.setattr(MemberModel, 'connect', staticmethod(connect_factory))
-    monkeypatch.setattr(TransactionModel, 'connect', staticmethod(connect_factory))
 
     # Stub UserModel DB interactions so tests don't require MySQL
     monkeypatch.setattr(UserModel, 'get_profile_image', staticmethod(lambda uid: None))
     monkeypatch.setattr(UserModel, 'ensure_profile_image_column', staticmethod(lambda: None))
 
+    flask_app = create_app({
+        'TESTING': True,
+        'DATABASE': str(db_path),
+        'UPLOAD_FOLDER': str(tmp_path / 'avatars'),
+        'ASSETS_DIR': str(tmp_path / 'dist'),
+        # Hash inline with a cheap cost factor to keep tests fast
+        'PASSWORD_ROUNDS': 4,
+        'PASSWORD_WORKERS': 0,
+        # Reports see every write immediately
+        'ANALYTICS_REFRESH_SECONDS': 0,
+    })
+
     # Create tables in the temporary DB
-    BookModel.create_table()
-    MemberModel.create_table()
-    TransactionModel.create_table()
+    db.migrate()
 
-    flask_app.config['TESTING'] = True
     yield flask_app
 
 @pytest.fixture
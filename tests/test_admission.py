@@ -0,0 +1,75 @@
+import threading
+
+import pytest
+
+from admission import Admission, TokenBucket
+from app import create_app
+from models import db
+
+
+@pytest.fixture
+def limited_app(tmp_path):
+    app = create_app({
+        'TESTING': True,
+        'DATABASE': str(tmp_path / 'admission.db'),
+        'UPLOAD_FOLDER': str(tmp_path / 'avatars'),
+        'ASSETS_DIR': str(tmp_path / 'dist'),
+        'ANALYTICS_REFRESH_SECONDS': 0,
+        'ADMISSION_QUEUE_TIMEOUT': 0.05,
+        'ADMISSION_LIMITS': {'book_bp.api_popular_books': {'concurrency': 1, 'rate': 1, 'burst': 2}},
+    })
+    db.migrate()
+    return app
+
+
+def test_rate_limit_returns_429_with_retry_after(limited_app):
+    client = limited_app.test_client()
+    assert client.get('/books/api/popular').status_code == 200
+    assert client.get('/books/api/popular').status_code == 200
+    resp = client.get('/books/api/popular')
+    assert resp.status_code == 429
+    assert int(resp.headers['Retry-After']) >= 1
+
+    stats = client.get('/api/metrics/admission').get_json()['routes']['book_bp.api_popular_books']
+    assert stats['admitted'] == 2 and stats['rejected_rate'] == 1 and stats['active'] == 0
+
+
+def test_saturated_route_sheds_but_circulation_stays_open(limited_app):
+    admission = limited_app.extensions['admission']
+    client = limited_app.test_client()
+    # Occupy the route's only slot as a running request would
+    admission.limits['book_bp.api_popular_books'].slots.acquire()
+    try:
+        resp = client.get('/books/api/popular')
+        assert resp.status_code == 503
+        assert resp.headers['Retry-After'] == '1'
+        assert client.get('/transactions/').status_code == 200
+    finally:
+        admission.limits['book_bp.api_popular_books'].slots.release()
+    assert client.get('/books/api/popular').status_code == 200
+
+    stats = admission.snapshot()['routes']['book_bp.api_popular_books']
+    assert stats['queued'] == 1 and stats['rejected_busy'] == 1
+
+
+def test_heavy_routes_share_a_bounded_pool(test_app):
+    admission = Admission({'a': {'concurrency': 5}, 'b': {'concurrency': 5}},
+                          heavy_concurrency=1, queue_timeout=0.01)
+    with test_app.test_request_context():
+        assert admission.admit('a') is None
+        # A second heavy request, even on another route, finds no free thread
+        holder = threading.Thread(target=lambda: results.append(admission.admit('b')))
+        results = []
+        holder.start()
+        holder.join()
+        assert results == [(503, 1)]
+        assert admission.admit('circulation') is None
+        admission.release()
+    assert admission.heavy.acquire(blocking=False)
+
+
+def test_token_bucket_refills():
+    bucket = TokenBucket(rate=1000, burst=1)
+    assert bucket.take() == 0
+    wait = bucket.take()
+    assert 0 < wait <= 0.001 + 1e-9
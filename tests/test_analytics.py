@@ -0,0 +1,118 @@
+import pytest
+
+from models import analytics, archive
+from models.book_model import BookModel
+from models.member_model import MemberModel
+from models.transaction_model import TransactionModel
+
+pytestmark = pytest.mark.skipif(not analytics.is_available(), reason='NumPy not installed')
+
+RANGE = 'start=2024-03-01&end=2024-03-10'
+
+
+def seed():
+    books = [BookModel.add_book(f'Book {i}', 'Author', None, None, None, 5, 5) for i in range(3)]
+    member = MemberModel.add_member('Reader', None, None, None)
+    loans = [
+        (books[0], '2024-03-01 09:00:00', '2024-03-01 18:00:00'),
+        (books[0], '2024-03-02 10:00:00', '2024-03-09 10:00:00'),
+        (books[1], '2024-03-02 11:00:00', None),
+        (books[2], '2024-03-10 23:30:00', None),
+        (books[1], '2024-02-20 12:00:00', '2024-03-05 12:00:00'),
+    ]
+    ids = []
+    for book_id, issued, returned in loans:
+        tid = TransactionModel.issue_book(member, book_id, issued)
+        if returned:
+            conn = TransactionModel.connect()
+            conn.execute('UPDATE transactions SET return_date = ? WHERE id = ?', (returned, tid))
+            conn.commit()
+            conn.close()
+        ids.append(tid)
+    return books, member, ids
+
+
+def both(client, query):
+    client.application.config['ANALYTICS_SNAPSHOT'] = True
+    fast = client.get(f'/api/reports?{query}').get_json()
+    client.application.config['ANALYTICS_SNAPSHOT'] = False
+    slow = client.get(f'/api/reports?{query}').get_json()
+    client.application.config['ANALYTICS_SNAPSHOT'] = True
+    return fast, slow
+
+
+@pytest.mark.parametrize('rtype', ['summary', 'popular_books', 'transactions_by_day', 'loan_durations'])
+def test_snapshot_reports_match_sql(client, rtype):
+    seed()
+    fast, slow = both(client, f'type={rtype}&{RANGE}')
+    assert fast == slow
+
+
+def test_snapshot_report_values(client):
+    seed()
+    data = client.get(f'/api/reports?type=transactions_by_day&{RANGE}').get_json()
+    assert data['issued'][:2] == [1, 2] and data['issued'][-1] == 1
+    assert sum(data['returned']) == 3
+    books = client.get(f'/api/reports?type=popular_books&limit=1&{RANGE}').get_json()
+    assert books['items'] == [{'title': 'Book 0', 'count': 2}]
+    durations = client.get(f'/api/reports?type=loan_durations&{RANGE}').get_json()
+    assert durations['counts'][0] == 1 and sum(durations['counts']) == 3
+
+
+def test_snapshot_refreshes_incrementally(client):
+    books, member, ids = seed()
+    snap = analytics.get_snapshot()
+    assert len(snap) == 5 and snap.last_id == ids[-1]
+
+    TransactionModel.return_book(ids[2])
+    new_id = TransactionModel.issue_book(member, books[2], '2024-03-03 08:00:00')
+    snap.refresh(force=True)
+    cols = snap.columns()
+    assert len(snap) == 6 and snap.last_id == new_id
+    assert cols['returned'][2] > 0
+    assert cols['book_ids'].dtype.name == 'int32' and cols['issued'].dtype.name == 'int64'
+
+    # Archiving moves rows without counting as deletes
+    deletes = snap.deletes
+    assert archive.archive_older_than(30) > 0
+    snap.refresh(force=True)
+    assert len(snap) == 6 and snap.deletes == deletes
+
+    # A deleted row forces a full reload
+    TransactionModel.delete_transaction(ids[3])
+    snap.refresh(force=True)
+    assert len(snap) == 5 and ids[3] not in snap.columns()['ids']
+    assert snap.deletes == deletes + 1
+
+
+@pytest.mark.parametrize('rtype', [
+    'book_utilization', 'loan_duration_percentiles', 'category_turnover', 'member_cohorts',
+])
+def test_rollup_reports_match_sql(client, rtype):
+    seed()
+    fast, slow = both(client, f'type={rtype}&{RANGE}')
+    assert fast == slow
+
+
+def test_rollup_report_values(client):
+    books, member, _ = seed()
+    util = client.get(f'/api/reports?type=book_utilization&{RANGE}').get_json()
+    assert util['days'] == 10
+    by_id = {i['id']: i for i in util['items']}
+    # Book 1: loan from 03-02 11:00 still open at the end of the range, plus 03-01..03-05 12:00
+    assert by_id[books[1]]['loanDays'] == pytest.approx(8.54 + 4.5, abs=0.01)
+    assert by_id[books[1]]['utilization'] == pytest.approx((8.54 + 4.5) / 50, abs=1e-3)
+
+    pct = client.get(f'/api/reports?type=loan_duration_percentiles&{RANGE}').get_json()
+    assert pct['count'] == 3
+    assert pct['percentiles']['p50'] == 7.0
+
+    turnover = client.get(f'/api/reports?type=category_turnover&{RANGE}').get_json()
+    assert turnover['items'] == [
+        {'category': 'Uncategorized', 'titles': 3, 'copies': 15, 'issues': 4, 'turnover': 0.2667},
+    ]
+
+    cohorts = client.get(f'/api/reports?type=member_cohorts&{RANGE}').get_json()
+    assert cohorts['items'] == [
+        {'cohort': 'Unknown', 'members': 1, 'activeMembers': 1, 'loans': 4, 'activeRate': 1.0},
+    ]
@@ -0,0 +1,107 @@
+from models import archive, db
+from models.book_model import BookModel
+from models.member_model import MemberModel
+from models.transaction_model import TransactionModel
+
+
+def seed():
+    book_id = BookModel.add_book('Old Favourite', 'Author', None, None, None, 5, 5)
+    member_id = MemberModel.add_member('Reader', None, None, None)
+    loans = [
+        ('2020-01-05 10:00:00', '2020-01-20 10:00:00'),
+        ('2020-02-01 10:00:00', '2020-02-03 10:00:00'),
+        ('2020-03-01 10:00:00', None),  # still open: never archived
+        ('2099-01-01 10:00:00', '2099-01-02 10:00:00'),  # returned recently
+    ]
+    conn = db.connect()
+    for issued, returned in loans:
+        conn.execute(
+            'INSERT INTO transactions (member_id, book_id, issue_date, return_date) VALUES (?, ?, ?, ?)',
+            (member_id, book_id, issued, returned))
+    conn.commit()
+    conn.close()
+
+
+def counts():
+    conn = db.connect()
+    hot = conn.execute('SELECT COUNT(*) FROM transactions').fetchone()[0]
+    cold = conn.execute('SELECT COUNT(*) FROM transactions_archive').fetchone()[0]
+    conn.close()
+    return hot, cold
+
+
+def test_archive_moves_old_returned_loans_in_batches(test_app):
+    seed()
+    stats = TransactionModel.get_stats()
+    assert archive.archive_older_than(30, batch_size=1, pause=0) == 2
+    assert counts() == (2, 2)
+    assert TransactionModel.get_stats() == stats
+
+    conn = db.connect()
+    assert archive.horizon(conn) == '2020-02-03 10:00:00'
+    assert archive.source(conn, '2021-01-01 00:00:00') == 'transactions'
+    assert archive.source(conn, '2020-01-01 00:00:00') == 'ledger'
+    assert archive.source(conn) == 'ledger'
+    conn.close()
+
+    # A second pass finds nothing left to move
+    assert archive.archive_older_than(30) == 0
+
+
+def test_historical_reports_span_both_partitions(client):
+    seed()
+    query = '/api/reports?type=summary&start=2020-01-01&end=2020-12-31'
+    before = {}
+    for snapshot in (True, False):
+        client.application.config['ANALYTICS_SNAPSHOT'] = snapshot
+        before[snapshot] = client.get(query).get_json()
+    archive.archive_older_than(30)
+    for snapshot in (True, False):
+        client.application.config['ANALYTICS_SNAPSHOT'] = snapshot
+        assert client.get(query).get_json() == before[snapshot]
+    assert before[False]['totals']['issued'] == 3
+    assert before[False]['totals']['activeLoans'] == 1
+
+    popular = client.get('/books/api/popular?start=2020-01-01&end=2020-12-31').get_json()
+    assert popular['items'][0]['count'] == 3
+    assert client.get('/api/dashboard_stats').get_json()['popularBooks'][0]['count'] == 4
+
+
+def test_archived_loans_keep_their_copy(test_app):
+    book_id = BookModel.add_book('Copied', 'Author', None, None, None, 1, 1)
+    member_id = MemberModel.add_member('Reader', None, None, None)
+    loan = TransactionModel.issue_book(member_id, book_id, '2020-01-05 10:00:00')
+    copy_id = TransactionModel.get_by_id(loan)['copy_id']
+    db.write(TransactionModel._return, loan, '2020-01-20 10:00:00')
+    archive.archive_older_than(30)
+
+    conn = db.connect()
+    assert conn.execute('SELECT copy_id FROM ledger WHERE id = ?', (loan,)).fetchone()[0] == copy_id
+    conn.close()
+
+
+def test_migration_adds_copy_id_to_an_existing_archive(test_app):
+    conn = db.connect()
+    conn.executescript('''
+        DROP VIEW ledger;
+        DROP TABLE transactions_archive;
+        CREATE TABLE transactions_archive (id INTEGER PRIMARY KEY, member_id INTEGER NOT NULL,
+                                           book_id INTEGER NOT NULL, issue_date TEXT, return_date TEXT);
+        CREATE VIEW ledger AS
+            SELECT id, member_id, book_id, issue_date, return_date FROM transactions
+            UNION ALL
+            SELECT id, member_id, book_id, issue_date, return_date FROM transactions_archive;
+    ''')
+    conn.close()
+    archive.create_table()
+
+    conn = db.connect()
+    assert 'copy_id' in {r[1] for r in conn.execute('PRAGMA table_info(ledger)')}
+    conn.close()
+
+
+def test_stopped_archiver_is_not_restarted_after_fork(test_app):
+    archive.start(30, interval=3600)
+    archive.stop()
+    archive._restart_after_fork()
+    assert archive._thread is None
@@ -0,0 +1,52 @@
+import assets
+
+
+def test_pages_link_source_files_without_manifest(client):
+    html = client.get('/books/').get_data(as_text=True)
+    assert '/static/css/style.css' in html
+    assert '/static/css/modern-style.css' in html
+    assert '/static/js/books.js' in html
+
+
+def test_built_bundles_are_fingerprinted_and_immutable(client, test_app):
+    manifest = assets.build(test_app.static_folder, test_app.config['ASSETS_DIR'])
+    assert manifest['base.css'].startswith('base.') and manifest['base.css'].endswith('.css')
+
+    html = client.get('/books/').get_data(as_text=True)
+    assert f"/assets/{manifest['base.css']}" in html
+    assert '/static/css/modern-style.css' not in html
+
+    resp = client.get(f"/assets/{manifest['base.css']}")
+    assert resp.status_code == 200
+    assert 'immutable' in resp.headers['Cache-Control']
+    with open(f"{test_app.static_folder}/css/modern-style.css", 'rb') as fh:
+        assert len(resp.data) < len(fh.read())
+
+
+def test_minify_css_keeps_rules():
+    css = "/* header */\n.a  {\n  color: red;\n  margin: 0 auto;\n}\n"
+    assert assets.minify_css(css) == '.a{color: red;margin: 0 auto}'
+
+
+def test_minify_js_keeps_template_literal_whitespace():
+    js = ("function row(x){\n"
+          "  // a comment\n"
+          "  const s = `<td>  \n"
+          "    ${x ? `<b>${x}</b>` : ''}\n"
+          "    // not a comment\n"
+          "  </td>`;\n"
+          "\n"
+          "  return s; // done\n"
+          "}\n")
+    assert assets.minify_js(js) == ("function row(x){\n"
+                                     "const s = `<td>  \n"
+                                     "    ${x ? `<b>${x}</b>` : ''}\n"
+                                     "    // not a comment\n"
+                                     "  </td>`;\n"
+                                     "return s; // done\n"
+                                     "}")
+
+
+def test_auth_pages_use_asset_tags(client):
+    html = client.get('/auth/login').get_data(as_text=True)
+    assert '/static/css/style.css' in html and '/static/css/authentication.css' in html
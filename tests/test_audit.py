@@ -0,0 +1,85 @@
+import time
+
+import pytest
+
+from models import audit, db
+from models.book_model import BookModel
+from models.member_model import MemberModel
+from models.transaction_model import TransactionModel
+
+
+@pytest.fixture
+def audit_log(test_app):
+    yield audit
+    audit.stop()
+    audit.configure(batch_size=100, flush_interval=1.0)
+
+
+def test_destructive_changes_are_audited(client, audit_log):
+    book_id = BookModel.add_book('Doomed', 'A', None, None, None, 1, 1)
+    member_id = MemberModel.add_member('Old Name', 'old@example.com', None, None)
+    loan = TransactionModel.issue_book(member_id, book_id)
+
+    MemberModel.update_member(member_id, 'New Name', 'old@example.com', None, None)
+    TransactionModel.delete_transaction(loan)
+    BookModel.delete_book(book_id)
+    MemberModel.delete_member(member_id)
+    audit.flush()
+
+    events = client.get('/api/audit').get_json()['items']
+    assert [(e['entity'], e['action']) for e in events] == [
+        ('members', 'delete'), ('books', 'delete'), ('transactions', 'delete'), ('members', 'update')]
+    assert events[0]['data']['full_name'] == 'New Name'
+    assert events[1]['data']['title'] == 'Doomed'
+    assert events[3]['data'] == {'full_name': ['Old Name', 'New Name']}
+
+    history = client.get(f'/api/audit?entity=members&entity_id={member_id}').get_json()['items']
+    assert [e['action'] for e in history] == ['delete', 'update']
+
+
+def test_writer_batches_in_background(client, audit_log):
+    audit.configure(batch_size=5, flush_interval=0.05)
+    before = dict(audit.stats)
+    for i in range(12):
+        audit.record('books', i, 'delete', {'n': i})
+    deadline = time.monotonic() + 5
+    while audit.stats['written'] - before['written'] < 12 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert audit.stats['written'] - before['written'] == 12
+    assert audit.stats['batches'] - before['batches'] < 12
+
+    first = client.get('/api/audit?entity=books&limit=5').get_json()
+    second = client.get(f"/api/audit?entity=books&limit=5&before_id={first['next_before_id']}").get_json()
+    ids = [e['entity_id'] for e in first['items'] + second['items']]
+    assert ids == list(range(11, 1, -1))
+
+
+def test_full_queue_writes_directly(client, audit_log, monkeypatch):
+    audit.configure(queue_size=1)
+    # No writer: the queue stays full after one event
+    monkeypatch.setattr(audit, '_ensure_thread', lambda: None)
+    before = audit.stats['direct']
+    audit.record('books', 1, 'delete')
+    audit.record('books', 2, 'delete')
+    assert audit.stats['direct'] == before + 1
+    assert [e['entity_id'] for e in audit.query(entity='books')] == [2]
+    audit.stop()
+    assert len(audit.query(entity='books')) == 2
+    audit.configure(queue_size=10000)
+
+
+def test_full_queue_inside_a_coordinated_write_uses_its_connection(client, audit_log, monkeypatch):
+    db.enable_write_coordinator()
+    audit.configure(queue_size=1)
+    monkeypatch.setattr(audit, '_ensure_thread', lambda: None)
+    try:
+        audit.record('books', 1, 'delete')
+        # Would deadlock as a nested db.write on the writer thread
+        db.write(lambda conn: audit.record('books', 2, 'delete', conn=conn))
+        assert [e['entity_id'] for e in audit.query(entity='books')] == [2]
+        with pytest.raises(RuntimeError):
+            db.write(lambda conn: audit.record('books', 3, 'delete'))
+    finally:
+        db.disable_write_coordinator()
+        audit.stop()
+        audit.configure(queue_size=10000)
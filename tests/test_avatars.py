@@ -0,0 +1,68 @@
+import io
+import os
+
+import pytest
+
+PIL = pytest.importorskip('PIL')
+from PIL import Image
+
+from models import avatars
+from models.user_model import UserModel
+
+
+def make_jpeg(size=(400, 300)):
+    buf = io.BytesIO()
+    exif = Image.Exif()
+    exif[0x010F] = 'CameraMaker'
+    Image.new('RGB', size, (200, 30, 30)).save(buf, 'JPEG', exif=exif, comment=b'GPS 51.5N home address')
+    return buf.getvalue()
+
+
+def test_process_writes_hashed_variants_without_metadata(tmp_path):
+    name = avatars.process(make_jpeg(), str(tmp_path))
+    found = avatars.variants(f'uploads/avatars/{name}')
+
+    assert set(found) == {'image/webp', 'image/jpeg'}
+    for items in found.values():
+        for rel, width in items:
+            with Image.open(tmp_path / os.path.basename(rel)) as img:
+                assert img.size == (width, width)
+                assert not img.getexif()
+                assert 'comment' not in img.info
+
+
+def test_upload_stores_variants_and_profile_returns_srcset(client, test_app, monkeypatch):
+    stored = {}
+    monkeypatch.setattr(avatars, 'submit', lambda fn, *args: fn(*args))
+    monkeypatch.setattr(UserModel, 'set_profile_image', staticmethod(lambda uid, rel: stored.update({uid: rel})))
+    with client.session_transaction() as sess:
+        sess['user_id'] = 3
+
+    resp = client.post('/profile/upload', data={'avatar': (io.BytesIO(make_jpeg()), 'me.jpg')},
+                       content_type='multipart/form-data')
+    assert resp.status_code == 302
+    assert avatars.variants(stored[3])
+
+    monkeypatch.setattr(UserModel, 'get_profile_image', staticmethod(lambda uid: stored[uid]))
+    user = client.get('/api/profile').get_json()['user']
+    assert user['avatarUrl'].endswith('-128.jpg')
+    assert user['avatarSrcset']['image/webp'].count('w,') == 2
+
+    served = client.get(user['avatarUrl'])
+    assert served.status_code == 200
+    assert 'immutable' in served.headers['Cache-Control']
+    assert 'max-age=31536000' in served.headers['Cache-Control']
+
+
+def test_legacy_avatar_path_has_no_srcset():
+    assert avatars.variants('uploads/avatars/3.jpg') is None
+
+
+def test_legacy_avatar_is_revalidated_not_immutable(client, test_app):
+    folder = test_app.config['UPLOAD_FOLDER']
+    os.makedirs(folder, exist_ok=True)
+    with open(os.path.join(folder, '3.jpg'), 'wb') as fh:
+        fh.write(make_jpeg())
+    served = client.get('/avatars/3.jpg')
+    assert served.status_code == 200
+    assert 'immutable' not in served.headers.get('Cache-Control', '')
@@ -0,0 +1,68 @@
+import sqlite3
+import threading
+import time
+
+from models import backup, db
+from models.book_model import BookModel
+
+
+def test_backup_writes_verified_snapshots_and_rotates(test_app, tmp_path):
+    BookModel.add_book('Backed Up', 'Author', None, None, None, 1, 1)
+    dest = tmp_path / 'backups'
+    results = []
+    for _ in range(3):
+        results.append(backup.backup(str(dest), pages=1, sleep=0, keep=2))
+        time.sleep(0.01)
+
+    assert len(backup.snapshots(str(dest))) == 2
+    assert results[-1]['removed'] == [results[0]['path']]
+    assert results[-1]['steps'] > 1
+    assert backup.verify(results[-1]['path']) == 'ok'
+    conn = sqlite3.connect(results[-1]['path'])
+    assert conn.execute('SELECT title FROM books').fetchone()[0] == 'Backed Up'
+    conn.close()
+
+
+def test_backup_does_not_stall_writers(test_app, tmp_path):
+    conn = db.connect()
+    conn.executemany('INSERT INTO books (title, author) VALUES (?, ?)', [('x' * 200, 'a')] * 5000)
+    conn.commit()
+    conn.close()
+
+    done = threading.Event()
+    writes = []
+
+    def writer():
+        while not done.is_set():
+            BookModel.add_book('During', 'Backup', None, None, None, 1, 1)
+            writes.append(1)
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        result = backup.backup(str(tmp_path / 'backups'), pages=16, sleep=0.002)
+    finally:
+        done.set()
+        thread.join()
+    assert writes and result['steps'] > 1
+
+
+def test_backup_cli(test_app, tmp_path):
+    test_app.config['BACKUP_DIR'] = str(tmp_path / 'cli')
+    out = test_app.test_cli_runner().invoke(args=['backup'])
+    assert out.exit_code == 0 and 'longest step' in out.output
+    assert len(backup.snapshots(str(tmp_path / 'cli'))) == 1
+
+
+def test_scheduler_runs_only_where_started(tmp_path):
+    from app import create_app, start_backups
+
+    app = create_app({'TESTING': True, 'DATABASE': str(tmp_path / 'lib.db'),
+                      'BACKUP_DIR': str(tmp_path / 'sched'), 'BACKUP_INTERVAL': 3600})
+    # Building the app (as every worker does) starts no backup thread
+    assert backup._thread is None
+    start_backups(app)
+    try:
+        assert backup._thread.is_alive()
+    finally:
+        backup.stop()
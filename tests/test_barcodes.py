@@ -0,0 +1,71 @@
+import sqlite3
+
+import pytest
+
+from models import db
+from models.book_model import BookModel
+from models.member_model import MemberModel
+from models.transaction_model import TransactionModel
+
+
+def test_isbn_normalization():
+    assert BookModel.normalize_isbn('0-306-40615-2') == '9780306406157'
+    assert BookModel.normalize_isbn('978 0 306 40615 7') == '9780306406157'
+    assert BookModel.normalize_isbn('9780306406158') is None
+    assert BookModel.normalize_isbn('not an isbn') is None
+
+
+def test_isbn_and_barcode_are_unique(client):
+    BookModel.add_book('One', 'A', None, None, None, 1, 1, isbn='9780306406157', barcode='LIB-1')
+    with pytest.raises(sqlite3.IntegrityError):
+        BookModel.add_book('Two', 'B', None, None, None, 1, 1, isbn='9780306406157')
+    with pytest.raises(sqlite3.IntegrityError):
+        BookModel.add_book('Three', 'C', None, None, None, 1, 1, barcode='LIB-1')
+    # Books without codes don't collide
+    BookModel.add_book('Four', 'D', None, None, None, 1, 1)
+    BookModel.add_book('Five', 'E', None, None, None, 1, 1)
+
+
+def test_lookup_by_barcode_or_isbn_uses_index(client):
+    book_id = BookModel.add_book('Scanned', 'A', None, None, None, 2, 1, isbn='9780306406157', barcode='LIB-7')
+    for code in ('LIB-7', '9780306406157', '0306406152'):
+        data = client.get(f'/books/api/lookup/{code}').get_json()
+        assert data['id'] == book_id and data['available_copies'] == 1 and data['available']
+    assert client.get('/books/api/lookup/nothing').status_code == 404
+
+    conn = db.connect()
+    plan = ' '.join(r[3] for r in conn.execute(
+        'EXPLAIN QUERY PLAN SELECT * FROM books WHERE barcode = ? UNION ALL '
+        'SELECT * FROM books WHERE isbn = ? LIMIT 1', ('x', 'y')))
+    conn.close()
+    assert 'idx_books_barcode' in plan and 'idx_books_isbn' in plan
+
+
+def test_scan_issue_and_return_in_one_request(client):
+    book_id = BookModel.add_book('Desk', 'A', None, None, None, 1, 1, barcode='LIB-9')
+    member_id = MemberModel.add_member('Reader', None, None, None)
+
+    resp = client.post('/transactions/issue', json={'member_id': member_id, 'barcode': 'LIB-9'})
+    assert resp.status_code == 201
+    transaction_id = resp.get_json()['transaction_id']
+    assert BookModel.get_by_id(book_id)['available_copies'] == 0
+
+    other = MemberModel.add_member('Second', None, None, None)
+    resp = client.post('/transactions/issue', json={'member_id': other, 'barcode': 'LIB-9'})
+    assert resp.status_code == 409 and resp.get_json()['position'] == 1
+
+    resp = client.post('/transactions/return', json={'barcode': 'LIB-9'})
+    assert resp.status_code == 200
+    assert resp.get_json()['transaction_id'] == transaction_id
+    assert resp.get_json()['hold_id'] is not None
+    assert TransactionModel.get_by_id(transaction_id)['return_date']
+    assert client.post('/transactions/return', json={'barcode': 'LIB-9'}).status_code == 404
+    assert client.post('/transactions/issue', json={'member_id': member_id, 'barcode': 'nope'}).status_code == 404
+
+
+def test_form_issue_by_barcode_redirects(client):
+    BookModel.add_book('Form', 'A', None, None, None, 1, 1, isbn='9780306406157')
+    member_id = MemberModel.add_member('Reader', None, None, None)
+    resp = client.post('/transactions/issue', data={'member_id': member_id, 'barcode': '0-306-40615-2'})
+    assert resp.status_code == 302
+    assert TransactionModel.get_stats()['issued'] == 1
@@ -0,0 +1,130 @@
+import sqlite3
+
+import pytest
+
+from models import db
+from models.book_model import BookModel
+from models.copy_model import CopyModel, NoCopyAvailable
+from models.hold_model import HoldModel
+from models.member_model import MemberModel
+from models.transaction_model import TransactionModel
+
+
+def statuses(book_id):
+    return [c['status'] for c in CopyModel.for_book(book_id)]
+
+
+def test_counters_follow_copies(client):
+    book_id = BookModel.add_book('Shelf', 'A', None, None, None, 3, 2)
+    assert statuses(book_id) == ['available', 'available', 'unavailable']
+    book = BookModel.get_by_id(book_id)
+    assert (book['total_copies'], book['available_copies']) == (3, 2)
+
+    member = MemberModel.add_member('Reader', None, None, None)
+    loan = TransactionModel.issue_book(member, book_id)
+    copy_id = TransactionModel.get_by_id(loan)['copy_id']
+    assert CopyModel.get_by_id(copy_id)['status'] == 'on_loan'
+    assert BookModel.get_by_id(book_id)['available_copies'] == 1
+    assert CopyModel.available_count(book_id) == 1
+
+    TransactionModel.return_book(loan)
+    assert CopyModel.get_by_id(copy_id)['status'] == 'available'
+    assert BookModel.get_by_id(book_id)['available_copies'] == 2
+
+    # Shelf changes by staff; copies out on loan can't be touched
+    assert CopyModel.update(copy_id, status='withdrawn')
+    book = BookModel.get_by_id(book_id)
+    assert (book['total_copies'], book['available_copies']) == (2, 1)
+    loan = TransactionModel.issue_book(member, book_id)
+    busy = TransactionModel.get_by_id(loan)['copy_id']
+    assert not CopyModel.update(busy, status='lost')
+
+
+def test_issue_without_shelved_copy_raises_and_rolls_back(client):
+    book_id = BookModel.add_book('Scarce', 'A', None, None, None, 1, 1)
+    member = MemberModel.add_member('Reader', None, None, None)
+    TransactionModel.issue_book(member, book_id)
+    with pytest.raises(NoCopyAvailable):
+        TransactionModel.issue_book(member, book_id)
+    assert TransactionModel.get_stats()['total'] == 1
+
+
+def test_take_uses_available_partial_index(client):
+    conn = db.connect()
+    plan = ' '.join(r[3] for r in conn.execute(
+        "EXPLAIN QUERY PLAN SELECT id FROM copies INDEXED BY idx_copies_available "
+        "WHERE book_id = ? AND status = 'available' ORDER BY id LIMIT 1",
+        (1,)))
+    conn.close()
+    assert 'idx_copies_available' in plan
+
+
+def test_hold_keeps_the_returned_copy(client):
+    book_id = BookModel.add_book('Wanted', 'A', None, None, None, 1, 1)
+    first = MemberModel.add_member('First', None, None, None)
+    second = MemberModel.add_member('Second', None, None, None)
+    loan = TransactionModel.issue_book(first, book_id)
+    copy_id = TransactionModel.get_by_id(loan)['copy_id']
+    hold_id = HoldModel.place_hold(second, book_id)
+
+    TransactionModel.return_book(loan)
+    assert HoldModel.get_by_id(hold_id)['copy_id'] == copy_id
+    assert CopyModel.get_by_id(copy_id)['status'] == 'on_hold'
+
+    loan2 = HoldModel.issue_to_holder(hold_id, second, book_id, '2024-01-01 10:00:00')
+    assert TransactionModel.get_by_id(loan2)['copy_id'] == copy_id
+    assert CopyModel.get_by_id(copy_id)['status'] == 'on_loan'
+
+    # Deleting an open loan puts the copy back
+    TransactionModel.delete_transaction(loan2)
+    assert CopyModel.get_by_id(copy_id)['status'] == 'available'
+
+
+def test_copy_barcode_scan_and_copies_api(client):
+    book_id = BookModel.add_book('Labelled', 'A', None, None, None, 0, 0)
+    resp = client.post(f'/books/api/{book_id}/copies', json={'barcode': 'C-1', 'location': 'Stack 3'})
+    assert resp.status_code == 201
+    copy_id = resp.get_json()['id']
+    assert client.post(f'/books/api/{book_id}/copies', json={'barcode': 'C-1'}).status_code == 409
+    assert client.get('/books/api/lookup/C-1').get_json()['copy'] == {
+        'id': copy_id, 'status': 'available', 'location': 'Stack 3'}
+
+    member = MemberModel.add_member('Reader', None, None, None)
+    resp = client.post('/transactions/issue', json={'member_id': member, 'barcode': 'C-1'})
+    assert resp.status_code == 201
+    items = client.get(f'/books/api/{book_id}/copies').get_json()['items']
+    assert items[0]['status'] == 'on_loan' and items[0]['borrower_id'] == member
+    assert client.post(f'/books/api/copies/{copy_id}', json={'status': 'lost'}).status_code == 409
+
+    resp = client.post('/transactions/return', json={'barcode': 'C-1'})
+    assert resp.status_code == 200
+    assert client.post(f'/books/api/copies/{copy_id}', json={'location': 'Stack 4'}).get_json()['location'] == 'Stack 4'
+
+
+def test_migration_backfills_copies_from_counters(tmp_path, monkeypatch):
+    path = str(tmp_path / 'legacy.db')
+    conn = sqlite3.connect(path)
+    conn.executescript('''
+        CREATE TABLE books (id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT NOT NULL, author TEXT NOT NULL,
+                            publisher TEXT, year_published TEXT, category TEXT,
+                            total_copies INTEGER, available_copies INTEGER);
+        CREATE TABLE transactions (id INTEGER PRIMARY KEY AUTOINCREMENT, member_id INTEGER NOT NULL,
+                                   book_id INTEGER NOT NULL, issue_date TEXT, return_date TEXT);
+        INSERT INTO books (title, author, total_copies, available_copies) VALUES ('Old', 'A', 3, 1);
+        INSERT INTO transactions (member_id, book_id, issue_date) VALUES (1, 1, '2024-01-01 10:00:00');
+        INSERT INTO transactions (member_id, book_id, issue_date, return_date)
+            VALUES (2, 1, '2024-01-01 10:00:00', '2024-01-05 10:00:00');
+    ''')
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr(db, 'DATABASE', path)
+    db.migrate()
+
+    assert sorted(statuses(1)) == ['available', 'on_loan', 'unavailable']
+    copy_id = TransactionModel.get_by_id(1)['copy_id']
+    assert CopyModel.get_by_id(copy_id)['status'] == 'on_loan'
+    book = BookModel.get_by_id(1)
+    assert (book['total_copies'], book['available_copies']) == (3, 1)
+    # Migrating again adds nothing
+    db.migrate()
+    assert len(statuses(1)) == 3
@@ -0,0 +1,113 @@
+import json
+import time
+
+from models import changes, db, events
+from models.book_model import BookModel
+from models.member_model import MemberModel
+from models.transaction_model import TransactionModel
+
+
+def parse(frame):
+    fields = dict(line.split(': ', 1) for line in frame.decode().strip().split('\n'))
+    return fields['event'], json.loads(fields['data']), int(fields['id'])
+
+
+def test_bus_encodes_once_and_replays_after_last_event_id():
+    bus = events.EventBus(max_subscribers=2)
+    a, b = bus.subscribe(), bus.subscribe()
+    first = bus.publish('issued', {'n': 1})
+    bus.publish('issued', {'n': 2})
+    frame = a.get_nowait()
+    assert frame is b.get_nowait()
+    bus.unsubscribe(b)
+    replay = bus.subscribe(last_event_id=first)
+    assert parse(replay.get_nowait())[1] == {'n': 2}
+
+
+def test_bus_caps_subscribers_and_drops_slow_ones(monkeypatch):
+    monkeypatch.setattr(events, 'QUEUE_SIZE', 2)
+    bus = events.EventBus(max_subscribers=1)
+    q = bus.subscribe()
+    try:
+        bus.subscribe()
+        assert False, 'expected TooManySubscribers'
+    except events.TooManySubscribers:
+        pass
+    for i in range(3):
+        bus.publish('issued', {'n': i})
+    assert len(bus) == 0 and bus.dropped == 1
+    frames = [q.get_nowait() for _ in range(q.qsize())]
+    assert frames[-1] is events.DISCONNECT
+
+
+def test_dashboard_stream_pushes_issue_and_return(client, monkeypatch):
+    monkeypatch.setattr(events, 'POLL_INTERVAL', 0.05)
+    book_id = BookModel.add_book('Live', 'Author', None, None, None, 1, 1)
+    member_id = MemberModel.add_member('Watcher', None, None, None)
+    resp = client.get('/api/dashboard/events', buffered=False)
+    assert resp.mimetype == 'text/event-stream'
+    stream = iter(resp.response)
+    assert next(stream) == b'retry: 5000\n\n'
+
+    tid = TransactionModel.issue_book(member_id, book_id)
+    event, data, issued_id = parse(next(stream))
+    assert event == 'issued' and data['totals'] == {'booksIssued': 1}
+    assert data['transaction']['member'] == 'Watcher' and data['transaction']['book'] == 'Live'
+
+    client.get(f'/transactions/return/{tid}')
+    event, data, _ = parse(next(stream))
+    assert event == 'returned' and data['totals'] == {'booksIssued': 0}
+    resp.close()
+    assert len(events.bus) == 0
+
+    # Another worker's bus (empty history) replays from the change log
+    events.bus.reset(events.bus.last_id)
+    q = events.bus.subscribe(last_event_id=issued_id - 1)
+    assert [parse(q.get_nowait())[0] for _ in range(q.qsize())] == ['returned']
+    events.bus.unsubscribe(q)
+
+
+def test_changes_made_by_other_processes_are_pushed(client, monkeypatch):
+    monkeypatch.setattr(events, 'POLL_INTERVAL', 0.05)
+    book_id = BookModel.add_book('Elsewhere', 'Author', None, None, None, 1, 1)
+    member_id = MemberModel.add_member('Other', None, None, None)
+    resp = client.get('/api/dashboard/events', buffered=False)
+    stream = iter(resp.response)
+    next(stream)
+    # A write on a separate connection, as another server worker would make
+    conn = db.connect()
+    conn.execute("INSERT INTO transactions (member_id, book_id, issue_date) VALUES (?, ?, '2024-01-01 10:00:00')",
+                 (member_id, book_id))
+    conn.commit()
+    conn.close()
+    event, data, event_id = parse(next(stream))
+    assert event == 'issued' and data['transaction']['book'] == 'Elsewhere'
+    conn = db.connect()
+    assert event_id == changes.current_version(conn)
+    conn.close()
+    resp.close()
+
+
+def test_tail_thread_runs_only_while_someone_listens(client, monkeypatch):
+    monkeypatch.setattr(events, 'POLL_INTERVAL', 0.02)
+    monkeypatch.setattr(events.bus, 'max_subscribers', 2)
+    a = events.subscribe()
+    b = events.subscribe()
+    thread = events._thread
+    assert thread.is_alive()
+    events.unsubscribe(a)
+    time.sleep(0.1)
+    assert thread.is_alive()
+    events.unsubscribe(b)
+    thread.join(1)
+    assert not thread.is_alive() and events._thread is None
+
+    # The next subscriber starts a new thread from the current version
+    book_id = BookModel.add_book('Later', 'Author', None, None, None, 1, 1)
+    member_id = MemberModel.add_member('Late', None, None, None)
+    TransactionModel.issue_book(member_id, book_id)
+    q = events.subscribe()
+    assert events._thread is not thread and events._thread.is_alive()
+    time.sleep(0.1)
+    assert q.empty()
+    events.unsubscribe(q)
@@ -0,0 +1,68 @@
+import pytest
+
+from models import archive, db, export
+from models.book_model import BookModel
+from models.member_model import MemberModel
+from models.transaction_model import TransactionModel
+
+pa = pytest.importorskip('pyarrow')
+pq = pytest.importorskip('pyarrow.parquet')
+
+
+def seed():
+    book_id = BookModel.add_book('Columnar', 'Author', None, None, 'Data', 5, 5)
+    member_id = MemberModel.add_member('Analyst', 'secret@example.com', '555', None, member_type='staff')
+    loans = [TransactionModel.issue_book(member_id, book_id, date)
+             for date in ('2024-01-05 10:00:00', '2024-01-20 10:00:00', '2024-02-03 09:30:00')]
+    return book_id, member_id, loans
+
+
+def test_export_is_partitioned_and_denormalized(client, tmp_path):
+    book_id, member_id, loans = seed()
+    TransactionModel.return_book(loans[0])
+    db.write(archive.archive_batch, '9999-12-31 00:00:00')
+
+    result = export.export(str(tmp_path), batch_size=1)
+    assert result['months_written'] == ['2024-01', '2024-02'] and result['rows'] == 3
+
+    january = pq.read_table(tmp_path / 'transactions' / 'issue_month=2024-01' / 'part-0.parquet')
+    assert january.column('id').to_pylist() == loans[:2]
+    assert january.column('book_title').to_pylist() == ['Columnar', 'Columnar']
+    assert january.column('member_name').to_pylist() == ['Analyst', 'Analyst']
+    assert january.schema.field('issue_date').type == pa.timestamp('ms')
+    # The archived loan is exported with its return date
+    assert january.column('return_date').null_count == 1
+
+    members = pq.read_table(tmp_path / 'members' / 'members.parquet')
+    assert 'email' not in members.column_names and 'phone' not in members.column_names
+
+    # The whole directory reads back as one dataset with the partition column
+    dataset = pq.read_table(tmp_path / 'transactions')
+    assert dataset.num_rows == 3
+
+
+def test_incremental_export_rewrites_only_changed_months(client, tmp_path):
+    _, member_id, loans = seed()
+    export.export(str(tmp_path))
+
+    again = export.export(str(tmp_path))
+    assert again['months_written'] == [] and again['months_skipped'] == 2
+
+    TransactionModel.return_book(loans[2])
+    TransactionModel.issue_book(member_id, 1, '2024-03-01 12:00:00')
+    changed = export.export(str(tmp_path))
+    assert changed['months_written'] == ['2024-02', '2024-03']
+
+    TransactionModel.delete_transaction(loans[2])
+    removed = export.export(str(tmp_path))
+    assert removed['months_removed'] == ['2024-02']
+    assert not (tmp_path / 'transactions' / 'issue_month=2024-02').exists()
+
+    assert export.export(str(tmp_path), full=True)['months_written'] == ['2024-01', '2024-03']
+
+
+def test_export_cli(test_app, tmp_path):
+    seed()
+    out = test_app.test_cli_runner().invoke(args=['export', '--dest', str(tmp_path / 'cli')])
+    assert out.exit_code == 0, out.output
+    assert (tmp_path / 'cli' / 'transactions' / 'issue_month=2024-02' / 'part-0.parquet').exists()
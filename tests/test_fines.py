@@ -0,0 +1,81 @@
+from models import db, fines
+from models.book_model import BookModel
+from models.member_model import MemberModel
+from models.transaction_model import TransactionModel
+
+
+def seed():
+    book_id = BookModel.add_book('Late', 'Author', None, None, None, 5, 5)
+    student = MemberModel.add_member('Student', None, None, None, member_type='student')
+    faculty = MemberModel.add_member('Faculty', None, None, None, member_type='faculty')
+    loans = {
+        'student': TransactionModel.issue_book(student, book_id, '2024-02-10 09:00:00'),
+        'faculty': TransactionModel.issue_book(faculty, book_id, '2024-02-10 09:00:00'),
+        'capped': TransactionModel.issue_book(student, book_id, '2023-11-01 09:00:00'),
+    }
+    return student, faculty, loans
+
+
+def amounts():
+    conn = db.connect()
+    rows = dict(conn.execute('SELECT transaction_id, amount_cents FROM fines').fetchall())
+    conn.close()
+    return rows
+
+
+def test_accrual_applies_rules_and_is_idempotent_per_day(client):
+    student, faculty, loans = seed()
+
+    result = fines.accrue('2024-03-01')
+    assert not result['skipped'] and result['loans'] == 2
+    # 20 days out: 6 past due, 2 of them grace -> 4 x 0.25; faculty loans run 28 days;
+    # the old loan hits the 10.00 cap
+    assert amounts() == {loans['student']: 100, loans['capped']: 1000}
+    assert fines.for_member(student)['balance'] == 11.0
+    assert fines.for_member(faculty) == {'balance': 0, 'fined_loans': 0, 'accrued_through': None, 'fines': []}
+
+    assert fines.accrue('2024-03-01')['skipped']
+    assert not fines.accrue('2024-03-01', force=True)['skipped']
+    assert amounts() == {loans['student']: 100, loans['capped']: 1000}
+
+    fines.accrue('2024-03-02')
+    assert amounts()[loans['student']] == 125
+    assert fines.for_member(student)['balance'] == 11.25
+
+
+def test_returned_and_deleted_loans(client):
+    student, _, loans = seed()
+    fines.accrue('2024-03-01')
+    # Returned between runs: charged up to the return day only
+    db.write(TransactionModel._return, loans['student'], '2024-03-03 16:00:00')
+    fines.accrue('2024-03-10')
+    assert amounts()[loans['student']] == 150
+
+    TransactionModel.delete_transaction(loans['capped'])
+    assert fines.for_member(student)['balance'] == 1.5
+    TransactionModel.delete_transaction(loans['student'])
+    assert fines.for_member(student)['fined_loans'] == 0
+
+
+def test_views_read_accrued_fines(client):
+    student, _, loans = seed()
+    fines.accrue('2024-03-01')
+
+    overdue = client.get('/members/api/overdue?days=1&sort=fine&order=desc').get_json()
+    assert [(i['transaction_id'], i['fine']) for i in overdue['items']] == [
+        (loans['capped'], 10.0), (loans['student'], 1.0), (loans['faculty'], 0)]
+
+    members = client.get('/members/api?fields=id,fine_balance&sort=id').get_json()['items']
+    assert [m['fine_balance'] for m in members] == [11.0, 0]
+
+    detail = client.get(f'/members/api/{student}/fines').get_json()
+    assert [f['amount'] for f in detail['fines']] == [10.0, 1.0]
+
+
+def test_fines_cli(test_app):
+    seed()
+    runner = test_app.test_cli_runner()
+    out = runner.invoke(args=['fines', '--day', '2024-03-01'])
+    assert out.exit_code == 0 and 'on 2 loans' in out.output
+    assert 'already accrued' in runner.invoke(args=['fines', '--day', '2024-03-01']).output
+    assert runner.invoke(args=['fines', '--day', 'yesterday']).exit_code != 0
@@ -0,0 +1,162 @@
+import threading
+
+import pytest
+
+from models import db
+from models.book_model import BookModel
+from models.hold_model import HoldModel, HoldNotReady
+from models.member_model import MemberModel
+from models.transaction_model import TransactionModel
+
+
+def setup_loan():
+    book_id = BookModel.add_book('Wanted', 'Author', None, None, None, 1, 1)
+    borrower = MemberModel.add_member('Borrower', None, None, None)
+    loan_id = TransactionModel.issue_book(borrower, book_id)
+    return book_id, loan_id
+
+
+def test_queue_orders_by_member_type_then_time(client):
+    book_id, _ = setup_loan()
+    student = MemberModel.add_member('Student', None, None, None, member_type='student')
+    community = MemberModel.add_member('Neighbour', None, None, None, member_type='community')
+    faculty = MemberModel.add_member('Professor', None, None, None, member_type='faculty')
+    holds = [HoldModel.place_hold(m, book_id) for m in (student, community, faculty)]
+
+    # Placing the same hold again returns the open one
+    assert HoldModel.place_hold(student, book_id) == holds[0]
+    assert [HoldModel.position(h) for h in holds] == [2, 3, 1]
+    items = client.get(f'/transactions/api/books/{book_id}/holds').get_json()['items']
+    assert [i['member_name'] for i in items] == ['Professor', 'Student', 'Neighbour']
+
+
+def test_return_allocates_copy_to_next_hold(client):
+    book_id, loan_id = setup_loan()
+    member = MemberModel.add_member('Waiting', None, None, None, member_type='student')
+
+    # Issuing an unavailable book queues the member
+    client.post('/transactions/issue', data={'member_id': member, 'book_id': book_id})
+    hold = client.get('/transactions/holds/1').get_json()
+    assert hold['status'] == 'waiting' and hold['position'] == 1
+
+    client.get(f'/transactions/return/{loan_id}')
+    hold = client.get('/transactions/holds/1').get_json()
+    assert hold['status'] == 'ready' and hold['position'] is None
+    assert BookModel.get_by_id(book_id)['available_copies'] == 0
+
+    client.post('/transactions/issue', data={'member_id': member, 'book_id': book_id})
+    assert HoldModel.get_by_id(1)['status'] == 'fulfilled'
+    assert TransactionModel.get_stats()['issued'] == 1
+    assert BookModel.get_by_id(book_id)['available_copies'] == 0
+
+
+def test_cancel_passes_copy_on_or_reshelves(client):
+    book_id, loan_id = setup_loan()
+    first = MemberModel.add_member('First', None, None, None)
+    second = MemberModel.add_member('Second', None, None, None)
+    h1 = client.post('/transactions/holds', json={'member_id': first, 'book_id': book_id}).get_json()['id']
+    h2 = client.post('/transactions/holds', json={'member_id': second, 'book_id': book_id}).get_json()['id']
+    TransactionModel.return_book(loan_id)
+    assert HoldModel.get_by_id(h1)['status'] == 'ready'
+
+    assert client.post(f'/transactions/holds/{h1}/cancel').status_code == 200
+    assert HoldModel.get_by_id(h2)['status'] == 'ready'
+    HoldModel.cancel(h2)
+    assert BookModel.get_by_id(book_id)['available_copies'] == 1
+    assert client.post(f'/transactions/holds/{h2}/cancel').status_code == 404
+
+
+def test_every_shelved_copy_serves_the_queue(client):
+    book_id, loan_id = setup_loan()
+    first = MemberModel.add_member('First', None, None, None)
+    second = MemberModel.add_member('Second', None, None, None)
+    third = MemberModel.add_member('Third', None, None, None)
+    h1, h2, h3 = (HoldModel.place_hold(m, book_id) for m in (first, second, third))
+
+    # A plain return serves the queue
+    assert TransactionModel.return_book(loan_id) == h1
+    # So do a new copy and a copy coming back from repair
+    client.post(f'/books/api/{book_id}/copies', json={})
+    assert HoldModel.get_by_id(h2)['status'] == 'ready'
+    copy_id = client.post(f'/books/api/{book_id}/copies', json={'status': 'unavailable'}).get_json()['id']
+    client.post(f'/books/api/copies/{copy_id}', json={'status': 'available'})
+    assert HoldModel.get_by_id(h3)['copy_id'] == copy_id
+    assert BookModel.get_by_id(book_id)['available_copies'] == 0
+
+    # Deleting an open loan hands its copy on too
+    loan = HoldModel.issue_to_holder(h1, first, book_id, '2024-01-01 10:00:00')
+    fourth = MemberModel.add_member('Fourth', None, None, None)
+    h4 = HoldModel.place_hold(fourth, book_id)
+    TransactionModel.delete_transaction(loan)
+    assert HoldModel.get_by_id(h4)['status'] == 'ready'
+
+
+def test_hold_on_a_shelved_book_is_ready_at_once(client):
+    book_id = BookModel.add_book('Shelved', 'Author', None, None, None, 1, 1)
+    member = MemberModel.add_member('Member', None, None, None)
+    hold = client.post('/transactions/holds', json={'member_id': member, 'book_id': book_id}).get_json()
+    assert hold['status'] == 'ready'
+    assert BookModel.get_by_id(book_id)['available_copies'] == 0
+
+
+def test_walk_in_does_not_jump_the_queue(client):
+    book_id, loan_id = setup_loan()
+    waiting = MemberModel.add_member('Waiting', None, None, None)
+    walk_in = MemberModel.add_member('Walk-in', None, None, None)
+    HoldModel.place_hold(waiting, book_id)
+    # Legacy state: a copy on the shelf although someone is queued
+    db.write(lambda conn: conn.execute(
+        "INSERT INTO copies (book_id, status) VALUES (?, 'available')", (book_id,)))
+
+    resp = client.post('/transactions/issue', json={'member_id': walk_in, 'book_id': book_id})
+    assert resp.status_code == 409
+    assert TransactionModel.get_stats()['issued'] == 1
+
+
+def test_cancelled_hold_is_not_issued(client):
+    book_id, loan_id = setup_loan()
+    member = MemberModel.add_member('Member', None, None, None)
+    hold_id = HoldModel.place_hold(member, book_id)
+    TransactionModel.return_book(loan_id)
+    HoldModel.cancel(hold_id)
+
+    with pytest.raises(HoldNotReady):
+        HoldModel.issue_to_holder(hold_id, member, book_id, '2024-01-01 10:00:00')
+    assert TransactionModel.get_stats()['issued'] == 0
+    assert BookModel.get_by_id(book_id)['available_copies'] == 1
+
+
+def race(n, fn):
+    barrier = threading.Barrier(n)
+    results, errors = [], []
+
+    def run():
+        barrier.wait()
+        try:
+            results.append(fn())
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=run) for _ in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results, errors
+
+
+def test_racing_placements_and_cancels(client):
+    book_id, loan_id = setup_loan()
+    first = MemberModel.add_member('First', None, None, None)
+    second = MemberModel.add_member('Second', None, None, None)
+
+    results, errors = race(8, lambda: HoldModel.place_hold(first, book_id))
+    assert not errors and len(set(results)) == 1
+    h1 = results[0]
+    h2 = HoldModel.place_hold(second, book_id)
+    TransactionModel.return_book(loan_id)
+
+    results, errors = race(4, lambda: HoldModel.cancel(h1))
+    assert not errors and sorted(results) == [False, False, False, True]
+    # The copy passed to the next hold exactly once and stayed with it
+    assert HoldModel.get_by_id(h2)['status'] == 'ready'
+    assert BookModel.get_by_id(book_id)['available_copies'] == 0
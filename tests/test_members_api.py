@@ -0,0 +1,78 @@
+import base64
+import json
+
+from models.member_model import MemberModel
+
+
+def seed_members():
+    MemberModel.add_member('Cara Ng', 'cara@example.com', None, None, city='Paris',
+                           member_type='student', membership_date='2024-03-01', notes='secret')
+    MemberModel.add_member('Abe Lee', 'abe@example.com', None, None, city='Oslo',
+                           member_type='faculty', membership_date='2023-01-15')
+    MemberModel.add_member('Bea Ray', 'bea@example.com', None, None, city='Paris',
+                           member_type='student', membership_date='2024-07-20')
+    MemberModel.add_member('No Date', None, None, None)
+
+
+def test_keyset_pages_cover_all_members_once(client):
+    seed_members()
+    names, cursor, first = [], None, True
+    while True:
+        url = '/members/api?limit=2' + (f'&cursor={cursor}' if cursor else '')
+        data = client.get(url).get_json()
+        if first:
+            assert data['total'] == 4
+            first = False
+        else:
+            assert data['total'] is None
+        names.extend(m['full_name'] for m in data['items'])
+        cursor = data['next_cursor']
+        if not cursor:
+            break
+    assert names == ['Abe Lee', 'Bea Ray', 'Cara Ng', 'No Date']
+
+
+def test_projection_filters_and_sort(client):
+    seed_members()
+    data = client.get('/members/api?fields=full_name,city&member_type=student&city=Paris'
+                      '&membership_from=2024-01-01&sort=membership_date&order=desc').get_json()
+    assert data['total'] == 2
+    assert [m['full_name'] for m in data['items']] == ['Bea Ray', 'Cara Ng']
+    assert set(data['items'][0]) == {'id', 'full_name', 'city'}
+
+
+def test_unknown_fields_are_not_exposed(client):
+    seed_members()
+    data = client.get('/members/api?q=cara&fields=password').get_json()
+    assert data['items'][0]['full_name'] == 'Cara Ng'
+    assert 'password' not in data['items'][0]
+    assert 'notes' not in data['items'][0]
+
+
+def test_members_page_does_not_render_rows(client):
+    seed_members()
+    html = client.get('/members/').get_data(as_text=True)
+    assert 'Cara Ng' not in html
+    assert '/members/api' in html
+
+
+def test_every_sort_is_served_by_an_index(client):
+    from models import db
+    from routes.member_routes import MEMBER_SORTS
+
+    conn = db.connect()
+    for sort_sql in MEMBER_SORTS.values():
+        for order in ('ASC', 'DESC'):
+            plan = ' '.join(r[3] for r in conn.execute(
+                f"EXPLAIN QUERY PLAN SELECT id FROM members WHERE ({sort_sql}, id) > (?, ?) "
+                f"ORDER BY {sort_sql} {order}, id {order} LIMIT 26", ('', 0)))
+            assert 'TEMP B-TREE' not in plan, (sort_sql, plan)
+    conn.close()
+
+
+def test_tampered_cursor_is_rejected(client):
+    seed_members()
+    for values in ([[1], {}], [None, 'x'], ['Abe', '2'], [True, 1], [1]):
+        cursor = base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+        assert client.get(f'/members/api?cursor={cursor}').status_code == 400
+    assert client.get('/members/api?cursor=not-base64!').status_code == 400
@@ -0,0 +1,69 @@
+import os
+import signal
+
+import bcrypt
+import pytest
+
+from models import passwords
+from models.user_model import UserModel
+
+
+def test_pool_hash_and_check_roundtrip(test_app):
+    passwords.configure(rounds=4, workers=1)
+    try:
+        hashed = passwords.hash_password('s3cret')
+        assert passwords.check_password('s3cret', hashed)
+        assert not passwords.check_password('wrong', hashed)
+    finally:
+        passwords.shutdown()
+
+
+def test_broken_pool_is_rebuilt(test_app):
+    passwords.configure(rounds=4, workers=1)
+    try:
+        hashed = passwords.hash_password('s3cret')
+        for pid in list(passwords._pool._processes):
+            os.kill(pid, signal.SIGKILL)
+        assert passwords.check_password('s3cret', hashed)
+    finally:
+        passwords.shutdown()
+
+
+def test_needs_rehash_tracks_cost_factor(test_app):
+    assert not passwords.needs_rehash(bcrypt.hashpw(b'pw', bcrypt.gensalt(4)).decode())
+    assert passwords.needs_rehash(bcrypt.hashpw(b'pw', bcrypt.gensalt(5)).decode())
+
+
+def test_saturated_pool_returns_503(client, monkeypatch):
+    stored = bcrypt.hashpw(b'pw', bcrypt.gensalt(4)).decode()
+    monkeypatch.setattr(UserModel, 'find_by_email', staticmethod(lambda e: (1, 'Ann', e, stored)))
+    passwords.configure(workers=1, max_pending=0)
+    try:
+        resp = client.post('/auth/login', data={'email': 'a@example.com', 'password': 'pw'})
+    finally:
+        passwords.shutdown()
+    assert resp.status_code == 503
+    assert resp.headers['Retry-After'] == '1'
+
+
+def test_login_rehashes_when_cost_changes(client, monkeypatch):
+    stored = bcrypt.hashpw(b'pw', bcrypt.gensalt(5)).decode()
+    updated = []
+    monkeypatch.setattr(UserModel, 'find_by_email', staticmethod(lambda e: (1, 'Ann', e, stored)))
+    monkeypatch.setattr(UserModel, 'update_password', staticmethod(lambda uid, pw: updated.append(uid)))
+
+    resp = client.post('/auth/login', data={'email': 'a@example.com', 'password': 'pw'})
+    assert resp.status_code == 302
+    assert updated == [1]
+
+
+def test_failed_rehash_does_not_fail_the_login(client, monkeypatch):
+    stored = bcrypt.hashpw(b'pw', bcrypt.gensalt(5)).decode()
+    monkeypatch.setattr(UserModel, 'find_by_email', staticmethod(lambda e: (1, 'Ann', e, stored)))
+
+    def fail(uid, pw):
+        raise RuntimeError('database is locked')
+    monkeypatch.setattr(UserModel, 'update_password', staticmethod(fail))
+
+    resp = client.post('/auth/login', data={'email': 'a@example.com', 'password': 'pw'})
+    assert resp.status_code == 302
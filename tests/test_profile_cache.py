@@ -0,0 +1,84 @@
+import time
+
+import pytest
+
+import models.user_model as user_model
+from models.cache import TTLCache
+from models.user_model import UserModel
+
+
+class FakeCursor:
+    def execute(self, sql, params=None):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def cursor(self):
+        return FakeCursor()
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def loads(test_app, monkeypatch):
+    calls = []
+
+    def load(user_id):
+        calls.append(user_id)
+        return {"id": user_id, "full_name": "Ann", "email": "ann@example.com", "profile_image": None}
+
+    monkeypatch.setattr(UserModel, '_load_profile', staticmethod(load))
+    monkeypatch.setattr(user_model, 'get_db_connection', lambda: FakeConnection())
+    return calls
+
+
+def test_profile_reads_hit_cache(loads):
+    assert UserModel.get_by_id(7) == (7, 'Ann', 'ann@example.com')
+    assert UserModel.get_by_id(7)[1] == 'Ann'
+    assert loads == [7]
+
+
+@pytest.mark.parametrize('change', [
+    lambda: UserModel.update_profile(7, 'Ann B', 'annb@example.com'),
+    lambda: UserModel.set_profile_image(7, 'uploads/avatars/7.png'),
+    lambda: UserModel.update_password(7, 'new-secret'),
+])
+def test_profile_changes_invalidate_cache(loads, change):
+    UserModel.get_by_id(7)
+    change()
+    UserModel.get_by_id(7)
+    assert loads == [7, 7]
+
+
+def test_ttl_cache_bounds_size_and_expires():
+    cache = TTLCache(maxsize=2, ttl=0.05)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    time.sleep(0.06)
+    assert cache.get('a') is None
+
+
+def test_invalidate_during_load_wins():
+    cache = TTLCache()
+
+    def stale_load():
+        # The profile is updated while its old row is being read
+        cache.invalidate('user')
+        return 'stale'
+
+    assert cache.get_or_load('user', stale_load) == 'stale'
+    assert cache.get('user') is None
+    assert cache.get_or_load('user', lambda: 'fresh') == 'fresh'
+    assert cache.get('user') == 'fresh'
+    assert not cache._loading
@@ -0,0 +1,35 @@
+import sqlite3
+
+import pytest
+
+from models import db
+from models.book_model import BookModel
+
+
+def test_readonly_connection_rejects_writes(test_app):
+    conn = db.connect_readonly()
+    try:
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("INSERT INTO books (title, author) VALUES ('x', 'y')")
+    finally:
+        conn.close()
+
+
+def test_readonly_connection_reads_one_snapshot(test_app):
+    BookModel.add_book('First', 'Author', None, None, None, 1, 1)
+    conn = db.connect_readonly()
+    try:
+        before = conn.execute('SELECT COUNT(*) FROM books').fetchone()[0]
+        BookModel.add_book('Second', 'Author', None, None, None, 1, 1)
+        after = conn.execute('SELECT COUNT(*) FROM books').fetchone()[0]
+    finally:
+        conn.close()
+    assert before == after == 1
+    assert len(BookModel.get_all()) == 2
+
+
+def test_migrate_enables_wal(test_app):
+    conn = db.connect()
+    mode = conn.execute('PRAGMA journal_mode').fetchone()[0]
+    conn.close()
+    assert mode == 'wal'
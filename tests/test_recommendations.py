@@ -0,0 +1,68 @@
+from models import db
+from models.book_model import BookModel
+from models.member_model import MemberModel
+from models.recommendation_model import RecommendationModel
+from models.transaction_model import TransactionModel
+
+
+def pair_scores():
+    conn = db.connect()
+    rows = conn.execute("SELECT book_id, related_id, score FROM book_pairs").fetchall()
+    conn.close()
+    return {(r[0], r[1]): r[2] for r in rows}
+
+
+def test_related_books_are_counted_on_issue(client):
+    a, b, c = (BookModel.add_book(t, 'Author', None, None, 'Fiction', 3, 3) for t in 'ABC')
+    m1 = MemberModel.add_member('One', None, None, None)
+    m2 = MemberModel.add_member('Two', None, None, None)
+    for member, book in [(m1, a), (m1, b), (m1, a), (m2, a), (m2, b), (m2, c)]:
+        TransactionModel.issue_book(member, book)
+
+    # Repeat borrows of the same book do not inflate the counts
+    assert pair_scores() == {
+        (a, b): 2, (b, a): 2, (a, c): 1, (c, a): 1, (b, c): 1, (c, b): 1,
+    }
+
+    data = client.get(f'/books/api/{a}/related').get_json()
+    assert [(i['title'], i['score']) for i in data['items']] == [('B', 2), ('C', 1)]
+    assert len(client.get(f'/books/api/{a}/related?limit=1').get_json()['items']) == 1
+
+    # A full rebuild from transactions gives the same table
+    before = pair_scores()
+    RecommendationModel.rebuild()
+    assert pair_scores() == before
+
+
+def test_related_books_skip_deleted_books(client):
+    a, b = (BookModel.add_book(t, 'Author', None, None, None, 1, 1) for t in 'AB')
+    member = MemberModel.add_member('One', None, None, None)
+    TransactionModel.issue_book(member, a)
+    TransactionModel.issue_book(member, b)
+    BookModel.delete_book(b)
+    assert client.get(f'/books/api/{a}/related').get_json()['items'] == []
+
+
+def test_deletes_take_the_counts_down(client):
+    a, b, c = (BookModel.add_book(t, 'Author', None, None, None, 3, 3) for t in 'ABC')
+    m1 = MemberModel.add_member('One', None, None, None)
+    m2 = MemberModel.add_member('Two', None, None, None)
+    loans = {(m, book): [] for m in (m1, m2) for book in (a, b, c)}
+    for member, book in [(m1, a), (m1, b), (m1, b), (m1, c), (m2, a), (m2, b), (m2, c)]:
+        loans[member, book].append(TransactionModel.issue_book(member, book))
+
+    def matches_rebuild():
+        before = pair_scores()
+        RecommendationModel.rebuild()
+        return pair_scores() == before
+
+    # Only the last loan of a book takes the member's pairs with it
+    TransactionModel.delete_transaction(loans[m1, b][0])
+    assert pair_scores()[a, b] == 2 and matches_rebuild()
+    TransactionModel.delete_transaction(loans[m1, b][1])
+    assert pair_scores()[a, b] == 1 and matches_rebuild()
+
+    MemberModel.delete_member(m2)
+    assert pair_scores() == {(a, c): 1, (c, a): 1} and matches_rebuild()
+    BookModel.delete_book(c)
+    assert pair_scores() == {} and matches_rebuild()
@@ -0,0 +1,110 @@
+import threading
+import time
+
+import pytest
+
+from models.jobs import JobQueueFull, JobRunner
+from models.book_model import BookModel
+from models.member_model import MemberModel
+from models.transaction_model import TransactionModel
+from routes.report_routes import report_jobs
+
+
+def wait_done(client, job):
+    while job['status'] not in ('done', 'failed'):
+        job = client.get(f"/api/reports/jobs/{job['id']}?wait=5&version={job['version']}").get_json()
+    return job
+
+
+def test_report_job_matches_direct_report(client):
+    book_id = BookModel.add_book('Queued', 'Author', None, None, None, 2, 2)
+    member_id = MemberModel.add_member('Reader', None, None, None)
+    TransactionModel.issue_book(member_id, book_id)
+
+    resp = client.post('/api/reports/jobs', data={'type': 'summary'})
+    assert resp.status_code in (200, 202)
+    assert resp.headers['Location'].endswith(resp.get_json()['id'])
+    job = wait_done(client, resp.get_json())
+    assert job['status'] == 'done' and job['progress'] == 1.0
+    assert job['result'] == client.get('/api/reports?type=summary').get_json()
+    assert client.get(f"/api/reports/jobs/{job['id']}/result").get_json() == job['result']
+
+
+def test_failed_and_unknown_jobs(client):
+    job = wait_done(client, client.post('/api/reports/jobs', json={'type': 'nope'}).get_json())
+    assert job['status'] == 'failed' and job['error'] == 'unknown report type'
+    assert client.get(f"/api/reports/jobs/{job['id']}/result").status_code == 500
+    assert client.get('/api/reports/jobs/missing').status_code == 404
+
+
+def test_runner_merges_identical_jobs_and_bounds_queue(test_app):
+    runner = JobRunner(max_workers=1, max_pending=2)
+    release = threading.Event()
+    calls = []
+
+    def slow(job):
+        calls.append(job.id)
+        runner.set_progress(job, 0.5)
+        release.wait(5)
+        return 'ok'
+
+    first, merged = runner.submit('a', slow)
+    again, merged_again = runner.submit('a', slow)
+    assert again.id == first.id and merged_again and not merged
+    runner.submit('b', slow)
+    with pytest.raises(JobQueueFull):
+        runner.submit('c', slow)
+
+    # Another worker process sees the job and its progress through the table
+    other = JobRunner()
+    seen = first
+    while seen.progress < 0.5:
+        seen = other.wait(seen, timeout=5)
+    assert seen.status == 'running'
+
+    release.set()
+    while not seen.finished:
+        seen = other.wait(seen, timeout=5)
+    assert seen.result == 'ok' and calls[0] == first.id
+    assert other.get(first.id).status == 'done'
+
+
+def test_job_progress_is_reported(client):
+    resp = client.post('/api/reports/jobs', data={'type': 'summary', 'start': '2002-01-01'})
+    job = resp.get_json()
+    while job['status'] not in ('done', 'failed'):
+        job = client.get(f"/api/reports/jobs/{job['id']}?wait=5&version={job['version']}").get_json()
+    # running, the first progress step and done each bump the version;
+    # later steps within PROGRESS_INTERVAL are not written
+    assert job['status'] == 'done' and job['version'] >= 3
+
+
+def test_progress_writes_are_throttled_and_running_jobs_kept_alive(test_app):
+    runner = JobRunner(max_workers=2, stale_after=0.4)
+    release = threading.Event()
+
+    def slow(job):
+        for step in range(50):
+            runner.set_progress(job, step / 50)
+        release.wait(5)
+        return 'ok'
+
+    job, _ = runner.submit('long', slow)
+    time.sleep(0.8)
+    # Two stale_after periods later the heartbeat has kept it from being
+    # failed by the prune the next submission runs
+    runner.submit('other', lambda job: None)
+    current = runner.get(job.id)
+    assert current.status == 'running'
+    # running + one progress write, then heartbeats that don't bump the version
+    assert current.version == 2
+    release.set()
+    while not current.finished:
+        current = runner.wait(current, timeout=5)
+    assert current.status == 'done' and current.result == 'ok'
+
+
+def test_report_jobs_busy_returns_503(client, monkeypatch):
+    monkeypatch.setattr(report_jobs, 'max_pending', 0)
+    resp = client.post('/api/reports/jobs', data={'type': 'summary', 'start': '2001-01-01'})
+    assert resp.status_code == 503 and resp.headers['Retry-After'] == '5'
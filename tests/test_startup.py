@@ -0,0 +1,63 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cold start budget for importing app.py and building the app (seconds).
+COLD_START_TARGET = 1.5
+
+
+def test_create_app_has_no_side_effects(tmp_path):
+    from app import create_app
+
+    db_path = tmp_path / 'lazy.db'
+    upload_dir = tmp_path / 'avatars'
+    create_app({'DATABASE': str(db_path), 'UPLOAD_FOLDER': str(upload_dir)})
+
+    assert not db_path.exists()
+    assert not upload_dir.exists()
+
+
+def test_cold_start_under_target(tmp_path):
+    script = (
+        "import time; t = time.perf_counter(); "
+        "from app import create_app; create_app(); "
+        "print(time.perf_counter() - t)"
+    )
+    env = dict(os.environ, LIBRARY_DATABASE=str(tmp_path / 'cold.db'))
+    out = subprocess.run(
+        [sys.executable, '-c', script], cwd=ROOT, env=env,
+        capture_output=True, text=True, check=True
+    )
+    assert float(out.stdout.strip()) < COLD_START_TARGET
+
+
+def test_migrate_command_creates_tables(test_app, tmp_path):
+    from models import db
+
+    db.configure(str(tmp_path / 'migrated.db'))
+    result = test_app.test_cli_runner().invoke(args=['migrate'])
+    assert 'Database migrated.' in result.output
+
+    conn = db.connect()
+    names = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    conn.close()
+    assert {'books', 'members', 'transactions'} <= names
+
+
+def test_init_worker_runs_after_fork_hooks(test_app):
+    from models import db
+
+    calls = []
+    hook = db.register_after_fork(lambda: calls.append('ran'))
+    try:
+        db.init_worker()
+    finally:
+        db._after_fork_hooks.remove(hook)
+    assert calls == ['ran']
+
+
+def test_wsgi_module_exposes_app():
+    import wsgi
+    assert wsgi.app.url_map.bind('localhost').match('/api/dashboard_stats')
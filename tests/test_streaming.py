@@ -0,0 +1,76 @@
+from models import db
+from models.book_model import BookModel
+from models.member_model import MemberModel
+from models.transaction_model import TransactionModel
+
+
+def seed():
+    book_id = BookModel.add_book('Streamed Book', 'Author', None, None, None, 2, 2)
+    member_id = MemberModel.add_member('Stream Reader', None, None, None)
+    TransactionModel.issue_book(member_id, book_id)
+    return book_id, member_id
+
+
+def test_transactions_page_is_streamed(client):
+    seed()
+    resp = client.get('/transactions/')
+    assert resp.is_streamed
+    html = resp.get_data(as_text=True)
+    assert 'Streamed Book' in html and 'Stream Reader' in html
+    assert 'No transactions yet.' not in html
+
+
+def test_issue_page_is_streamed(client):
+    seed()
+    resp = client.get('/transactions/issue')
+    assert resp.is_streamed
+    html = resp.get_data(as_text=True)
+    assert 'Streamed Book' in html and 'Stream Reader' in html
+
+
+def test_iter_rows_yields_in_batches_and_closes(test_app):
+    for i in range(5):
+        BookModel.add_book(f'Book {i}', 'Author', None, None, None, 1, 1)
+    rows = db.iter_rows('SELECT title FROM books ORDER BY id', batch_size=2)
+    assert next(rows)['title'] == 'Book 0'
+    rows.close()
+    assert [r['title'] for r in BookModel.iter_all()] == [f'Book {i}' for i in range(5)]
+
+
+def test_transaction_stats(test_app):
+    seed()
+    assert TransactionModel.get_stats() == {'total': 1, 'issued': 1, 'returned': 0}
+
+
+def test_flash_is_shown_once_on_streamed_pages(client):
+    book_id, member_id = seed()
+    client.post('/transactions/issue', data={'member_id': member_id, 'book_id': book_id})
+    assert 'Book issued successfully' in client.get('/transactions/').get_data(as_text=True)
+    assert 'Book issued successfully' not in client.get('/transactions/').get_data(as_text=True)
+    assert 'Book issued successfully' not in client.get('/transactions/issue').get_data(as_text=True)
+
+
+def test_transactions_page_counts_the_hot_table(client):
+    conn = db.connect()
+    conn.execute("INSERT INTO transactions_archive (id, member_id, book_id, issue_date, return_date) "
+                 "VALUES (99, 1, 1, '2020-01-01 00:00:00', '2020-01-02 00:00:00')")
+    conn.commit()
+    conn.close()
+    html = client.get('/transactions/').get_data(as_text=True)
+    assert 'id="tx-table"' not in html
+    assert TransactionModel.get_stats()['total'] == 1
+
+
+def test_transactions_listing_is_one_snapshot(client):
+    book_id, member_id = seed()
+    other = MemberModel.add_member('Gone Reader', None, None, None)
+    TransactionModel.issue_book(other, book_id)
+    MemberModel.delete_member(other)
+
+    stats, rows = TransactionModel.listing()
+    # A loan issued while the page streams is in neither the stats nor the rows
+    TransactionModel.issue_book(member_id, BookModel.add_book('Later Book', 'Author', None, None, None, 1, 1))
+    rows = list(rows)
+    assert stats['total'] == len(rows) == 2
+    assert [r['member_name'] for r in rows] == ['Stream Reader', None]
+    assert 'Deleted member' in client.get('/transactions/').get_data(as_text=True)
@@ -0,0 +1,72 @@
+import sqlite3
+
+from models import changes, db
+from models.book_model import BookModel
+from models.member_model import MemberModel
+from models.transaction_model import TransactionModel
+
+
+def as_dicts(entity_changes):
+    columns = entity_changes['columns']
+    return {row[0]: dict(zip(columns, row)) for row in entity_changes['rows']}
+
+
+def test_changes_feed_returns_latest_state_and_tombstones(client):
+    book_id = BookModel.add_book('Sync', 'A', None, None, None, 1, 1)
+    member_id = MemberModel.add_member('Desk', None, None, None)
+
+    first = client.get('/sync/changes?since=0').get_json()
+    assert as_dicts(first['changes']['books'])[book_id]['title'] == 'Sync'
+    assert member_id in as_dicts(first['changes']['members'])
+    assert not first['more']
+    since = first['version']
+
+    # Nothing changed: empty delta, same version
+    again = client.get(f'/sync/changes?since={since}').get_json()
+    assert again['changes'] == {} and again['version'] == since
+
+    loan = TransactionModel.issue_book(member_id, book_id)
+    other = MemberModel.add_member('Gone', None, None, None)
+    MemberModel.delete_member(other)
+    delta = client.get(f'/sync/changes?since={since}').get_json()
+    # The issue updated the book's counters, so the book comes along once
+    assert as_dicts(delta['changes']['books'])[book_id]['available_copies'] == 0
+    assert list(as_dicts(delta['changes']['transactions'])) == [loan]
+    assert delta['changes']['members'] == {'columns': delta['changes']['members']['columns'],
+                                           'rows': [], 'deleted': [other]}
+    assert delta['version'] > since
+
+
+def test_changes_are_paged_by_version(client):
+    for i in range(5):
+        BookModel.add_book(f'Book {i}', 'A', None, None, None, 0, 0)
+    seen, since = [], 0
+    while True:
+        page = changes.changes_since(since, limit=2)
+        seen += [r[0] for r in page['changes'].get('books', {}).get('rows', [])]
+        since = page['version']
+        if not page['more']:
+            break
+    assert sorted(seen) == [1, 2, 3, 4, 5]
+    assert client.get('/sync/changes?since=abc').status_code == 400
+
+
+def test_existing_rows_are_seeded_once(tmp_path, monkeypatch):
+    path = str(tmp_path / 'seed.db')
+    conn = sqlite3.connect(path)
+    conn.execute('''CREATE TABLE books (id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT NOT NULL,
+                    author TEXT NOT NULL, publisher TEXT, year_published TEXT, category TEXT,
+                    total_copies INTEGER, available_copies INTEGER)''')
+    conn.executemany("INSERT INTO books (title, author, total_copies, available_copies) VALUES (?, 'A', 0, 0)",
+                     [('One',), ('Two',)])
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr(db, 'DATABASE', path)
+    db.migrate()
+    db.migrate()
+
+    result = changes.changes_since(0)
+    assert sorted(r[0] for r in result['changes']['books']['rows']) == [1, 2]
+    conn = db.connect()
+    assert conn.execute('SELECT COUNT(*) FROM change_log').fetchone()[0] == 2
+    conn.close()
@@ -0,0 +1,88 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from models import db
+from models.write_coordinator import _STOP, WriteTimeout
+from models.book_model import BookModel
+from models.member_model import MemberModel
+from models.transaction_model import TransactionModel
+
+
+@pytest.fixture
+def writer(test_app):
+    coordinator = db.enable_write_coordinator(max_wait=0.05)
+    yield coordinator
+    db.disable_write_coordinator()
+
+
+def test_concurrent_issues_are_group_committed(writer):
+    book_id = BookModel.add_book('Burst', 'Author', 'Pub', '2024', 'General', 50, 50)
+    member_id = MemberModel.add_member('Desk Rush', None, None, None)
+
+    ids = []
+    def issue():
+        ids.append(TransactionModel.issue_book(member_id, book_id))
+
+    threads = [threading.Thread(target=issue) for _ in range(20)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(set(ids)) == 20
+    assert BookModel.get_by_id(book_id)['available_copies'] == 30
+    assert writer.operations == 21
+    assert writer.batches < writer.operations
+
+
+def test_failed_operation_does_not_abort_batch(writer):
+    def boom(conn):
+        conn.execute("INSERT INTO books (title, author) VALUES ('partial', 'x')")
+        raise ValueError('bad op')
+
+    with pytest.raises(ValueError):
+        db.write(boom)
+    book_id = BookModel.add_book('Kept', 'Author', None, None, None, 1, 1)
+
+    titles = [b['title'] for b in BookModel.get_all()]
+    assert 'partial' not in titles
+    assert BookModel.get_by_id(book_id)['title'] == 'Kept'
+
+
+def test_writer_survives_a_failing_savepoint(writer):
+    def breaks_savepoint(conn):
+        # Leaves the writer nothing to roll back to, as an I/O error would
+        conn.execute('RELEASE op')
+        raise ValueError('bad op')
+
+    with pytest.raises(sqlite3.OperationalError):
+        db.write(breaks_savepoint)
+    book_id = BookModel.add_book('After', 'Author', None, None, None, 1, 1)
+    assert BookModel.get_by_id(book_id)['title'] == 'After'
+    assert writer._thread.is_alive()
+
+
+def test_dead_writer_is_restarted_and_stuck_writes_time_out(writer):
+    BookModel.add_book('First', 'Author', None, None, None, 1, 1)
+    thread = writer._thread
+    writer._queue.put(_STOP)
+    thread.join(5)
+    assert not thread.is_alive()
+
+    book_id = BookModel.add_book('Second', 'Author', None, None, None, 1, 1)
+    assert BookModel.get_by_id(book_id)['title'] == 'Second'
+    assert writer._thread is not thread
+
+    release = threading.Event()
+    blocker = threading.Thread(target=db.write, args=(lambda conn: release.wait(5),))
+    blocker.start()
+    time.sleep(0.05)
+    writer.submit_timeout = 0.1
+    with pytest.raises(WriteTimeout):
+        db.write(lambda conn: conn.execute("INSERT INTO books (title, author) VALUES ('late', 'x')"))
+    release.set()
+    blocker.join()
+    assert 'late' not in [b['title'] for b in BookModel.get_all()]
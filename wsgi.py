@@ -0,0 +1,9 @@
+# wsgi.py
+"""Production entry point: ``gunicorn -c gunicorn.conf.py wsgi:app``.
+
+Building the app is side-effect free, so it is safe to import once in the
+gunicorn master (``preload_app``) and share it with every forked worker.
+"""
+from app import create_app
+
+app = create_app()